@@ -4,6 +4,26 @@ from django.core.exceptions import ValidationError
 from django.utils.deconstruct import deconstructible
 
 
+# Local numbers (with a leading 0) are Bulgarian
+DEFAULT_COUNTRY_CODE = '359'
+
+
+def normalize_phone_number(value: str) -> str:
+    """
+    One stored form for every way of writing the same number:
+    '0888 123 456', '00359888123456' and '+359 888-123-456' all become '+359888123456'.
+    """
+    if not value:
+        return value
+
+    number = re.sub(r'[\s\-().]', '', value)
+    if number.startswith('00'):
+        return '+' + number[2:]
+    if number.startswith('0'):
+        return f'+{DEFAULT_COUNTRY_CODE}{number[1:]}'
+    return number
+
+
 @deconstructible
 class PhoneNumberValidator:
     def __init__(self, message: str=None) -> None:
@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from appointment.models import Appointment, Service, Professional, BusinessCategory
+from appointment.models import Appointment, Service, Professional, BusinessCategory, EmailOutbox, \
+    AppointmentSeries, DailyStats, WorkingHours, ScheduleException, AppointmentRecord
 
 
 # Register your models here.
@@ -10,16 +11,67 @@ class AppointmentAdmin(admin.ModelAdmin):
     list_display = ['user', 'professional', 'client_name', 'service', 'date', 'status', ]
 
 
+@admin.register(AppointmentRecord)
+class AppointmentRecordAdmin(admin.ModelAdmin):
+    # Live and archived appointments together, read-only (the archive is filled by archive_appointments)
+    list_display = ['client_name', 'client_phone', 'professional', 'service', 'date', 'time', 'status', 'is_archived']
+    list_filter = ['is_archived', 'status', 'professional']
+    list_select_related = ['professional', 'service']
+    search_fields = ['client_name', 'client_phone', 'client_email']
+    date_hierarchy = 'date'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Service)
 class ServiceAdmin(admin.ModelAdmin):
     list_display = ['name', 'description', 'price', 'duration']
 
 
+class WorkingHoursInline(admin.TabularInline):
+    model = WorkingHours
+    extra = 0
+
+
+class ScheduleExceptionInline(admin.TabularInline):
+    model = ScheduleException
+    extra = 0
+
+
 @admin.register(Professional)
 class ProfessionalAdmin(admin.ModelAdmin):
     list_display = ['name']
+    inlines = [WorkingHoursInline, ScheduleExceptionInline]
+
 
 @admin.register(BusinessCategory)
 class BusinessCategoryAdmin(admin.ModelAdmin):
     list_display = ['name', 'slug']
 
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'status', 'attempts', 'next_attempt_at', 'created_at']
+    list_filter = ['status']
+
+
+@admin.register(AppointmentSeries)
+class AppointmentSeriesAdmin(admin.ModelAdmin):
+    list_display = ['client_name', 'professional', 'service', 'start_date', 'end_date', 'time', 'interval_weeks',
+                    'is_active']
+    list_filter = ['is_active']
+
+
+@admin.register(DailyStats)
+class DailyStatsAdmin(admin.ModelAdmin):
+    list_display = ['date', 'professional', 'booked_minutes', 'revenue', 'pending_count', 'confirmed_count',
+                    'cancelled_count', 'completed_count']
+    list_filter = ['professional']
+    date_hierarchy = 'date'
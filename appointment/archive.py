@@ -0,0 +1,77 @@
+"""
+Archival of closed appointments (the `archive_appointments` command).
+
+Completed and cancelled appointments older than the cutoff are moved to
+ArchivedAppointment in batches. Every batch is its own short transaction:
+the rows are locked (skipping any row another request is editing), copied
+with one INSERT ... SELECT and deleted with one DELETE, so neither the live
+table nor the bookings wait on the archival for long.
+
+The move goes around the ORM on purpose: the rows are the same appointments,
+so the delete signals must not run. The daily rollups keep counting them, and
+the slots of past days don't change.
+
+Reads which need the history too use AppointmentRecord (live + archived).
+"""
+import datetime
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from appointment.models import Appointment, ArchivedAppointment
+
+CLOSED_STATUSES = ['completed', 'cancelled']
+BATCH_SIZE = 500
+
+
+def default_cutoff(today=None):
+    today = today or timezone.localdate()
+    return today - datetime.timedelta(days=settings.ARCHIVE_AFTER_DAYS)
+
+
+def closed_before(cutoff):
+    return Appointment.objects.filter(status__in=CLOSED_STATUSES, date__lt=cutoff)
+
+
+def _move(ids):
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(field.column) for field in Appointment._meta.concrete_fields)
+    placeholders = ', '.join(['%s'] * len(ids))
+    archived_at = ArchivedAppointment._meta.get_field('archived_at').get_db_prep_value(
+        timezone.now(), connection
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(ArchivedAppointment._meta.db_table)} ({columns}, {quote("archived_at")}) '
+            f'SELECT {columns}, %s FROM {quote(Appointment._meta.db_table)} WHERE {quote("id")} IN ({placeholders})',
+            [archived_at, *ids],
+        )
+        cursor.execute(
+            f'DELETE FROM {quote(Appointment._meta.db_table)} WHERE {quote("id")} IN ({placeholders})',
+            ids,
+        )
+
+
+def archive_closed(cutoff, batch_size=BATCH_SIZE, max_batches=None) -> int:
+    """Move the closed appointments before `cutoff`, a batch per transaction. Returns how many moved."""
+    moved = 0
+    batches = 0
+
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            ids = list(
+                closed_before(cutoff)
+                .select_for_update(skip_locked=True)
+                .order_by('date', 'id')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            _move(ids)
+
+        moved += len(ids)
+        batches += 1
+
+    return moved
@@ -0,0 +1,122 @@
+"""
+Async versions of the read-only catalog and slots endpoints.
+
+They use Django's async ORM and cache API, so under an ASGI server
+(see appointmentSystem/asgi.py) a request waiting on the database doesn't
+hold a worker thread. DRF views are sync only, so these are plain Django
+views returning the same JSON as their DRF counterparts in views.py.
+"""
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views import View
+
+from appointment import availability, live, scheduling
+from appointment.models import Service, Professional, BusinessCategory
+from appointment.serializers import ServiceSerializer, ProfessionalSerializer, CategorySerializer
+from appointment.views import AvailableSlotsView
+
+
+class AsyncCategoryListView(View):
+    read_from_replica = True
+
+    async def get(self, request):
+        categories = [category async for category in BusinessCategory.objects.all()]
+        return JsonResponse(CategorySerializer(categories, many=True).data, safe=False)
+
+
+class AsyncServiceListView(View):
+    read_from_replica = True
+
+    async def get(self, request):
+        queryset = Service.objects.all()
+
+        # Same filters as ServiceListView
+        category = request.GET.get('category')
+        if category:
+            queryset = queryset.filter(category=category)
+
+        pro_id = request.GET.get('professional')
+        if pro_id:
+            queryset = queryset.filter(professionals__id=pro_id)
+
+        services = [service async for service in queryset]
+        return JsonResponse(ServiceSerializer(services, many=True).data, safe=False)
+
+
+class AsyncProfessionalListView(View):
+    read_from_replica = True
+
+    async def get(self, request):
+        queryset = Professional.objects.filter(is_active=True)
+
+        service_id = request.GET.get('service')
+        if service_id:
+            queryset = queryset.filter(services__pk=service_id).distinct()
+
+        professionals = [professional async for professional in queryset]
+        return JsonResponse(ProfessionalSerializer(professionals, many=True).data, safe=False)
+
+
+class AsyncAvailableSlotsView(View):
+    """
+    Same query params and response as AvailableSlotsView.
+    """
+    read_from_replica = True
+
+    async def get(self, request):
+        try:
+            pro_id, service_id, date_from, date_to, is_range = AvailableSlotsView.parse_query(request.GET)
+        except ValueError as e:
+            return JsonResponse({"грешка": str(e)}, status=400)
+
+        try:
+            service_obj = await Service.objects.select_related('category').aget(pk=service_id)
+            professional_obj = await Professional.objects.aget(pk=pro_id)
+        except (Service.DoesNotExist, Professional.DoesNotExist, ValueError):
+            return JsonResponse({"грешка": "Невалидна услуга или служител"}, status=400)
+
+        free_minutes = await availability.aget_free_minutes(
+            professional_obj, service_obj.duration, scheduling.date_range(date_from, date_to),
+            service_obj.get_slot_step(),
+        )
+        availability_by_day = scheduling.format_free_slots(free_minutes, timezone.localtime())
+
+        if is_range:
+            return JsonResponse(availability_by_day)
+
+        return JsonResponse(availability_by_day[date_from.isoformat()], safe=False)
+
+
+class ScheduleEventsView(View):
+    """
+    Server-Sent Events with the new bookings and status changes of the
+    logged-in professional (see live.py). Needs ASGI: under WSGI the endless
+    stream would be collected into a list, sending nothing and holding a
+    worker thread, so it answers 204, which stops the browser reconnecting.
+    """
+
+    async def get(self, request):
+        if not isinstance(request, ASGIRequest):
+            return HttpResponse(status=204)
+
+        user = await request.auser()
+        if not user.is_authenticated:
+            return JsonResponse({"error": "Влезте като служител."}, status=403)
+
+        # The only query of the connection, waiting for events doesn't touch the database
+        professional_id = await Professional.objects.filter(user=user).values_list('pk', flat=True).afirst()
+        if professional_id is None:
+            return JsonResponse({"error": "Нямате профил на служител."}, status=403)
+
+        response = StreamingHttpResponse(self.stream(professional_id), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # nginx would buffer the events otherwise
+        return response
+
+    @staticmethod
+    async def stream(professional_id):
+        # How long the browser waits before reconnecting (ms)
+        yield 'retry: 5000\n\n'
+        async for event in live.get_broker().subscribe(professional_id):
+            yield live.format_sse(event)
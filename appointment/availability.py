@@ -0,0 +1,173 @@
+"""
+Free slots per (professional, service duration, slot step, date) behind Django's cache.
+
+Every (professional, date) has a version counter. Cached slot lists include the
+version in their key, so bumping the counter (on create, cancel or move of an
+appointment) makes the old entries unreachable without deleting them.
+The keys also include the version of the professional's working hours (see
+work_schedule.py), so a changed template or a new day off is seen at once.
+The slots are cached without the "not in the past" filter, which depends on
+the current time and is applied by the caller.
+The missing days are computed from the primary: they are cached under the
+current version, which a lagging replica may not have the bookings of yet.
+"""
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from appointment import recurrence, replicas, scheduling, work_schedule
+from appointment.models import Appointment
+
+VERSION_KEY = 'slots:v:{professional_id}:{date}'
+SLOTS_KEY = 'slots:{professional_id}:{date}:{version}:{schedule_version}:{duration}:{step}'
+
+
+def _version_key(professional_id, date):
+    return VERSION_KEY.format(professional_id=professional_id, date=str(date))
+
+
+def _new_version():
+    # Not starting from 1, so an evicted counter can't match slots cached before the eviction
+    return time.time_ns()
+
+
+def get_versions(professional_id, dates) -> dict:
+    keys = {_version_key(professional_id, day): day for day in dates}
+    found = cache.get_many(keys)
+
+    versions = {keys[key]: version for key, version in found.items()}
+    missing = {key: _new_version() for key in keys if key not in found}
+
+    for key, version in missing.items():
+        # add() keeps the version of a concurrent request if it was first
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+        versions[keys[key]] = version
+
+    return versions
+
+
+async def aget_versions(professional_id, dates) -> dict:
+    keys = {_version_key(professional_id, day): day for day in dates}
+    found = await cache.aget_many(keys)
+
+    versions = {keys[key]: version for key, version in found.items()}
+    missing = {key: _new_version() for key in keys if key not in found}
+
+    for key, version in missing.items():
+        if not await cache.aadd(key, version, timeout=None):
+            version = await cache.aget(key, version)
+        versions[keys[key]] = version
+
+    return versions
+
+
+def bump_version(professional_id, date):
+    key = _version_key(professional_id, date)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), timeout=None)
+
+
+class _DaySlots:
+    """
+    The pure part of get_free_minutes, shared by the sync and the async version:
+    cache keys for the requested days and the computation of the missing ones.
+    """
+
+    def __init__(self, professional, schedule, duration, dates, step):
+        self.professional_id = professional.pk
+        self.schedule = schedule
+        self.dates = list(dates)
+        self.duration = scheduling.duration_to_minutes(duration)
+        self.step = step
+
+    def keys(self, versions) -> dict:
+        return {
+            SLOTS_KEY.format(
+                professional_id=self.professional_id,
+                date=day.isoformat(),
+                version=versions[day],
+                schedule_version=self.schedule.version,
+                duration=self.duration,
+                step=self.step,
+            ): day
+            for day in self.dates
+        }
+
+    def bookings_query(self, missing):
+        # One query for all missing days
+        return Appointment.objects.filter(
+            professional_id=self.professional_id,
+            date__range=(min(missing), max(missing))
+        ).exclude(status='cancelled').values_list('date', 'time', 'service__duration')
+
+    def compute(self, keys, result, booked_slots, series_bookings) -> dict:
+        """Fill `result` with the missing days and return the new cache entries."""
+        # Group the bookings by date in memory, with the not yet created occurrences of series
+        bookings_by_date = defaultdict(list)
+        for booking_date, booking_time, booking_duration in booked_slots:
+            bookings_by_date[booking_date].append((booking_time, booking_duration))
+        for booking_date, bookings in series_bookings.items():
+            bookings_by_date[booking_date].extend(bookings)
+
+        to_cache = {}
+        for key, day in keys.items():
+            if day in result:
+                continue
+
+            result[day] = scheduling.free_slots_in_shifts(
+                self.schedule.shifts(day),
+                self.duration,
+                scheduling.build_busy_intervals(bookings_by_date.get(day, ())),
+                self.step,
+            )
+            to_cache[key] = result[day]
+
+        return to_cache
+
+
+def get_free_minutes(professional, duration, dates, step=scheduling.SLOT_STEP_MINUTES) -> dict:
+    """
+    {date: [start minutes of free slots]} for `professional` and a service of `duration`,
+    every `step` minutes (see Service.get_slot_step).
+    Days missing from the cache are computed together with one appointment query
+    (and one for the recurring series of the professional).
+    """
+    day_slots = _DaySlots(professional, work_schedule.get_schedule(professional), duration, dates, step)
+    keys = day_slots.keys(get_versions(professional.pk, day_slots.dates))
+
+    cached = cache.get_many(keys)
+    result = {keys[key]: minutes for key, minutes in cached.items()}
+    missing = [day for day in day_slots.dates if day not in result]
+
+    if missing:
+        with replicas.read_from_primary():
+            series_bookings = recurrence.virtual_bookings(professional.pk, min(missing), max(missing))
+            booked_slots = list(day_slots.bookings_query(missing))
+        to_cache = day_slots.compute(keys, result, booked_slots, series_bookings)
+        cache.set_many(to_cache, timeout=settings.SLOTS_CACHE_TIMEOUT)
+
+    return result
+
+
+async def aget_free_minutes(professional, duration, dates, step=scheduling.SLOT_STEP_MINUTES) -> dict:
+    """Async version of get_free_minutes (async cache API and async ORM)."""
+    day_slots = _DaySlots(professional, await work_schedule.aget_schedule(professional), duration, dates, step)
+    keys = day_slots.keys(await aget_versions(professional.pk, day_slots.dates))
+
+    cached = await cache.aget_many(keys)
+    result = {keys[key]: minutes for key, minutes in cached.items()}
+    missing = [day for day in day_slots.dates if day not in result]
+
+    if missing:
+        with replicas.read_from_primary():
+            booked_slots = [row async for row in day_slots.bookings_query(missing)]
+            series_bookings = await recurrence.avirtual_bookings(professional.pk, min(missing), max(missing))
+        to_cache = day_slots.compute(keys, result, booked_slots, series_bookings)
+        await cache.aset_many(to_cache, timeout=settings.SLOTS_CACHE_TIMEOUT)
+
+    return result
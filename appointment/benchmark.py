@@ -0,0 +1,245 @@
+"""
+Reproducible performance benchmark (the `benchmark` command and QueryBudgetTests).
+
+seed() fills the database with a dataset of the requested size, always the
+same for the same random seed. Benchmark calls every endpoint in-process
+through Django's test client and measures the latency percentiles and the
+number of SQL queries of each call.
+
+QUERY_BUDGETS is the maximum number of queries per call. The counts must not
+grow with the data, so an N+1 (e.g. a query per row for the service name
+on the schedule page) goes over the budget. The caches are cleared before
+every call, so the uncached path is what gets measured.
+"""
+import datetime
+import math
+import pickle
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import throttling as drf_throttling
+
+from appointment import catalog, throttling
+from appointment.models import BusinessCategory, Service, Professional, Appointment
+
+# Counted on SQLite, which also logs BEGIN and COMMIT (PostgreSQL needs fewer)
+QUERY_BUDGETS = {
+    'categories': 1,
+    'services': 1,
+    'professionals': 1,
+    'bootstrap': 4,
+    # service, professional, and from the primary: its shift, working hours, schedule exceptions,
+    # appointments, series
+    'slots': 7,
+    # field lookups, overlap check, and under the lock: the check again, insert, rollup, outbox email
+    'book': 15,
+    # session, user, profile, any series to materialize (none), one page (with the service names joined)
+    'my-schedule': 5,
+    # session, user, and in a transaction: the appointment (locked), update, rollup
+    'update-status': 7,
+}
+
+CATEGORIES = [('hair', 'Фризьор', '💇'), ('nails', 'Маникюр', '💅'), ('massage', 'Масаж', '💆')]
+STATUSES = ['pending', 'confirmed', 'completed', 'cancelled']
+
+
+def seed(professionals=20, services=30, days=30, per_day=6, services_per_professional=5, random_seed=0):
+    """
+    Bulk-create the dataset and return what the benchmark needs:
+    {'professional': ..., 'user': ..., 'days': ...}. The first professional
+    has a user account, for the schedule and the status updates.
+    """
+    rng = random.Random(random_seed)
+    today = timezone.localdate()
+
+    categories = BusinessCategory.objects.bulk_create([
+        BusinessCategory(slug=slug, name=name, icon=icon) for slug, name, icon in CATEGORIES
+    ])
+    service_objs = Service.objects.bulk_create([
+        Service(
+            name=f"Услуга {number}",
+            price=rng.randrange(10, 120),
+            duration=datetime.timedelta(minutes=rng.choice([30, 60])),
+            category=categories[number % len(categories)],
+        )
+        for number in range(services)
+    ])
+    professional_objs = Professional.objects.bulk_create([
+        Professional(name=f"Служител {number}", start_work_time=datetime.time(9, 0), end_work_time=datetime.time(18, 0))
+        for number in range(professionals)
+    ])
+
+    # Services of every professional, straight into the through table
+    services_by_professional = {
+        professional.pk: rng.sample(service_objs, min(services_per_professional, len(service_objs)))
+        for professional in professional_objs
+    }
+    Professional.services.through.objects.bulk_create([
+        Professional.services.through(professional_id=professional_id, service_id=service.pk)
+        for professional_id, professional_services in services_by_professional.items()
+        for service in professional_services
+    ])
+
+    # Whole hours, so the services (at most 60 minutes) never overlap
+    appointments = []
+    for professional in professional_objs:
+        for offset in range(days):
+            for hour in sorted(rng.sample(range(9, 18), min(per_day, 9))):
+                appointments.append(Appointment(
+                    professional=professional,
+                    service=rng.choice(services_by_professional[professional.pk]),
+                    client_name=f"Клиент {len(appointments)}",
+                    client_phone=f"+359888{len(appointments) % 1000000:06d}",
+                    date=today + datetime.timedelta(days=offset),
+                    time=datetime.time(hour, 0),
+                    status=rng.choices(STATUSES, weights=[4, 4, 1, 1])[0],
+                ))
+    Appointment.objects.bulk_create(appointments, batch_size=1000)
+
+    user = get_user_model().objects.create_user(
+        email='benchmark@example.com', username='benchmark', password='benchmark'
+    )
+    professional = professional_objs[0]
+    professional.user = user
+    professional.save(update_fields=['user'])
+
+    return {'professional': professional, 'user': user, 'days': days}
+
+
+def percentile(sorted_values, percent):
+    # Nearest rank
+    return sorted_values[max(0, math.ceil(percent / 100 * len(sorted_values)) - 1)]
+
+
+class Benchmark:
+    def __init__(self, dataset, random_seed=0):
+        self.rng = random.Random(random_seed)
+        self.professional = dataset['professional']
+        self.days = dataset['days']
+        self.today = timezone.localdate()
+        self.service_ids = list(self.professional.services.values_list('pk', flat=True))
+        # Pending ones, so the status change is always allowed (closed appointments stay closed)
+        self.appointment_ids = list(
+            Appointment.objects.filter(professional=self.professional, status='pending').values_list('pk', flat=True)
+        )
+
+        # The public endpoints are called without a session, like the booking page
+        self.anonymous = Client()
+        self.client = Client()
+        self.client.force_login(dataset['user'])
+
+    def scenarios(self, iteration):
+        """(name, call) for one round over all endpoints."""
+        day = self.today + datetime.timedelta(days=self.rng.randrange(self.days))
+        service_id = self.rng.choice(self.service_ids)
+
+        # Bookings go after the seeded days, one day per iteration, so they never overlap
+        booking_day = self.today + datetime.timedelta(days=self.days + iteration)
+
+        return [
+            ('categories', lambda: self.anonymous.get(reverse('category-list'))),
+            ('services', lambda: self.anonymous.get(reverse('service-list'), {'category': 'hair'})),
+            ('professionals', lambda: self.anonymous.get(reverse('professional-list'), {'service': service_id})),
+            ('bootstrap', lambda: self.anonymous.get(reverse('bootstrap'))),
+            ('slots', lambda: self.anonymous.get(reverse('available-slots'), {
+                'date': day.isoformat(), 'professional': self.professional.pk, 'service': service_id,
+            })),
+            ('book', lambda: self.anonymous.post(reverse('book-appointment'), {
+                'service': service_id, 'professional': self.professional.pk, 'date': booking_day.isoformat(),
+                'time': '10:00', 'client_name': 'Бенчмарк', 'client_phone': '0888123456',
+                'client_email': 'client@example.com',
+            }, content_type='application/json')),
+            ('my-schedule', lambda: self.client.get(reverse('my-schedule'))),
+            ('update-status', lambda: self.client.patch(
+                reverse('update-status', args=[self.appointment_ids[iteration % len(self.appointment_ids)]]),
+                {'status': 'confirmed'},
+                content_type='application/json',
+            )),
+        ]
+
+    @staticmethod
+    def measure(call):
+        cache.clear()
+        catalog.local_cache.clear()
+
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = call()
+            elapsed = time.perf_counter() - started
+
+        return elapsed, len(queries), response.status_code
+
+    def run(self, iterations=50):
+        """{endpoint: {'p50', 'p95', 'p99' (ms), 'queries' (max), 'budget', 'errors'}}"""
+        samples = {}
+        for iteration in range(iterations):
+            for name, call in self.scenarios(iteration):
+                samples.setdefault(name, []).append(self.measure(call))
+
+        results = {}
+        for name, measurements in samples.items():
+            latencies = sorted(elapsed * 1000 for elapsed, _, _ in measurements)
+            results[name] = {
+                'p50': percentile(latencies, 50),
+                'p95': percentile(latencies, 95),
+                'p99': percentile(latencies, 99),
+                'queries': max(query_count for _, query_count, _ in measurements),
+                'budget': QUERY_BUDGETS[name],
+                'errors': sum(1 for _, _, status_code in measurements if status_code >= 400),
+            }
+        return results
+
+
+def over_budget(results):
+    return {name: result for name, result in results.items() if result['queries'] > result['budget']}
+
+
+def _throttle_values(throttle, request):
+    """What `throttle` keeps in the cache for the client of `request`."""
+    key = throttle.get_cache_key(request, None)
+    keys = [key]
+    if isinstance(throttle, throttling.SlidingWindowRateThrottle):
+        window = int(throttle.timer() // throttle.duration)
+        keys = [throttling.WINDOW_KEY.format(key=key, window=number) for number in (window - 1, window)]
+    return list(cache.get_many(keys).values())
+
+
+def compare_throttles(requests=2000, rate='1000/day'):
+    """
+    DRF's AnonRateThrottle against AnonSlidingWindowThrottle for one client making
+    `requests` requests: {name: {'us_per_request', 'allowed', 'cached_bytes'}}.
+    `cached_bytes` is the pickled size of what the throttle keeps for the client.
+    """
+    request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.1')
+    request.user = AnonymousUser()
+    classes = [('drf', drf_throttling.AnonRateThrottle), ('sliding-window', throttling.AnonSlidingWindowThrottle)]
+    results = {}
+
+    for name, base in classes:
+        throttle_class = type(f'Benchmark{base.__name__}', (base,), {'rate': rate})
+        cache.clear()
+
+        allowed = 0
+        started = time.perf_counter()
+        for _ in range(requests):
+            # A new instance per request, like DRF does
+            throttle = throttle_class()
+            allowed += throttle.allow_request(request, None)
+        elapsed = time.perf_counter() - started
+
+        results[name] = {
+            'us_per_request': elapsed / requests * 1_000_000,
+            'allowed': allowed,
+            'cached_bytes': sum(len(pickle.dumps(value)) for value in _throttle_values(throttle, request)),
+        }
+
+    return results
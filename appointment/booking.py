@@ -0,0 +1,69 @@
+"""
+Locking for race-free booking.
+
+The overlap check and the INSERT must happen while holding a lock for the
+(professional, date) pair, otherwise two requests for the same slot can both
+pass the check. Only bookings of the same professional on the same day wait
+for each other, the rest of the table is not locked.
+"""
+import threading
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections, router, transaction
+
+from appointment.models import Appointment, Professional
+
+# Striped locks for databases without advisory locks (e.g. SQLite in development).
+# A fixed number of locks keeps the memory constant however many days are booked.
+# Reentrant, so a view can hold the lock around serializer.save() which takes it again.
+_LOCAL_LOCKS = [threading.RLock() for _ in range(64)]
+
+
+@contextmanager
+def professional_day_lock(professional_id, date):
+    """
+    Atomic block which holds the booking lock for one professional and date
+    until the transaction is committed or rolled back.
+    Anything else saved with the booking must be inside the outermost block,
+    the process-local fallback lock is released when that block exits.
+    """
+    with professional_days_lock([(professional_id, date)]):
+        yield
+
+
+@contextmanager
+def professional_days_lock(days):
+    """
+    Same as professional_day_lock for several (professional_id, date) pairs in one transaction.
+    The locks are always taken in sorted order, so two batches can't deadlock each other.
+    """
+    days = sorted(set(days))
+    using = router.db_for_write(Appointment)
+    connection = connections[using]
+
+    if connection.vendor == 'postgresql':
+        with transaction.atomic(using=using):
+            with connection.cursor() as cursor:
+                for professional_id, date in days:
+                    # Released automatically at the end of the transaction
+                    cursor.execute(
+                        "SELECT pg_advisory_xact_lock(%s::int, %s::int)",
+                        [professional_id, date.toordinal()],
+                    )
+            yield
+        return
+
+    # Portable fallback: a lock per process plus a row lock on the professionals
+    # (select_for_update is a no-op on SQLite, which serialises writers anyway)
+    stripes = sorted({hash(day) % len(_LOCAL_LOCKS) for day in days})
+    with ExitStack() as stack:
+        for stripe in stripes:
+            stack.enter_context(_LOCAL_LOCKS[stripe])
+
+        with transaction.atomic(using=using):
+            professional_ids = sorted({professional_id for professional_id, _ in days})
+            list(
+                Professional.objects.using(using).select_for_update()
+                .filter(pk__in=professional_ids).order_by('pk').values_list('pk')
+            )
+            yield
@@ -0,0 +1,120 @@
+"""
+Caching for the catalog endpoints (categories, services, professionals).
+
+The catalog changes only when an admin edits it, so every response is cached
+under a global catalog version, which the signals bump on any change.
+Responses live in a small in-process LRU in front of the shared cache and
+carry an ETag derived from the version, so browsers and proxies get 304s.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from rest_framework.response import Response
+
+from appointment import replicas
+
+VERSION_KEY = 'catalog:version'
+RESPONSE_KEY = 'catalog:{version}:{name}:{query}'
+LOCAL_CACHE_SIZE = 256
+
+
+class LocalLRU:
+    """Thread-safe in-process LRU, so hot responses don't even go to the shared cache."""
+
+    def __init__(self, size):
+        self.size = size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.get(key)
+            if value is not None:
+                self.items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+local_cache = LocalLRU(LOCAL_CACHE_SIZE)
+
+
+def get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Not starting from 1, so an evicted counter can't match responses cached before the eviction
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def _response_key(request, name, version):
+    # Same parameters in a different order are the same response,
+    # hashed because memcached keys can't hold arbitrary characters
+    query = '&'.join(sorted(request.META.get('QUERY_STRING', '').split('&')))
+    return RESPONSE_KEY.format(version=version, name=name, query=hashlib.md5(query.encode()).hexdigest())
+
+
+def _etag(request, *args, **kwargs):
+    # Called by @condition before the view, the name and version are set on the request by the mixin
+    key = _response_key(request, request.catalog_name, request.catalog_version)
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+class CachedCatalogMixin:
+    """
+    For catalog views. Answers 304 when the client's ETag is still current,
+    otherwise returns the cached data and builds it only on a miss.
+    ListAPIViews work as they are, other views override get_catalog_data().
+    """
+    catalog_name = None
+    read_from_replica = True
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # Read the version once per request, the ETag and the cache key must agree
+        request.catalog_name = self.catalog_name
+        request.catalog_version = get_version()
+
+    @method_decorator(condition(etag_func=_etag))
+    def get(self, request, *args, **kwargs):
+        key = _response_key(request, self.catalog_name, request.catalog_version)
+
+        data = local_cache.get(key)
+        if data is None:
+            data = cache.get(key)
+            if data is None:
+                # Cached until the next edit, so not from a replica which may not have it yet
+                with replicas.read_from_primary():
+                    data = self.get_catalog_data(request, *args, **kwargs)
+                cache.set(key, data, timeout=None)
+            local_cache.set(key, data)
+
+        response = Response(data)
+        # Always revalidate, the ETag makes that a cheap 304
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+    def get_catalog_data(self, request, *args, **kwargs):
+        return list(self.list(request, *args, **kwargs).data)
@@ -0,0 +1,469 @@
+"""
+Bulk import of services, professionals and (historical) appointments, for
+onboarding a salon chain (the `bulk_import` command and the import endpoint).
+
+The input is CSV with a header row, or NDJSON (one JSON object per line,
+e.g. the output of the export), read a chunk of CHUNK_SIZE rows at a time.
+Every row is validated on its own and the errors are reported with its row
+number; the valid rows of a chunk are written together in one transaction. Services and professionals are referenced by name (or id).
+
+Columns:
+- services: name, category (slug), price, duration_minutes, [description, slot_step]
+- professionals: name, [start_work_time, end_work_time, services ("|" separated
+  names in CSV, a list in JSON), is_active]
+- appointments: professional, service, date, time, client_name, client_phone,
+  [client_email, status]
+
+Appointments are checked for overlaps per chunk with one query for the
+existing ones (plus the series occurrences which aren't rows yet, from today
+on), and against the earlier rows of the import. Only the days from
+today on can get concurrent bookings, so only those are locked (see booking.py).
+Nothing here sends the model signals (bulk_create, and a plain INSERT for
+the appointments), so the rollups, the slot versions and the catalog version
+are updated here.
+"""
+import abc
+import bisect
+import csv
+import datetime
+import functools
+import json
+from collections import defaultdict, namedtuple
+from decimal import Decimal
+from itertools import islice
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.validators import validate_email
+from django.db import connection, transaction
+from django.utils import timezone
+
+from accounts.validators import PhoneNumberValidator, normalize_phone_number
+from appointment import availability, booking, catalog, recurrence, rollups, scheduling
+from appointment.models import Appointment, BusinessCategory, Professional, Service, SLOT_STEP_CHOICES
+from appointment.serializers import overlap_error
+
+CHUNK_SIZE = 2000
+MAX_REPORTED_ERRORS = 1000
+CLIENT_CACHE_SIZE = 4096
+FORMATS = ('csv', 'ndjson')
+
+REQUIRED = "Задължително поле."
+INVALID = "Невалидна стойност."
+
+validate_phone = PhoneNumberValidator()
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.failed = 0
+        self.errors = []  # the first MAX_REPORTED_ERRORS, so a broken file can't fill the memory
+        self.error = None  # why the file couldn't be read to the end
+
+    def add_error(self, row_number, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row_number, 'errors': errors})
+
+    def as_dict(self):
+        result = {'created': self.created, 'failed': self.failed, 'errors': self.errors}
+        if self.error:
+            result['error'] = self.error
+        return result
+
+
+def read_rows(file, file_format):
+    """(row number, dict or None) from a text file, one row at a time."""
+    if file_format == 'csv':
+        # Row 1 is the header
+        yield from enumerate(csv.DictReader(file), start=2)
+        return
+
+    for number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield number, record if isinstance(record, dict) else None
+
+
+class _Row:
+    """
+    Parses the fields of one row and collects the errors as {field: message}.
+    Text longer than the max_length of the `model` field of the same name is an error
+    too, the database would reject the whole chunk.
+    """
+
+    def __init__(self, record, model):
+        self.record = record or {}
+        self.model = model
+        self.errors = {} if record is not None else {'row': "Невалиден ред."}
+
+    def get(self, field, parse=str, required=True, default=None):
+        value = self.record.get(field)
+        if isinstance(value, str):
+            value = value.strip()
+        if value in (None, ''):
+            if required:
+                self.errors[field] = REQUIRED
+            return default
+
+        try:
+            value = parse(value)
+        except ValidationError as e:
+            self.errors[field] = e.messages[0]
+        except (ValueError, TypeError, ArithmeticError):
+            self.errors[field] = INVALID
+        else:
+            max_length = self.max_length(field)
+            if not (isinstance(value, str) and max_length and len(value) > max_length):
+                return value
+            self.errors[field] = f"Най-много {max_length} знака."
+        return default
+
+    def max_length(self, field):
+        try:
+            return self.model._meta.get_field(field).max_length
+        except FieldDoesNotExist:
+            return None
+
+
+class _Lookup:
+    """Name or id -> id of the existing rows. A name used by several rows is ambiguous."""
+
+    def __init__(self, rows):
+        self.ids = {}
+        ambiguous = set()
+        for pk, name in rows:
+            self.ids[str(pk)] = pk
+            if name in self.ids:
+                ambiguous.add(name)
+            self.ids[name] = pk
+        for name in ambiguous:
+            self.ids[name] = None
+
+    def __call__(self, value):
+        value = str(value).strip()
+        if value not in self.ids:
+            raise ValidationError("Не е намерен.")
+        if self.ids[value] is None:
+            raise ValidationError("Има няколко с това име, посочете id.")
+        return self.ids[value]
+
+
+def _minutes(value):
+    minutes = int(value)
+    if minutes <= 0:
+        raise ValueError
+    return datetime.timedelta(minutes=minutes)
+
+
+def _price(value):
+    price = Decimal(str(value))
+    if price < 0 or not price.is_finite():
+        raise ValueError
+    return price
+
+
+def _slot_step(value):
+    step = int(value)
+    if step not in dict(SLOT_STEP_CHOICES):
+        raise ValueError
+    return step
+
+
+def _time(value):
+    try:
+        return datetime.time.fromisoformat(value)
+    except ValueError:
+        # 9:30 as well as 09:30
+        return datetime.datetime.strptime(value, '%H:%M').time()
+
+
+def _boolean(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() in ('1', 'true', 'yes', 'да')
+
+
+# The same clients come back in the history, so their contacts are validated once
+@functools.lru_cache(maxsize=CLIENT_CACHE_SIZE)
+def _phone(value):
+    phone = normalize_phone_number(str(value))
+    validate_phone(phone)
+    return phone
+
+
+@functools.lru_cache(maxsize=CLIENT_CACHE_SIZE)
+def _email(value):
+    email = str(value).lower()
+    validate_email(email)
+    return email
+
+
+def _names(value):
+    # "Подстригване|Боядисване" in CSV, a list in JSON
+    return value if isinstance(value, list) else [name for name in value.split('|') if name.strip()]
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+class _Importer(abc.ABC):
+    model = None  # for the max_length of the text fields
+
+    def __init__(self, result):
+        self.result = result
+
+    def run(self, rows, chunk_size):
+        for chunk in _chunks(rows, chunk_size):
+            valid = []
+            errors = []
+            for number, record in chunk:
+                row = _Row(record, self.model)
+                item = self.parse(row)
+                if row.errors:
+                    errors.append((number, row.errors))
+                else:
+                    valid.append((number, item))
+
+            if valid:
+                self.result.created += self.write(valid, errors)
+
+            # In the order of the rows, the ones rejected by write() come last
+            for number, row_errors in sorted(errors, key=lambda error: error[0]):
+                self.result.add_error(number, row_errors)
+
+    @abc.abstractmethod
+    def parse(self, row):
+        """The item to write from a _Row, its errors are collected on the row."""
+
+    @abc.abstractmethod
+    def write(self, items, errors) -> int:
+        """Saves the parsed rows and adds (row number, errors) for the rejected ones. Returns how many were saved."""
+
+
+class _ServiceImporter(_Importer):
+    model = Service
+
+    def __init__(self, result):
+        super().__init__(result)
+        self.categories = set(BusinessCategory.objects.values_list('slug', flat=True))
+
+    def category(self, value):
+        if value not in self.categories:
+            raise ValidationError("Няма такава категория.")
+        return value
+
+    def parse(self, row):
+        return Service(
+            name=row.get('name'),
+            category_id=row.get('category', self.category),
+            price=row.get('price', _price),
+            duration=row.get('duration_minutes', _minutes),
+            description=row.get('description', required=False, default=''),
+            slot_step=row.get('slot_step', _slot_step, required=False),
+        )
+
+    def write(self, items, errors):
+        with transaction.atomic():
+            created = Service.objects.bulk_create([service for _, service in items])
+            transaction.on_commit(catalog.bump_version)
+        return len(created)
+
+
+class _ProfessionalImporter(_Importer):
+    model = Professional
+
+    def __init__(self, result):
+        super().__init__(result)
+        self.services = _Lookup(Service.objects.values_list('id', 'name'))
+
+    def parse(self, row):
+        professional = Professional(
+            name=row.get('name'),
+            start_work_time=row.get('start_work_time', _time, required=False,
+                                    default=datetime.time(10, 0)),
+            end_work_time=row.get('end_work_time', _time, required=False,
+                                  default=datetime.time(18, 0)),
+            is_active=row.get('is_active', _boolean, required=False, default=True),
+        )
+        if professional.end_work_time <= professional.start_work_time:
+            row.errors.setdefault('end_work_time', "Краят на смяната е преди началото.")
+
+        service_ids = []
+        for name in row.get('services', _names, required=False, default=[]):
+            try:
+                service_ids.append(self.services(name))
+            except ValidationError as e:
+                row.errors.setdefault('services', f"{name}: {e.messages[0]}")
+        return professional, service_ids
+
+    def write(self, items, errors):
+        with transaction.atomic():
+            professionals = Professional.objects.bulk_create([professional for _, (professional, _) in items])
+            # The primary keys come back from bulk_create (RETURNING on PostgreSQL and SQLite)
+            Professional.services.through.objects.bulk_create([
+                Professional.services.through(professional_id=professional.pk, service_id=service_id)
+                for professional, (_, (_, service_ids)) in zip(professionals, items)
+                for service_id in set(service_ids)
+            ])
+            transaction.on_commit(catalog.bump_version)
+        return len(professionals)
+
+
+# The columns of a new Appointment, without the user and the series (NULL)
+_NewAppointment = namedtuple('_NewAppointment', [
+    'professional_id', 'service_id', 'date', 'time', 'client_name', 'client_phone', 'client_email', 'status',
+])
+INSERT_FIELDS = ['professional', 'service', 'date', 'time', 'client_name', 'client_phone', 'client_email', 'status',
+                 'created_at']
+
+
+def _insert(appointments):
+    """
+    Multi-row INSERTs around the ORM, like the archival: for plain values like these,
+    bulk_create spends more time preparing them field by field than the database on the rows.
+    No primary keys are needed afterwards.
+    """
+    if not appointments:
+        return
+
+    ops = connection.ops
+    fields = [Appointment._meta.get_field(name) for name in INSERT_FIELDS]
+    columns = ', '.join(ops.quote_name(field.column) for field in fields)
+    created_at = Appointment._meta.get_field('created_at').get_db_prep_value(timezone.now(), connection)
+    values = [
+        (professional_id, service_id, ops.adapt_datefield_value(date), ops.adapt_timefield_value(time),
+         client_name, client_phone, client_email, status, created_at)
+        for professional_id, service_id, date, time, client_name, client_phone, client_email, status in appointments
+    ]
+
+    row = '(' + ', '.join(['%s'] * len(fields)) + ')'
+    batch_size = ops.bulk_batch_size(fields, values)
+    with connection.cursor() as cursor:
+        for start in range(0, len(values), batch_size):
+            batch = values[start:start + batch_size]
+            cursor.execute(
+                f'INSERT INTO {ops.quote_name(Appointment._meta.db_table)} ({columns}) '
+                f'VALUES {", ".join([row] * len(batch))}',
+                [value for appointment in batch for value in appointment],
+            )
+
+
+class _AppointmentImporter(_Importer):
+    model = Appointment
+
+    def __init__(self, result):
+        super().__init__(result)
+        self.professionals = _Lookup(Professional.objects.values_list('id', 'name'))
+        services = list(Service.objects.values_list('id', 'name', 'duration'))
+        self.services = _Lookup((pk, name) for pk, name, _ in services)
+        self.durations = {pk: duration for pk, _, duration in services}
+        self.statuses = dict(Appointment.STATUS_CHOICES)
+
+    def status(self, value):
+        if value not in self.statuses:
+            raise ValidationError("Невалиден статус.")
+        return value
+
+    def parse(self, row):
+        return _NewAppointment(
+            professional_id=row.get('professional', self.professionals),
+            service_id=row.get('service', self.services),
+            date=row.get('date', datetime.date.fromisoformat),
+            time=row.get('time', _time),
+            client_name=row.get('client_name'),
+            client_phone=row.get('client_phone', _phone),
+            client_email=row.get('client_email', _email, required=False),
+            status=row.get('status', self.status, required=False, default='pending'),
+        )
+
+    def write(self, items, errors):
+        today = timezone.localdate()
+        days = {(appointment.professional_id, appointment.date) for _, appointment in items}
+        future_days = {day for day in days if day[1] >= today}
+
+        with booking.professional_days_lock(future_days):
+            accepted = self.without_overlaps(items, days, future_days, errors)
+            _insert(accepted)
+            rollups.update(added=[rollups.describe(appointment) for appointment in accepted])
+
+            # The slots of past days aren't shown, so only the others are invalidated
+            transaction.on_commit(lambda: [availability.bump_version(*day) for day in future_days])
+
+        return len(accepted)
+
+    def without_overlaps(self, items, days, future_days, errors):
+        """
+        The appointments which don't overlap the existing ones, the not yet materialized
+        occurrences of the series (from today on) or the earlier rows. The others are errors.
+        """
+        existing = Appointment.objects.filter(
+            professional_id__in={professional_id for professional_id, _ in days},
+            date__in={date for _, date in days},
+        ).exclude(status='cancelled').values_list('professional_id', 'date', 'time', 'service__duration')
+
+        bookings = defaultdict(list)
+        for professional_id, date, time, duration in existing:
+            bookings[(professional_id, date)].append((time, duration))
+
+        # Like the other booking paths, one query per professional for the range of the chunk
+        future_dates = defaultdict(list)
+        for professional_id, date in future_days:
+            future_dates[professional_id].append(date)
+        for professional_id, dates in future_dates.items():
+            for date, rows in recurrence.virtual_bookings(professional_id, min(dates), max(dates)).items():
+                bookings[(professional_id, date)].extend(rows)
+
+        busy = {day: scheduling.build_busy_intervals(rows) for day, rows in bookings.items()}
+
+        accepted = []
+        for number, appointment in items:
+            if appointment.status == 'cancelled':
+                accepted.append(appointment)
+                continue
+
+            intervals = busy.setdefault((appointment.professional_id, appointment.date), [])
+            start, end = scheduling.appointment_interval(appointment.time, self.durations[appointment.service_id])
+            overlap = scheduling.find_overlap(intervals, start, end)
+            if overlap:
+                errors.append((number, overlap_error(overlap)))
+                continue
+
+            # The accepted ones never overlap, so the list stays sorted and non-overlapping
+            bisect.insort(intervals, (start, end))
+            accepted.append(appointment)
+
+        return accepted
+
+
+IMPORTERS = {
+    'services': _ServiceImporter,
+    'professionals': _ProfessionalImporter,
+    'appointments': _AppointmentImporter,
+}
+
+
+def import_rows(kind, file, file_format, chunk_size=CHUNK_SIZE) -> ImportResult:
+    """
+    Import `file` (text, CSV or NDJSON) as `kind` (see IMPORTERS). A file which can't be read
+    to the end stops the import with `error` set, the chunks before it stay saved.
+    """
+    result = ImportResult()
+    try:
+        IMPORTERS[kind](result).run(read_rows(file, file_format), chunk_size)
+    except UnicodeDecodeError:
+        result.error = _stopped("Файлът трябва да е в UTF-8.", result)
+    except csv.Error as e:
+        result.error = _stopped(f"Невалиден CSV файл ({e}).", result)
+    return result
+
+
+def _stopped(reason, result):
+    return f"{reason} Импортирането спря, обработени са първите {result.created + result.failed} реда."
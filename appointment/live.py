@@ -0,0 +1,160 @@
+"""
+Live schedule updates for the dashboard (Server-Sent Events).
+
+Bookings and status changes are published, after commit, to the professional
+they belong to. Every open dashboard holds an async SSE connection (see
+ScheduleEventsView, served under ASGI) which waits on its subscription, so an
+idle dashboard costs no database queries, only a keepalive comment now and then.
+
+The broker is chosen with the LIVE_UPDATES setting:
+- InProcessBroker (default): subscribers in this process only, for one worker
+  (logs a warning when WEB_CONCURRENCY asks for more).
+- RedisBroker: Redis pub/sub, for several workers or servers (LIVE_UPDATES_REDIS_URL).
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+KEEPALIVE_SECONDS = 15
+QUEUE_SIZE = 100
+PUBLISH_TIMEOUT_SECONDS = 0.5
+
+logger = logging.getLogger(__name__)
+
+
+class InProcessBroker:
+    """
+    Subscribers are asyncio queues of this process. publish() can be called from
+    any thread (sync views run in a thread pool under ASGI).
+    """
+
+    def __init__(self, **options):
+        self.subscribers = defaultdict(set)
+        self.lock = threading.Lock()
+
+        # uvicorn and gunicorn take the number of workers from WEB_CONCURRENCY
+        if int(os.environ.get('WEB_CONCURRENCY') or 1) > 1:
+            logger.warning(
+                "InProcessBroker with %s workers: live updates only reach the dashboards connected "
+                "to the same worker. Set LIVE_UPDATES_REDIS_URL to use RedisBroker.",
+                os.environ['WEB_CONCURRENCY'],
+            )
+
+    def publish(self, professional_id, event):
+        with self.lock:
+            subscribers = list(self.subscribers.get(professional_id, ()))
+
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(self._offer, queue, event)
+
+    @staticmethod
+    def _offer(queue, event):
+        # A dashboard which doesn't read loses the oldest events, not the server's memory
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+    async def subscribe(self, professional_id, keepalive=KEEPALIVE_SECONDS):
+        """Yields the events of the professional, None every `keepalive` seconds without events."""
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(QUEUE_SIZE))
+        with self.lock:
+            self.subscribers[professional_id].add(subscriber)
+
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(subscriber[1].get(), keepalive)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            with self.lock:
+                self.subscribers[professional_id].discard(subscriber)
+                if not self.subscribers[professional_id]:
+                    del self.subscribers[professional_id]
+
+
+class RedisBroker:
+    """
+    Redis pub/sub, one channel per professional. Needs the `redis` package.
+    LIVE_UPDATES = {'BACKEND': 'appointment.live.RedisBroker', 'OPTIONS': {'url': 'redis://...'}}
+    """
+    CHANNEL = 'schedule:{professional_id}'
+
+    def __init__(self, url='redis://localhost:6379/0', publish_timeout=PUBLISH_TIMEOUT_SECONDS, **options):
+        try:
+            import redis
+            import redis.asyncio
+        except ImportError:
+            raise ImproperlyConfigured("RedisBroker needs the 'redis' package.")
+
+        self.url = url
+        # Publishing runs in the request after its commit, a slow Redis mustn't hold the response
+        self.client = redis.Redis.from_url(url, socket_timeout=publish_timeout,
+                                           socket_connect_timeout=publish_timeout)
+        self.async_redis = redis.asyncio
+
+    def publish(self, professional_id, event):
+        self.client.publish(self.CHANNEL.format(professional_id=professional_id), json.dumps(event))
+
+    async def subscribe(self, professional_id, keepalive=KEEPALIVE_SECONDS):
+        client = self.async_redis.Redis.from_url(self.url)
+        pubsub = client.pubsub()
+        await pubsub.subscribe(self.CHANNEL.format(professional_id=professional_id))
+
+        try:
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=keepalive)
+                yield json.loads(message['data']) if message else None
+        finally:
+            await pubsub.aclose()
+            await client.aclose()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                config = getattr(settings, 'LIVE_UPDATES', {})
+                broker_class = import_string(config.get('BACKEND', 'appointment.live.InProcessBroker'))
+                _broker = broker_class(**config.get('OPTIONS', {}))
+    return _broker
+
+
+def publish(professional_id, event):
+    """
+    Called after commit: the booking is saved whatever happens here, so a broker
+    error only costs the live update (the dashboard still has its reload button).
+    """
+    try:
+        get_broker().publish(professional_id, event)
+    except Exception:
+        logger.exception("Live update for professional %s not published", professional_id)
+
+
+def appointment_event(event_type, appointment):
+    return {
+        'type': event_type,
+        'id': appointment.pk,
+        'date': appointment.date.isoformat(),
+        'time': appointment.time.strftime('%H:%M'),
+        'status': appointment.status,
+    }
+
+
+def format_sse(event):
+    if event is None:
+        # Comment line, keeps proxies from closing the idle connection
+        return ': keepalive\n\n'
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
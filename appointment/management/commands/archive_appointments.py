@@ -0,0 +1,27 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from appointment import archive
+
+
+class Command(BaseCommand):
+    help = (
+        "Move completed and cancelled appointments older than ARCHIVE_AFTER_DAYS (or --before) "
+        "to the archive, a batch per transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', type=datetime.date.fromisoformat,
+                            help="Archive the closed appointments before this date (YYYY-MM-DD).")
+        parser.add_argument('--batch-size', type=int, default=archive.BATCH_SIZE)
+        parser.add_argument('--max-batches', type=int, help="Stop after this many batches, e.g. for a nightly window.")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1")
+
+        cutoff = options['before'] or archive.default_cutoff()
+        moved = archive.archive_closed(cutoff, options['batch_size'], options['max_batches'])
+
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} appointment(s) before {cutoff}."))
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from appointment import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database and measure the latency percentiles and SQL queries "
+        "of the main endpoints. Fails when an endpoint goes over its query budget."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--professionals', type=int, default=20)
+        parser.add_argument('--services', type=int, default=30)
+        parser.add_argument('--days', type=int, default=30, help="Days with seeded appointments, from today.")
+        parser.add_argument('--per-day', type=int, default=6, help="Appointments per professional and day (max 9).")
+        parser.add_argument('--iterations', type=int, default=50, help="Calls per endpoint.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed of the data and the requests.")
+
+    def handle(self, *args, **options):
+        # Never on the real data: a test database is created and destroyed around the run
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+        try:
+            dataset = benchmark.seed(
+                professionals=options['professionals'],
+                services=options['services'],
+                days=options['days'],
+                per_day=options['per_day'],
+                random_seed=options['seed'],
+            )
+            results = benchmark.Benchmark(dataset, random_seed=options['seed']).run(options['iterations'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        self.stdout.write(
+            f"{'endpoint':<16}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}{'budget':>8}{'errors':>8}"
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<16}{result['p50']:>10.1f}{result['p95']:>10.1f}{result['p99']:>10.1f}"
+                f"{result['queries']:>9}{result['budget']:>8}{result['errors']:>8}"
+            )
+
+        exceeded = benchmark.over_budget(results)
+        if exceeded:
+            raise CommandError("Over the query budget: " + ", ".join(
+                f"{name} ({result['queries']} > {result['budget']})" for name, result in exceeded.items()
+            ))
@@ -0,0 +1,73 @@
+import statistics
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+# (sync path, async path) pairs under /api/
+ENDPOINTS = [
+    ('categories/', 'async/categories/'),
+    ('services/', 'async/services/'),
+    ('professionals/', 'async/professionals/'),
+    ('slots/?{slots_query}', 'async/slots/?{slots_query}'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the concurrent-request throughput of the sync and async endpoints "
+        "against a running server, e.g. uvicorn appointmentSystem.asgi:application."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000/api/')
+        parser.add_argument('--requests', type=int, default=500, help="Requests per endpoint.")
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument(
+            '--slots-query', default='date=2030-01-07&professional=1&service=1',
+            help="Query string for the slots endpoints.",
+        )
+
+    def fetch(self, url):
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(url, timeout=30) as response:
+                response.read()
+                ok = response.status == 200
+        except (urllib.error.URLError, OSError):
+            ok = False
+        return time.perf_counter() - start, ok
+
+    def run(self, url, total, concurrency):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(self.fetch, [url] * total))
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for latency, _ in results)
+        errors = sum(1 for _, ok in results if not ok)
+        return {
+            'rps': total / elapsed,
+            'p50': statistics.median(latencies) * 1000,
+            'p95': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+            'errors': errors,
+        }
+
+    def handle(self, *args, **options):
+        base_url = options['base_url']
+        total = options['requests']
+        concurrency = options['concurrency']
+
+        self.stdout.write(f"{total} requests per endpoint, {concurrency} concurrent")
+        self.stdout.write(f"{'endpoint':<40}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}")
+
+        for paths in ENDPOINTS:
+            for path in paths:
+                path = path.format(slots_query=options['slots_query'])
+                stats = self.run(base_url + path, total, concurrency)
+                self.stdout.write(
+                    f"{path[:39]:<40}{stats['rps']:>10.1f}{stats['p50']:>10.1f}"
+                    f"{stats['p95']:>10.1f}{stats['errors']:>8}"
+                )
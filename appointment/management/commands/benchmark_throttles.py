@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from appointment import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare DRF's AnonRateThrottle with the sliding window throttle for one client: "
+        "time per request and cached bytes. Uses (and clears) the default cache."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help="Requests of the client.")
+        parser.add_argument('--rate', default='1000/day', help="Rate of both throttles, e.g. 1000/day.")
+
+    def handle(self, *args, **options):
+        results = benchmark.compare_throttles(requests=options['requests'], rate=options['rate'])
+
+        self.stdout.write(f"{'throttle':<16}{'us/request':>12}{'allowed':>9}{'cached bytes':>14}")
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<16}{result['us_per_request']:>12.1f}{result['allowed']:>9}{result['cached_bytes']:>14}"
+            )
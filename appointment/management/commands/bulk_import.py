@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from appointment import importer
+
+
+class Command(BaseCommand):
+    help = "Import services, professionals or historical appointments from a CSV or NDJSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(importer.IMPORTERS))
+        parser.add_argument('path', help="File to read.")
+        parser.add_argument('--format', dest='input_format', choices=importer.FORMATS,
+                            help="csv or ndjson, by the file extension by default.")
+        parser.add_argument('--chunk-size', type=int, default=importer.CHUNK_SIZE,
+                            help="Rows validated and written per transaction.")
+
+    def handle(self, *args, **options):
+        input_format = options['input_format'] or ('csv' if options['path'].endswith('.csv') else 'ndjson')
+
+        started = time.perf_counter()
+        try:
+            # utf-8-sig drops the BOM Excel puts in front of CSV files, newline='' is for the csv module
+            with open(options['path'], encoding='utf-8-sig', newline='') as file:
+                result = importer.import_rows(options['kind'], file, input_format, options['chunk_size'])
+        except OSError as e:
+            raise CommandError(e)
+        elapsed = time.perf_counter() - started
+
+        for error in result.errors:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+        if result.failed > len(result.errors):
+            self.stderr.write(f"... and {result.failed - len(result.errors)} more.")
+        if result.error:
+            self.stderr.write(result.error)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result.created} {options['kind']}, {result.failed} row(s) failed, "
+            f"{(result.created + result.failed) / max(elapsed, 1e-6):.0f} rows/s."
+        ))
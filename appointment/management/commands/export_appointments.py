@@ -0,0 +1,41 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from appointment import export
+from appointment.models import Appointment
+
+
+class Command(BaseCommand):
+    help = "Stream the appointments of a date range (archived ones included) as CSV or NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', type=datetime.date.fromisoformat, required=True,
+                            help="First date (YYYY-MM-DD).")
+        parser.add_argument('--to', dest='date_to', type=datetime.date.fromisoformat, required=True,
+                            help="Last date (YYYY-MM-DD).")
+        parser.add_argument('--professional', type=int)
+        parser.add_argument('--status', choices=[status for status, _ in Appointment.STATUS_CHOICES])
+        parser.add_argument('--format', dest='output_format', choices=list(export.FORMATS), default='csv')
+        parser.add_argument('--output', help="File to write, stdout by default.")
+
+    def handle(self, *args, **options):
+        if options['date_to'] < options['date_from']:
+            raise CommandError("--to is before --from")
+
+        rows = export.rows(options['date_from'], options['date_to'], options['professional'], options['status'])
+        lines = export.lines(options['output_format'], rows)
+
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+
+        # newline='', the csv module writes its own line endings
+        count = -1 if options['output_format'] == 'csv' else 0  # without the header
+        with open(options['output'], 'w', encoding='utf-8', newline='') as file:
+            for line in lines:
+                file.write(line)
+                count += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Exported {count} appointment(s) to {options['output']}."))
@@ -0,0 +1,19 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from appointment import recurrence
+from appointment.models import AppointmentSeries
+
+
+class Command(BaseCommand):
+    help = "Create the appointments of the recurring series for the next N days (the rolling horizon)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=recurrence.HORIZON_DAYS)
+
+    def handle(self, *args, **options):
+        until = timezone.localdate() + datetime.timedelta(days=options['days'])
+        created = recurrence.materialize(AppointmentSeries.objects.all(), until)
+        self.stdout.write(self.style.SUCCESS(f"Created {created} appointment(s) until {until}."))
@@ -0,0 +1,40 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+
+from appointment import rollups
+from appointment.models import AppointmentRecord
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily rollups (DailyStats) from the appointments, e.g. to backfill the history."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', type=datetime.date.fromisoformat,
+                            help="First date (YYYY-MM-DD), the first appointment by default.")
+        parser.add_argument('--to', dest='date_to', type=datetime.date.fromisoformat,
+                            help="Last date (YYYY-MM-DD), the last appointment by default.")
+        parser.add_argument('--professional', type=int)
+        parser.add_argument('--chunk-days', type=int, default=31, help="Days rebuilt per transaction.")
+
+    def handle(self, *args, **options):
+        bounds = AppointmentRecord.objects.aggregate(first=Min('date'), last=Max('date'))
+        date_from = options['date_from'] or bounds['first']
+        date_to = options['date_to'] or bounds['last']
+        if date_from is None or date_to is None:
+            self.stdout.write("No appointments.")
+            return
+        if date_to < date_from:
+            raise CommandError("--to is before --from")
+
+        # A month at a time, so a long history doesn't hold one huge transaction
+        step = datetime.timedelta(days=options['chunk_days'])
+        chunk_start = date_from
+        rows = 0
+        while chunk_start <= date_to:
+            chunk_end = min(chunk_start + step - datetime.timedelta(days=1), date_to)
+            rows += rollups.rebuild(chunk_start, chunk_end, options['professional'])
+            chunk_start = chunk_end + datetime.timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} daily row(s) from {date_from} to {date_to}."))
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from appointment import outbox
+
+
+class Command(BaseCommand):
+    help = "Send the queued emails in batches. With --loop keeps polling the outbox."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=outbox.BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true', help="Run until stopped instead of one pass.")
+        parser.add_argument('--interval', type=float, default=5, help="Seconds to wait when the outbox is empty.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        while True:
+            total_sent = total_failed = 0
+
+            # Drain everything which is due, batch after batch
+            while True:
+                sent, failed = outbox.drain_outbox(batch_size)
+                total_sent += sent
+                total_failed += failed
+                if sent + failed < batch_size:
+                    break
+
+            if total_sent or total_failed or not options['loop']:
+                self.stdout.write(f"Sent: {total_sent}, failed: {total_failed}")
+
+            if not options['loop']:
+                break
+
+            time.sleep(options['interval'])
@@ -0,0 +1,38 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from appointment import availability, scheduling
+from appointment.models import Professional, Service
+
+
+class Command(BaseCommand):
+    help = "Precompute the free slots of every active professional and service for the next N days."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=14, help="How many days ahead, including today.")
+
+    def handle(self, *args, **options):
+        days = options['days']
+        if days < 1:
+            self.stderr.write("--days must be at least 1")
+            return
+
+        today = timezone.localdate()
+        dates = list(scheduling.date_range(today, today + datetime.timedelta(days=days - 1)))
+
+        professionals = Professional.objects.filter(is_active=True).prefetch_related(
+            Prefetch('services', queryset=Service.objects.select_related('category'))
+        )
+        warmed = 0
+
+        for professional in professionals:
+            # Services with the same duration and step share the cached slots
+            grids = {(service.duration, service.get_slot_step()) for service in professional.services.all()}
+            for duration, step in grids:
+                availability.get_free_minutes(professional, duration, dates, step)
+                warmed += len(dates)
+
+        self.stdout.write(self.style.SUCCESS(f"Warmed {warmed} day(s) of slots."))
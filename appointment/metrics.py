@@ -0,0 +1,198 @@
+"""
+Request metrics in the Prometheus text format, served on /metrics.
+
+MetricsMiddleware records for every request, labelled with the resolved URL
+name (available-slots, book-appointment, ...):
+- the latency histogram and the responses by status code,
+- the SQL queries and the SQL time, counted by a database execute wrapper
+  (installed on every connection, see signals.py).
+
+The numbers are kept in this process with a lock and a few additions per
+request, cheap enough to stay on under full load. With several workers every
+worker has its own numbers, so scrape the workers one by one or aggregate by
+the `instance` label in Prometheus.
+"""
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+UNMATCHED = '<unmatched>'
+
+# [query count, query time] of the current request; None outside of a request
+_request_queries = contextvars.ContextVar('request_queries', default=None)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labels):
+        lines = []
+        cumulative = 0
+        for bucket, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bucket}"}} {cumulative}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+        return lines
+
+
+class ViewMetrics:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.query_seconds = 0.0
+        self.responses = {}
+
+
+class Registry:
+    def __init__(self):
+        self.views = {}
+        self.lock = threading.Lock()
+
+    def record(self, view, method, status, seconds, queries, query_seconds):
+        with self.lock:
+            metrics = self.views.get((view, method))
+            if metrics is None:
+                metrics = self.views[(view, method)] = ViewMetrics()
+
+            metrics.latency.observe(seconds)
+            metrics.queries.observe(queries)
+            metrics.query_seconds += query_seconds
+            metrics.responses[status] = metrics.responses.get(status, 0) + 1
+
+    def clear(self):
+        with self.lock:
+            self.views.clear()
+
+    def render(self):
+        with self.lock:
+            items = sorted(self.views.items())
+
+            lines = [
+                '# HELP http_request_duration_seconds Request latency by URL name.',
+                '# TYPE http_request_duration_seconds histogram',
+            ]
+            for (view, method), metrics in items:
+                lines += metrics.latency.render('http_request_duration_seconds', _labels(view, method))
+
+            lines += [
+                '# HELP http_responses_total Responses by URL name and status code.',
+                '# TYPE http_responses_total counter',
+            ]
+            for (view, method), metrics in items:
+                for status, count in sorted(metrics.responses.items()):
+                    lines.append(f'http_responses_total{{{_labels(view, method)},status="{status}"}} {count}')
+
+            lines += [
+                '# HELP http_request_db_queries SQL queries per request by URL name.',
+                '# TYPE http_request_db_queries histogram',
+            ]
+            for (view, method), metrics in items:
+                lines += metrics.queries.render('http_request_db_queries', _labels(view, method))
+
+            lines += [
+                '# HELP http_request_db_seconds_total Time spent in SQL queries by URL name.',
+                '# TYPE http_request_db_seconds_total counter',
+            ]
+            for (view, method), metrics in items:
+                lines.append(f'http_request_db_seconds_total{{{_labels(view, method)}}} {metrics.query_seconds}')
+
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def _labels(view, method):
+    view = view.replace('\\', '\\\\').replace('"', '\\"')
+    return f'view="{view}",method="{method}"'
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper, counts the queries of the current request."""
+    stats = _request_queries.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats[0] += 1
+        stats[1] += time.perf_counter() - started
+
+
+class MetricsMiddleware:
+    """
+    Goes first in MIDDLEWARE, so the latency covers the other middleware too.
+    Works for sync and async views: the query counter lives in a context
+    variable, which the async ORM carries over to its worker thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        stats, token, started = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_queries.reset(token)
+        self.finish(request, response, stats, started)
+        return response
+
+    async def __acall__(self, request):
+        stats, token, started = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_queries.reset(token)
+        self.finish(request, response, stats, started)
+        return response
+
+    @staticmethod
+    def start():
+        stats = [0, 0.0]
+        return stats, _request_queries.set(stats), time.perf_counter()
+
+    @staticmethod
+    def finish(request, response, stats, started):
+        # Streaming responses (the SSE events) are measured until the headers, not until the end
+        match = getattr(request, 'resolver_match', None)
+        view = (match.url_name or match.view_name) if match else UNMATCHED
+        registry.record(
+            view, request.method, response.status_code, time.perf_counter() - started, stats[0], stats[1]
+        )
+
+
+def metrics_view(request):
+    # With METRICS_TOKEN set, Prometheus has to send it as a bearer token
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponse(status=403)
+
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointment', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('status', 'cancelled'), _negated=True), fields=['professional', 'date', 'time'], name='appt_pro_date_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['professional', 'date', 'time'], name='appt_pro_date_time_idx'),
+        ),
+    ]
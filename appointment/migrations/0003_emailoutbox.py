@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointment', '0002_appointment_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=255, verbose_name='Тема')),
+                ('message', models.TextField(verbose_name='Съобщение')),
+                ('from_email', models.CharField(max_length=254, verbose_name='Подател')),
+                ('recipients', models.JSONField(default=list, verbose_name='Получатели')),
+                ('status', models.CharField(choices=[('pending', 'Чака изпращане'), ('sent', 'Изпратен'), ('failed', 'Неуспешен')], default='pending', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Опити')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Следващ опит')),
+                ('last_error', models.TextField(blank=True, verbose_name='Последна грешка')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Имейл за изпращане',
+                'verbose_name_plural': 'Имейли за изпращане',
+                'ordering': ['id'],
+                'indexes': [models.Index(condition=models.Q(('status', 'pending')), fields=['next_attempt_at'], name='outbox_pending_due_idx')],
+            },
+        ),
+    ]
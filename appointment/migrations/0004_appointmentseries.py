@@ -0,0 +1,50 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:07
+
+import accounts.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointment', '0003_emailoutbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('client_name', models.CharField(max_length=100, verbose_name='Име на клиента')),
+                ('client_phone', models.CharField(max_length=17, validators=[accounts.validators.PhoneNumberValidator()], verbose_name='Телефон за връзка')),
+                ('client_email', models.EmailField(blank=True, max_length=254, null=True, verbose_name='Имейл за контакт')),
+                ('start_date', models.DateField(verbose_name='Първа дата')),
+                ('end_date', models.DateField(verbose_name='Последна дата')),
+                ('time', models.TimeField(verbose_name='Час')),
+                ('interval_weeks', models.PositiveSmallIntegerField(default=1, verbose_name='На всеки (седмици)')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Активна')),
+                ('materialized_until', models.DateField(blank=True, null=True, verbose_name='Създадени до')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('professional', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='series', to='appointment.professional', verbose_name='Служител')),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='appointment.service', verbose_name='Услуга')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='appointment_series', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Повтаряща се резервация',
+                'verbose_name_plural': 'Повтарящи се резервации',
+                'ordering': ['start_date', 'time'],
+            },
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='series',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='appointments', to='appointment.appointmentseries', verbose_name='Серия'),
+        ),
+        migrations.AddIndex(
+            model_name='appointmentseries',
+            index=models.Index(fields=['professional', 'end_date'], name='series_pro_end_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+from accounts.validators import normalize_phone_number
+
+BATCH_SIZE = 2000
+
+
+def normalize_contacts(apps, schema_editor):
+    # Existing rows in the same form as the new ones, a batch at a time
+    for model_name in ['Appointment', 'AppointmentSeries']:
+        model = apps.get_model('appointment', model_name)
+        batch = []
+
+        for row in model.objects.only('pk', 'client_phone', 'client_email').iterator(chunk_size=BATCH_SIZE):
+            phone = normalize_phone_number(row.client_phone)
+            email = row.client_email.lower() if row.client_email else row.client_email
+            if (phone, email) != (row.client_phone, row.client_email):
+                row.client_phone, row.client_email = phone, email
+                batch.append(row)
+
+            if len(batch) >= BATCH_SIZE:
+                model.objects.bulk_update(batch, ['client_phone', 'client_email'])
+                batch = []
+
+        model.objects.bulk_update(batch, ['client_phone', 'client_email'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointment', '0004_appointmentseries'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_contacts, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['client_phone', 'date', 'time'], name='appt_client_phone_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['client_email', 'date', 'time'], name='appt_client_email_idx'),
+        ),
+    ]
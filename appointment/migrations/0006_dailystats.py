@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointment', '0005_client_contact_lookup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('booked_minutes', models.IntegerField(default=0, verbose_name='Заети минути')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Оборот')),
+                ('pending_count', models.IntegerField(default=0, verbose_name='Изчакващи')),
+                ('confirmed_count', models.IntegerField(default=0, verbose_name='Потвърдени')),
+                ('cancelled_count', models.IntegerField(default=0, verbose_name='Отказани')),
+                ('completed_count', models.IntegerField(default=0, verbose_name='Приключени')),
+                ('professional', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='appointment.professional', verbose_name='Служител')),
+            ],
+            options={
+                'verbose_name': 'Дневна статистика',
+                'verbose_name_plural': 'Дневни статистики',
+                'ordering': ['date', 'professional'],
+                'indexes': [models.Index(fields=['date'], name='daily_stats_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('professional', 'date'), name='daily_stats_pro_date_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointment', '0006_dailystats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkingHours',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'Понеделник'), (1, 'Вторник'), (2, 'Сряда'), (3, 'Четвъртък'), (4, 'Петък'), (5, 'Събота'), (6, 'Неделя')], verbose_name='Ден от седмицата')),
+                ('start_time', models.TimeField(verbose_name='Начало')),
+                ('end_time', models.TimeField(verbose_name='Край')),
+                ('break_start', models.TimeField(blank=True, null=True, verbose_name='Начало на почивката')),
+                ('break_end', models.TimeField(blank=True, null=True, verbose_name='Край на почивката')),
+                ('professional', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='working_hours', to='appointment.professional', verbose_name='Служител')),
+            ],
+            options={
+                'verbose_name': 'Работно време',
+                'verbose_name_plural': 'Работно време',
+                'ordering': ['weekday', 'start_time'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ScheduleException',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('start_time', models.TimeField(blank=True, null=True, verbose_name='Начало')),
+                ('end_time', models.TimeField(blank=True, null=True, verbose_name='Край')),
+                ('reason', models.CharField(blank=True, max_length=100, verbose_name='Причина')),
+                ('professional', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='schedule_exceptions', to='appointment.professional', verbose_name='Служител')),
+            ],
+            options={
+                'verbose_name': 'Изключение в графика',
+                'verbose_name_plural': 'Изключения в графика',
+                'ordering': ['date', 'start_time'],
+                'indexes': [models.Index(fields=['professional', 'date'], name='schedule_exc_pro_date_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointment', '0007_working_hours'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='businesscategory',
+            name='slot_step',
+            field=models.PositiveSmallIntegerField(choices=[(10, '10 минути'), (15, '15 минути'), (20, '20 минути'), (30, '30 минути'), (60, '60 минути')], default=30, verbose_name='Стъпка на свободните часове'),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='slot_step',
+            field=models.PositiveSmallIntegerField(blank=True, choices=[(10, '10 минути'), (15, '15 минути'), (20, '20 минути'), (30, '30 минути'), (60, '60 минути')], help_text='Празно - според категорията', null=True, verbose_name='Стъпка на свободните часове'),
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+COLUMNS = ', '.join(f'"{column}"' for column in [
+    'id', 'user_id', 'professional_id', 'service_id', 'client_name', 'client_phone', 'client_email',
+    'date', 'time', 'status', 'created_at', 'series_id',
+])
+
+# AppointmentRecord: the live and the archived appointments as one table
+CREATE_VIEW = f"""
+CREATE VIEW "appointment_appointmentrecord" AS
+SELECT {COLUMNS}, FALSE AS "is_archived" FROM "appointment_appointment"
+UNION ALL
+SELECT {COLUMNS}, TRUE AS "is_archived" FROM "appointment_archivedappointment"
+"""
+
+DROP_VIEW = 'DROP VIEW IF EXISTS "appointment_appointmentrecord"'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointment', '0008_slot_step'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentRecord',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('client_name', models.CharField(max_length=100, verbose_name='Име на клиента')),
+                ('client_phone', models.CharField(max_length=17, verbose_name='Телефон за връзка')),
+                ('client_email', models.EmailField(max_length=254, null=True, verbose_name='Имейл за контакт')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('time', models.TimeField(verbose_name='Час')),
+                ('status', models.CharField(choices=[('pending', '⏳ Изчаква'), ('confirmed', '✅ Потвърден'), ('cancelled', '❌ Отказан'), ('completed', '🏁 Приключен')], max_length=20)),
+                ('created_at', models.DateTimeField()),
+                ('is_archived', models.BooleanField(verbose_name='Архивирана')),
+            ],
+            options={
+                'verbose_name': 'Резервация (с архива)',
+                'verbose_name_plural': 'Всички резервации (с архива)',
+                'db_table': 'appointment_appointmentrecord',
+                'ordering': ['-date', '-time'],
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedAppointment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('client_name', models.CharField(max_length=100, verbose_name='Име на клиента')),
+                ('client_phone', models.CharField(max_length=17, verbose_name='Телефон за връзка')),
+                ('client_email', models.EmailField(blank=True, max_length=254, null=True, verbose_name='Имейл за контакт')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('time', models.TimeField(verbose_name='Час')),
+                ('status', models.CharField(choices=[('pending', '⏳ Изчаква'), ('confirmed', '✅ Потвърден'), ('cancelled', '❌ Отказан'), ('completed', '🏁 Приключен')], max_length=20)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(verbose_name='Архивирана на')),
+                ('professional', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_appointments', to='appointment.professional', verbose_name='Служител')),
+                ('series', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_appointments', to='appointment.appointmentseries', verbose_name='Серия')),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='appointment.service', verbose_name='Услуга')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_appointments', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Архивирана резервация',
+                'verbose_name_plural': 'Архивирани резервации',
+                'ordering': ['-date', '-time'],
+                'indexes': [models.Index(fields=['client_phone', 'date', 'time'], name='archive_client_phone_idx'), models.Index(fields=['client_email', 'date', 'time'], name='archive_client_email_idx'), models.Index(fields=['professional', 'date'], name='archive_pro_date_idx')],
+            },
+        ),
+        migrations.RunSQL(CREATE_VIEW, DROP_VIEW),
+    ]
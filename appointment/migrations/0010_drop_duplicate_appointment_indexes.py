@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+COLUMNS = ', '.join(f'"{column}"' for column in [
+    'id', 'user_id', 'professional_id', 'service_id', 'client_name', 'client_phone', 'client_email',
+    'date', 'time', 'status', 'created_at', 'series_id',
+])
+
+# The AppointmentRecord view of 0009. SQLite rebuilds the table to alter a field,
+# which a view on it doesn't survive, so it is dropped and created again around it
+CREATE_VIEW = f"""
+CREATE VIEW "appointment_appointmentrecord" AS
+SELECT {COLUMNS}, FALSE AS "is_archived" FROM "appointment_appointment"
+UNION ALL
+SELECT {COLUMNS}, TRUE AS "is_archived" FROM "appointment_archivedappointment"
+"""
+
+DROP_VIEW = 'DROP VIEW IF EXISTS "appointment_appointmentrecord"'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointment', '0009_appointment_archive'),
+    ]
+
+    operations = [
+        migrations.RunSQL(DROP_VIEW, CREATE_VIEW),
+        migrations.RemoveIndex(
+            model_name='appointment',
+            name='appt_pro_date_active_idx',
+        ),
+        migrations.AlterField(
+            model_name='appointment',
+            name='professional',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='appointments', to='appointment.professional', verbose_name='Служител'),
+        ),
+        migrations.RunSQL(CREATE_VIEW, DROP_VIEW),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointment', '0010_drop_duplicate_appointment_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='emailoutbox',
+            name='outbox_pending_due_idx',
+        ),
+        migrations.AlterField(
+            model_name='emailoutbox',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Чака изпращане'), ('sending', 'Изпраща се'), ('sent', 'Изпратен'), ('failed', 'Неуспешен')], default='pending', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='emailoutbox',
+            index=models.Index(condition=models.Q(('status__in', ['pending', 'sending'])), fields=['next_attempt_at'], name='outbox_pending_due_idx'),
+        ),
+    ]
@@ -4,14 +4,28 @@ from django.db.models import SET_NULL
 from django.utils import timezone
 import datetime
 
-from accounts.validators import PhoneNumberValidator
+from accounts.validators import PhoneNumberValidator, normalize_phone_number
 from appointmentSystem import settings
 
 
+SLOT_STEP_CHOICES = [
+    (10, '10 минути'),
+    (15, '15 минути'),
+    (20, '20 минути'),
+    (30, '30 минути'),
+    (60, '60 минути'),
+]
+
+
 class BusinessCategory(models.Model):
     name = models.CharField(max_length=50, verbose_name="Име (напр. Барбър")
     slug = models.SlugField(unique=True, primary_key=True, verbose_name="Код (Slug)")
     icon = models.CharField(max_length=10, default='🏢', verbose_name="Емоджи икона")
+    slot_step = models.PositiveSmallIntegerField(
+        choices=SLOT_STEP_CHOICES,
+        default=30,
+        verbose_name="Стъпка на свободните часове"
+    )
 
     def __str__(self):
         return f"{self.icon} {self.name}"
@@ -31,10 +45,28 @@ class Service(models.Model):
         related_name='services',
         verbose_name="Категория"
     )
+    slot_step = models.PositiveSmallIntegerField(
+        choices=SLOT_STEP_CHOICES,
+        null=True,
+        blank=True,
+        verbose_name="Стъпка на свободните часове",
+        help_text="Празно - според категорията"
+    )
 
     def __str__(self):
         return f"{self.name} {self.duration}"
 
+    def get_slot_step(self):
+        # Load the service with select_related('category'), or this is one more query
+        return self.slot_step or self.category.slot_step
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded price and duration, so changing them can correct the daily rollups
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
     class Meta:
         verbose_name = "Услуга"
         verbose_name_plural = "Услуги"
@@ -66,7 +98,8 @@ class Professional(models.Model):
     )
 
     is_active = models.BooleanField(default=True, verbose_name="Активен служител")
-    # Here I also can add open hours for the future
+    # The shift above is for every day, unless the professional has WorkingHours
+    # (weekly template) or ScheduleException (days off, other hours on a date) rows
 
     def __str__(self):
         return self.name
@@ -77,6 +110,183 @@ class Professional(models.Model):
 
 
 
+WEEKDAY_CHOICES = [
+    (0, 'Понеделник'),
+    (1, 'Вторник'),
+    (2, 'Сряда'),
+    (3, 'Четвъртък'),
+    (4, 'Петък'),
+    (5, 'Събота'),
+    (6, 'Неделя'),
+]
+
+
+class WorkingHours(models.Model):
+    """
+    A shift of the weekly template, e.g. Monday 10:00 - 18:00 with a break 13:00 - 14:00.
+    More rows for the same weekday are more shifts, a weekday without rows is a day off.
+    """
+    professional = models.ForeignKey(
+        Professional,
+        on_delete=models.CASCADE,
+        related_name="working_hours",
+        verbose_name="Служител"
+    )
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES, verbose_name="Ден от седмицата")
+    start_time = models.TimeField(verbose_name="Начало")
+    end_time = models.TimeField(verbose_name="Край")
+    break_start = models.TimeField(null=True, blank=True, verbose_name="Начало на почивката")
+    break_end = models.TimeField(null=True, blank=True, verbose_name="Край на почивката")
+
+    class Meta:
+        ordering = ['weekday', 'start_time']
+        verbose_name = 'Работно време'
+        verbose_name_plural = 'Работно време'
+
+    def __str__(self):
+        return f"{self.get_weekday_display()} {self.start_time:%H:%M} - {self.end_time:%H:%M}"
+
+    def clean(self):
+        if self.start_time is None or self.end_time is None:
+            return  # reported by the field validation
+
+        if self.end_time <= self.start_time:
+            raise ValidationError("Краят на смяната е преди началото.")
+
+        if (self.break_start is None) != (self.break_end is None):
+            raise ValidationError("Попълнете и началото, и края на почивката.")
+
+        if self.break_start is not None and not (self.start_time <= self.break_start < self.break_end <= self.end_time):
+            raise ValidationError("Почивката трябва да е в рамките на смяната.")
+
+
+class ScheduleException(models.Model):
+    """
+    A date which doesn't follow the weekly template. Without hours it is a day off
+    (holiday, sick day), with hours they replace the template for that date
+    (more rows for the same date are more shifts).
+    """
+    professional = models.ForeignKey(
+        Professional,
+        on_delete=models.CASCADE,
+        related_name="schedule_exceptions",
+        verbose_name="Служител"
+    )
+    date = models.DateField(verbose_name="Дата")
+    start_time = models.TimeField(null=True, blank=True, verbose_name="Начало")
+    end_time = models.TimeField(null=True, blank=True, verbose_name="Край")
+    reason = models.CharField(max_length=100, blank=True, verbose_name="Причина")
+
+    class Meta:
+        ordering = ['date', 'start_time']
+        verbose_name = 'Изключение в графика'
+        verbose_name_plural = 'Изключения в графика'
+        indexes = [
+            models.Index(fields=['professional', 'date'], name='schedule_exc_pro_date_idx'),
+        ]
+
+    def __str__(self):
+        if self.is_day_off:
+            return f"{self.date} - почивен ден"
+        return f"{self.date} {self.start_time:%H:%M} - {self.end_time:%H:%M}"
+
+    @property
+    def is_day_off(self):
+        return self.start_time is None or self.end_time is None
+
+    def clean(self):
+        if (self.start_time is None) != (self.end_time is None):
+            raise ValidationError("Попълнете и началото, и края, или нито едно за почивен ден.")
+
+        if self.start_time is not None and self.end_time <= self.start_time:
+            raise ValidationError("Краят е преди началото.")
+
+
+class AppointmentSeries(models.Model):
+    """
+    A recurring booking, e.g. every 2 weeks on Tuesday at 10:00 for 6 months.
+    The rule is stored once. Occurrences become Appointment rows only up to a
+    rolling horizon (see recurrence.py), later ones are counted from the rule.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=SET_NULL,
+        null=True,
+        blank=True,
+        related_name="appointment_series",
+    )
+
+    professional = models.ForeignKey(
+        Professional,
+        on_delete=models.CASCADE,
+        related_name="series",
+        verbose_name="Служител"
+    )
+
+    service = models.ForeignKey(
+        Service,
+        on_delete=models.CASCADE,
+        verbose_name="Услуга"
+    )
+
+    client_name = models.CharField(max_length=100, verbose_name="Име на клиента")
+    client_phone = models.CharField(
+        validators=[PhoneNumberValidator(),],
+        max_length=17,
+        verbose_name="Телефон за връзка",
+    )
+    client_email = models.EmailField(blank=True, null=True, verbose_name="Имейл за контакт")
+
+    # --- Rule ---
+    start_date = models.DateField(verbose_name="Първа дата")
+    end_date = models.DateField(verbose_name="Последна дата")
+    time = models.TimeField(verbose_name="Час")
+    interval_weeks = models.PositiveSmallIntegerField(default=1, verbose_name="На всеки (седмици)")
+
+    is_active = models.BooleanField(default=True, verbose_name="Активна")
+    # Occurrences until this date (included) already exist as Appointment rows
+    materialized_until = models.DateField(null=True, blank=True, verbose_name="Създадени до")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['start_date', 'time']
+        verbose_name = 'Повтаряща се резервация'
+        verbose_name_plural = 'Повтарящи се резервации'
+        indexes = [
+            models.Index(fields=['professional', 'end_date'], name='series_pro_end_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.client_name} - всеки {self.interval_weeks} седм. от {self.start_date} {self.time}"
+
+    def save(self, *args, **kwargs):
+        # The occurrences copy the contact, so it's normalized here already
+        self.client_phone = normalize_phone_number(self.client_phone)
+        if self.client_email:
+            self.client_email = self.client_email.lower()
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded rule, so changing it can invalidate the old dates too
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def occurrences(self, date_from=None, date_to=None):
+        """Dates of the occurrences between date_from and date_to (both included)."""
+        step = datetime.timedelta(weeks=self.interval_weeks)
+        date_from = max(date_from or self.start_date, self.start_date)
+        date_to = min(date_to or self.end_date, self.end_date)
+
+        # Jump straight to the first occurrence on or after date_from
+        skipped = -(-(date_from - self.start_date).days // step.days)
+        day = self.start_date + skipped * step
+        while day <= date_to:
+            yield day
+            day += step
+
+
 class Appointment(models.Model):
     STATUS_CHOICES = [
         ('pending', '⏳ Изчаква'),
@@ -85,6 +295,15 @@ class Appointment(models.Model):
         ('completed', '🏁 Приключен'),
     ]
 
+    # Allowed status changes. Closed appointments stay closed
+    # (reopening a cancelled one would skip the overlap check)
+    STATUS_TRANSITIONS = {
+        'pending': ['confirmed', 'cancelled', 'completed'],
+        'confirmed': ['cancelled', 'completed'],
+        'cancelled': [],
+        'completed': [],
+    }
+
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=SET_NULL,
@@ -97,7 +316,8 @@ class Appointment(models.Model):
         Professional,
         on_delete=models.CASCADE,
         related_name="appointments",
-        verbose_name="Служител"
+        verbose_name="Служител",
+        db_index=False,  # appt_pro_date_time_idx starts with it
     )
 
     service = models.ForeignKey(
@@ -122,14 +342,47 @@ class Appointment(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Set for the occurrences of a recurring booking
+    series = models.ForeignKey(
+        AppointmentSeries,
+        on_delete=SET_NULL,
+        null=True,
+        blank=True,
+        related_name='appointments',
+        verbose_name="Серия"
+    )
+
     class Meta:
         ordering = ['-date', '-time']
         verbose_name = 'Резервация'
         verbose_name_plural = 'Резервации'
+        indexes = [
+            # Professional schedule (professional + date >= today, ordered by date and time), slots and
+            # overlap validation (professional + date, the few cancelled rows are filtered out on the way).
+            # Also serves the lookups by professional, so the foreign key has no index of its own
+            models.Index(fields=['professional', 'date', 'time'], name='appt_pro_date_time_idx'),
+            # Client history: the visits of a phone number / email, ordered by date
+            models.Index(fields=['client_phone', 'date', 'time'], name='appt_client_phone_idx'),
+            models.Index(fields=['client_email', 'date', 'time'], name='appt_client_email_idx'),
+        ]
 
     def __str__(self):
         return f"{self.client_name} - {self.date} {self.time}"
 
+    def save(self, *args, **kwargs):
+        # Stored in one form, so '0888...' and '+359888...' are found as the same client
+        self.client_phone = normalize_phone_number(self.client_phone)
+        if self.client_email:
+            self.client_email = self.client_email.lower()
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded values, so moving an appointment can invalidate the old day too
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
     # --- Business Logic ---
     def end_time(self):
         # calculate the end time based on the services
@@ -152,3 +405,177 @@ class Appointment(models.Model):
             return f"{self.client_name} (Гост)"
 
 
+class ArchivedAppointment(models.Model):
+    """
+    Closed (completed / cancelled) appointments older than ARCHIVE_AFTER_DAYS,
+    moved out of Appointment by the `archive_appointments` command (see archive.py),
+    so the hot queries don't run over years of history. Same columns and ids as
+    Appointment, read both together through AppointmentRecord.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=SET_NULL,
+        null=True,
+        blank=True,
+        related_name="archived_appointments",
+    )
+    professional = models.ForeignKey(
+        Professional,
+        on_delete=models.CASCADE,
+        related_name="archived_appointments",
+        verbose_name="Служител"
+    )
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, verbose_name="Услуга")
+    client_name = models.CharField(max_length=100, verbose_name="Име на клиента")
+    client_phone = models.CharField(max_length=17, verbose_name="Телефон за връзка")
+    client_email = models.EmailField(blank=True, null=True, verbose_name="Имейл за контакт")
+    date = models.DateField(verbose_name="Дата")
+    time = models.TimeField(verbose_name="Час")
+    status = models.CharField(max_length=20, choices=Appointment.STATUS_CHOICES)
+    created_at = models.DateTimeField()
+    series = models.ForeignKey(
+        AppointmentSeries,
+        on_delete=SET_NULL,
+        null=True,
+        blank=True,
+        related_name='archived_appointments',
+        verbose_name="Серия"
+    )
+    archived_at = models.DateTimeField(verbose_name="Архивирана на")
+
+    class Meta:
+        ordering = ['-date', '-time']
+        verbose_name = 'Архивирана резервация'
+        verbose_name_plural = 'Архивирани резервации'
+        indexes = [
+            # The same lookups as on Appointment: client history and the rollups rebuild
+            models.Index(fields=['client_phone', 'date', 'time'], name='archive_client_phone_idx'),
+            models.Index(fields=['client_email', 'date', 'time'], name='archive_client_email_idx'),
+            models.Index(fields=['professional', 'date'], name='archive_pro_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.client_name} - {self.date} {self.time}"
+
+
+class AppointmentRecord(models.Model):
+    """
+    Read-only: the live and the archived appointments together, over a database
+    view (UNION ALL of both tables, created in migration 0009). Filters go down
+    to both tables and their indexes, select_related() works as usual.
+    Adding a column to Appointment means recreating the view.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.DO_NOTHING, null=True, db_constraint=False, related_name='+'
+    )
+    professional = models.ForeignKey(
+        Professional, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+', verbose_name="Служител"
+    )
+    service = models.ForeignKey(
+        Service, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+', verbose_name="Услуга"
+    )
+    client_name = models.CharField(max_length=100, verbose_name="Име на клиента")
+    client_phone = models.CharField(max_length=17, verbose_name="Телефон за връзка")
+    client_email = models.EmailField(null=True, verbose_name="Имейл за контакт")
+    date = models.DateField(verbose_name="Дата")
+    time = models.TimeField(verbose_name="Час")
+    status = models.CharField(max_length=20, choices=Appointment.STATUS_CHOICES)
+    created_at = models.DateTimeField()
+    series = models.ForeignKey(
+        AppointmentSeries, on_delete=models.DO_NOTHING, null=True, db_constraint=False, related_name='+',
+        verbose_name="Серия"
+    )
+    is_archived = models.BooleanField(verbose_name="Архивирана")
+
+    class Meta:
+        managed = False
+        db_table = 'appointment_appointmentrecord'
+        ordering = ['-date', '-time']
+        verbose_name = 'Резервация (с архива)'
+        verbose_name_plural = 'Всички резервации (с архива)'
+
+    def __str__(self):
+        return f"{self.client_name} - {self.date} {self.time}"
+
+
+class EmailOutbox(models.Model):
+    """
+    Emails waiting to be sent by the `send_outbox` command.
+    Written in the same transaction as the booking, so a slow or failing
+    mail server never delays or breaks the booking itself.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Чака изпращане'),
+        ('sending', 'Изпраща се'),
+        ('sent', 'Изпратен'),
+        ('failed', 'Неуспешен'),
+    ]
+
+    subject = models.CharField(max_length=255, verbose_name="Тема")
+    message = models.TextField(verbose_name="Съобщение")
+    from_email = models.CharField(max_length=254, verbose_name="Подател")
+    recipients = models.JSONField(default=list, verbose_name="Получатели")
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Опити")
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name="Следващ опит")
+    last_error = models.TextField(blank=True, verbose_name="Последна грешка")
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Имейл за изпращане'
+        verbose_name_plural = 'Имейли за изпращане'
+        indexes = [
+            # The worker only looks for due emails, pending or with an expired lease (see outbox.py)
+            models.Index(
+                fields=['next_attempt_at'],
+                condition=models.Q(status__in=['pending', 'sending']),
+                name='outbox_pending_due_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.recipients)}"
+
+
+class DailyStats(models.Model):
+    """
+    Per professional and day: booked minutes, revenue and appointments by status.
+    Kept up to date in the same transaction as the appointment changes (see rollups.py),
+    so the reports read one row per day instead of all the appointments.
+    """
+    professional = models.ForeignKey(
+        Professional,
+        on_delete=models.CASCADE,
+        related_name="daily_stats",
+        verbose_name="Служител"
+    )
+    date = models.DateField(verbose_name="Дата")
+
+    # Without the cancelled appointments
+    booked_minutes = models.IntegerField(default=0, verbose_name="Заети минути")
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Оборот")
+
+    pending_count = models.IntegerField(default=0, verbose_name="Изчакващи")
+    confirmed_count = models.IntegerField(default=0, verbose_name="Потвърдени")
+    cancelled_count = models.IntegerField(default=0, verbose_name="Отказани")
+    completed_count = models.IntegerField(default=0, verbose_name="Приключени")
+
+    class Meta:
+        ordering = ['date', 'professional']
+        verbose_name = 'Дневна статистика'
+        verbose_name_plural = 'Дневни статистики'
+        constraints = [
+            models.UniqueConstraint(fields=['professional', 'date'], name='daily_stats_pro_date_uniq'),
+        ]
+        indexes = [
+            # Reports for the whole salon by date range
+            models.Index(fields=['date'], name='daily_stats_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.professional} - {self.date}"
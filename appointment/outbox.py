@@ -0,0 +1,143 @@
+"""
+Transactional email outbox.
+
+Views only insert an EmailOutbox row (inside their own transaction), the
+`send_outbox` command sends the due emails in batches over one reused SMTP
+connection and retries the failed ones with exponential backoff. A batch is
+claimed in a short transaction and sent outside of it.
+"""
+import datetime
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from appointment.models import EmailOutbox
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 60
+# How long a worker may take for a batch, after that its emails can be claimed again
+LEASE_SECONDS = 300
+DUE_STATUSES = ['pending', 'sending']
+
+
+def build_email(subject, message, recipients, from_email=None):
+    # Not saved yet, so many emails can be written with one bulk_create
+    return EmailOutbox(
+        subject=subject,
+        message=message,
+        from_email=from_email or settings.EMAIL_HOST_USER,
+        recipients=list(recipients),
+    )
+
+
+def enqueue_email(subject, message, recipients, from_email=None):
+    email = build_email(subject, message, recipients, from_email)
+    email.save()
+    return email
+
+
+def retry_delay(attempts):
+    # 1, 2, 4, 8 ... minutes
+    return datetime.timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+
+
+def _record_failure(email, error):
+    # The attempt was counted when the email was claimed
+    email.last_error = str(error)
+    if email.attempts >= MAX_ATTEMPTS:
+        email.status = 'failed'
+    else:
+        email.status = 'pending'
+        email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+    _save(email)
+
+
+def _record_sent(email):
+    email.status = 'sent'
+    email.sent_at = timezone.now()
+    email.last_error = ''
+    _save(email)
+
+
+def _save(email):
+    EmailOutbox.objects.filter(pk=email.pk).update(
+        status=email.status, next_attempt_at=email.next_attempt_at, last_error=email.last_error,
+        sent_at=email.sent_at,
+    )
+
+
+def claim_batch(batch_size=BATCH_SIZE):
+    """
+    Take up to `batch_size` due emails for this worker: they are marked as sending, with a
+    lease of LEASE_SECONDS in next_attempt_at, and the attempt is counted. The transaction
+    only lasts for that, skip_locked keeps two workers from claiming the same rows.
+    An email whose worker stopped while sending is due again when its lease runs out.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # Claimed MAX_ATTEMPTS times without a result (the worker stops on it every time)
+        EmailOutbox.objects.filter(
+            status='sending', next_attempt_at__lte=now, attempts__gte=MAX_ATTEMPTS
+        ).update(status='failed', last_error="Изпращането беше прекъснато.")
+
+        batch = list(
+            EmailOutbox.objects.select_for_update(skip_locked=True)
+            .filter(status__in=DUE_STATUSES, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        lease_until = now + datetime.timedelta(seconds=LEASE_SECONDS)
+        for email in batch:
+            email.status = 'sending'
+            email.attempts += 1
+            email.next_attempt_at = lease_until
+        EmailOutbox.objects.bulk_update(batch, ['status', 'attempts', 'next_attempt_at'])
+
+    return batch
+
+
+def drain_outbox(batch_size=BATCH_SIZE):
+    """
+    Send one batch of due emails. Returns (sent, failed) counts of this batch.
+    The batch is claimed first (see claim_batch) and sent outside of any transaction,
+    the result of every email is saved as soon as it is known. So no row stays locked
+    while the mail server answers, and a crash resends at most the email in flight.
+    """
+    sent = failed = 0
+
+    batch = claim_batch(batch_size)
+    if not batch:
+        return sent, failed
+
+    # One connection for the whole batch instead of one per email
+    mail_connection = get_connection()
+    try:
+        mail_connection.open()
+    except Exception as e:
+        # The mail server is down, every email in the batch waits for the next attempt
+        for email in batch:
+            _record_failure(email, e)
+        return sent, len(batch)
+
+    try:
+        for email in batch:
+            try:
+                EmailMessage(
+                    email.subject,
+                    email.message,
+                    email.from_email,
+                    email.recipients,
+                    connection=mail_connection,
+                ).send(fail_silently=False)
+            except Exception as e:
+                _record_failure(email, e)
+                failed += 1
+            else:
+                _record_sent(email)
+                sent += 1
+    finally:
+        mail_connection.close()
+
+    return sent, failed
@@ -0,0 +1,90 @@
+import base64
+import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class ScheduleKeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination ordered by (date, time, id).
+
+    The cursor is the key of the last row of the previous page, so every page is
+    one index range scan of `page_size` rows, however far ahead the book is filled.
+    DRF's CursorPagination keys on one field only and falls back to offsets for ties.
+    """
+    page_size = 50
+    max_page_size = 200
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            date, time, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(date__gt=date)
+                | Q(date=date, time__gt=time)
+                | Q(date=date, time=time, pk__gt=pk)
+            )
+
+        # One row more than needed tells us if there is a next page without COUNT(*)
+        rows = list(queryset.order_by('date', 'time', 'pk')[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        self.last = rows[-1] if rows else None
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.last))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    @staticmethod
+    def encode_cursor(appointment):
+        raw = f"{appointment.date.isoformat()}|{appointment.time.isoformat()}|{appointment.pk}"
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            date, time, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+            return datetime.date.fromisoformat(date), datetime.time.fromisoformat(time), int(pk)
+        except (ValueError, UnicodeDecodeError):
+            raise NotFound("Невалиден курсор")
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'schema': {'type': 'integer'},
+            },
+        ]
@@ -0,0 +1,157 @@
+"""
+Recurring appointments (AppointmentSeries).
+
+Occurrences are materialised as Appointment rows only up to a rolling horizon
+(HORIZON_DAYS from today, by the `materialize_series` command, or further when
+a schedule for a later date is requested). Occurrences after `materialized_until`
+are "virtual": availability and overlap checks count them from the rule with
+one query for all series of the professional, without loading future rows.
+"""
+import datetime
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, Q
+
+from appointment import rollups, scheduling
+from appointment.models import Appointment, AppointmentSeries
+
+HORIZON_DAYS = 28
+MAX_SERIES_DAYS = 366
+
+
+def _active_series(professional_id, date_from, date_to):
+    return AppointmentSeries.objects.filter(
+        professional_id=professional_id,
+        is_active=True,
+        start_date__lte=date_to,
+        end_date__gte=date_from,
+    ).select_related('service').order_by()
+
+
+def _group_virtual(series_list, date_from, date_to, exclude_series_id=None):
+    bookings_by_date = defaultdict(list)
+
+    for series in series_list:
+        if series.pk == exclude_series_id:
+            continue
+
+        # Only the occurrences which are not Appointment rows yet
+        first_virtual = date_from
+        if series.materialized_until and series.materialized_until >= date_from:
+            first_virtual = series.materialized_until + datetime.timedelta(days=1)
+
+        for day in series.occurrences(first_virtual, date_to):
+            bookings_by_date[day].append((series.time, series.service.duration))
+
+    return bookings_by_date
+
+
+def virtual_bookings(professional_id, date_from, date_to, exclude_series_id=None) -> dict:
+    """{date: [(time, duration)]} of not yet materialised occurrences, with one query."""
+    return _group_virtual(
+        _active_series(professional_id, date_from, date_to), date_from, date_to, exclude_series_id
+    )
+
+
+async def avirtual_bookings(professional_id, date_from, date_to) -> dict:
+    series_list = [series async for series in _active_series(professional_id, date_from, date_to)]
+    return _group_virtual(series_list, date_from, date_to)
+
+
+def find_conflicts(series) -> list:
+    """
+    [(date, (start, end))] for every occurrence of `series` which overlaps an
+    existing booking or an occurrence of another series. Checks the whole series
+    in one pass: one query for the appointments and one for the other series.
+    """
+    dates = list(series.occurrences())
+    if not dates:
+        return []
+
+    existing_appointments = Appointment.objects.filter(
+        professional_id=series.professional_id,
+        date__range=(dates[0], dates[-1])
+    ).exclude(status='cancelled')
+    if series.pk:
+        # The occurrences already created for this series don't conflict with it
+        existing_appointments = existing_appointments.exclude(series_id=series.pk)
+
+    bookings_by_date = defaultdict(list)
+    for booking_date, booking_time, booking_duration in existing_appointments.values_list(
+            'date', 'time', 'service__duration'):
+        bookings_by_date[booking_date].append((booking_time, booking_duration))
+
+    for day, bookings in virtual_bookings(
+            series.professional_id, dates[0], dates[-1], exclude_series_id=series.pk).items():
+        bookings_by_date[day].extend(bookings)
+
+    start, end = scheduling.appointment_interval(series.time, series.service.duration)
+    conflicts = []
+    for day in dates:
+        busy_intervals = scheduling.build_busy_intervals(bookings_by_date.get(day, ()))
+        overlap = scheduling.find_overlap(busy_intervals, start, end)
+        if overlap:
+            conflicts.append((day, overlap))
+
+    return conflicts
+
+
+def _due(series_queryset, until):
+    # The series with occurrences until `until` which aren't Appointment rows yet
+    return (
+        series_queryset
+        .filter(is_active=True, start_date__lte=until)
+        .filter(Q(materialized_until__isnull=True) | Q(materialized_until__lt=F('end_date')))
+        .filter(Q(materialized_until__isnull=True) | Q(materialized_until__lt=until))
+    )
+
+
+def materialize(series_queryset, until) -> int:
+    """
+    Create the Appointment rows of the occurrences until `until` (included).
+    Returns how many rows were created.
+    """
+    # Usually there is nothing to do: a plain read (from the replica on the schedule),
+    # so only a request which creates rows locks the series and reads from the primary
+    if not _due(series_queryset, until).exists():
+        return 0
+
+    with transaction.atomic():
+        series_list = list(_due(series_queryset.select_for_update(), until))
+
+        appointments = []
+        for series in series_list:
+            first = series.start_date
+            if series.materialized_until:
+                first = series.materialized_until + datetime.timedelta(days=1)
+
+            for day in series.occurrences(first, until):
+                appointments.append(Appointment(
+                    user_id=series.user_id,
+                    professional_id=series.professional_id,
+                    service_id=series.service_id,
+                    client_name=series.client_name,
+                    client_phone=series.client_phone,
+                    client_email=series.client_email,
+                    date=day,
+                    time=series.time,
+                    series=series,
+                ))
+            series.materialized_until = min(until, series.end_date)
+
+        # The occurrences were virtual until now, so the availability doesn't change
+        Appointment.objects.bulk_create(appointments)
+        AppointmentSeries.objects.bulk_update(series_list, ['materialized_until'])
+        rollups.update(added=[rollups.describe(appointment) for appointment in appointments])
+
+    return len(appointments)
+
+
+def materialize_for_professional(professional_id, until) -> int:
+    # One read-only query when there is nothing to do
+    return materialize(AppointmentSeries.objects.filter(professional_id=professional_id), until)
+
+
+def default_horizon(today):
+    return today + datetime.timedelta(days=HORIZON_DAYS)
@@ -0,0 +1,142 @@
+"""
+Read replicas: the read-only endpoints read from a replica, everything else
+from the primary (`default`).
+
+A view opts in with `read_from_replica = True` (the catalog, slots and
+schedule views). ReplicaMiddleware picks one replica per request, so all
+reads of a request see the same snapshot, and ReplicaRouter sends the reads
+of that request there. Writes always go to the primary, and so do the reads
+- inside a transaction on the primary (select_for_update, the booking lock),
+- after the request wrote something (e.g. the schedule materializing a series),
+- for a few seconds after a request of the same client wrote something: the
+  response sets a short pin cookie, so the client reads its own booking even
+  if the replica is behind,
+- inside read_from_primary(): the computations which fill a shared cache (slots,
+  catalog, working hours). They store under the version current after the last
+  commit, which a lagging replica may not have yet, and nothing would replace
+  the stale entry until the next change.
+
+Outside of a request (commands, the outbox worker) everything uses the primary.
+
+Locally, two SQLite aliases pointing at the same file behave like a primary
+with an up to date replica, see the commented example in settings.py.
+"""
+import contextlib
+import contextvars
+import random
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'db_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# _RequestState of the current request; None outside of a request
+_request_state = contextvars.ContextVar('replica_request_state', default=None)
+# Set inside read_from_primary()
+_primary_only = contextvars.ContextVar('replica_primary_only', default=False)
+
+
+class _RequestState:
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.alias = None  # the replica for the reads of this request
+        self.wrote = False
+
+
+def replica_aliases():
+    return getattr(settings, 'REPLICA_DATABASES', [])
+
+
+@contextlib.contextmanager
+def read_from_primary():
+    """The reads inside go to the primary, in sync and async code alike."""
+    token = _primary_only.set(True)
+    try:
+        yield
+    finally:
+        _primary_only.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _request_state.get()
+        if state is None or state.alias is None or state.wrote or _primary_only.get():
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # Reads in a transaction must see its locks and its own writes
+            return None
+        return state.alias
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replicas get the schema by replication
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaMiddleware:
+    """
+    Goes before SessionMiddleware, so a session saved on login counts as a write too.
+    Works for sync and async views, the state lives in a context variable like
+    the query counter in metrics.py.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        state, token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return self.finish(response, state)
+
+    async def __acall__(self, request):
+        state, token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return self.finish(response, state)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = _request_state.get()
+        view = getattr(view_func, 'view_class', view_func)
+        aliases = replica_aliases()
+
+        if state and not state.pinned and aliases and request.method in SAFE_METHODS \
+                and getattr(view, 'read_from_replica', False):
+            state.alias = random.choice(aliases)
+        return None
+
+    @staticmethod
+    def start(request):
+        state = _RequestState(pinned=PIN_COOKIE in request.COOKIES)
+        return state, _request_state.set(state)
+
+    @staticmethod
+    def finish(response, state):
+        if state.wrote:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax'
+            )
+        return response
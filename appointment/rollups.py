@@ -0,0 +1,202 @@
+"""
+Daily rollups (DailyStats) for the owner's reports.
+
+Every change of an appointment is turned into deltas of its day: +1 for the
+new status, -1 for the old one, and the booked minutes and the price of the
+service when it isn't cancelled. The deltas of a batch are added with one
+`INSERT ... ON CONFLICT DO UPDATE SET x = x + delta` in the same transaction
+as the change, so concurrent bookings don't overwrite each other's counts and
+a rolled back booking leaves no trace.
+
+An appointment is described by (professional_id, date, status, service_id).
+rebuild() recomputes a date range from the appointments (live and archived,
+through AppointmentRecord), for the backfill
+(the `rebuild_rollups` command) or when the deltas can't be known.
+The rollups count the current price and duration of the services, so changing
+them shifts the days of their appointments (service_changed()).
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Q, Sum
+
+from appointment import scheduling
+from appointment.models import Appointment, AppointmentRecord, DailyStats, Service
+
+REBUILD_BATCH_SIZE = 1000
+FIELDS = ['booked_minutes', 'revenue'] + [f'{status}_count' for status, _ in Appointment.STATUS_CHOICES]
+# Both support INSERT ... ON CONFLICT DO UPDATE, the others update and create row by row
+UPSERT_VENDORS = {'postgresql', 'sqlite'}
+
+
+def status_field(status):
+    return f'{status}_count'
+
+
+def describe(appointment):
+    return appointment.professional_id, appointment.date, appointment.status, appointment.service_id
+
+
+def loaded_services(appointments):
+    """The services already on the appointments, so update() doesn't read them again."""
+    return {
+        appointment.service_id: appointment.service
+        for appointment in appointments
+        if Appointment.service.is_cached(appointment)
+    }
+
+
+def update(added=(), removed=(), services=None):
+    """
+    Apply the appointments which appeared (or moved in) and disappeared (or moved out),
+    both as (professional_id, date, status, service_id). `services` ({id: Service})
+    can pass the services already loaded, the others are read with one query.
+    """
+    added, removed = list(added), list(removed)
+    if not added and not removed:
+        return
+
+    services = dict(services or {})
+    missing = {service_id for _, _, _, service_id in added + removed} - services.keys()
+    if missing:
+        services.update(Service.objects.only('duration', 'price').in_bulk(missing))
+
+    deltas = defaultdict(lambda: dict.fromkeys(FIELDS, 0))
+    for rows, sign in [(added, 1), (removed, -1)]:
+        for professional_id, date, status, service_id in rows:
+            delta = deltas[(professional_id, date)]
+            delta[status_field(status)] += sign
+            if status != 'cancelled':
+                service = services[service_id]
+                delta['booked_minutes'] += sign * scheduling.duration_to_minutes(service.duration)
+                delta['revenue'] += sign * service.price
+
+    # A status change of the same day cancels out in some fields, a move may cancel out completely
+    deltas = {key: delta for key, delta in deltas.items() if any(delta.values())}
+    if not deltas:
+        return
+
+    _save(deltas)
+
+
+def service_changed(service, old_price, old_duration) -> set:
+    """
+    The price or the duration of `service` changed. Every day with its (not cancelled)
+    appointments, live or archived, is shifted by the difference, so the rollups stay
+    what rebuild() computes and removing an appointment later subtracts what was added.
+    Returns these days, {(professional_id, date)}.
+    """
+    price_change = service.price - old_price
+    minutes_change = scheduling.duration_to_minutes(service.duration) - scheduling.duration_to_minutes(old_duration)
+    if not price_change and not minutes_change:
+        return set()
+
+    rows = AppointmentRecord.objects.filter(service_id=service.pk).exclude(status='cancelled').order_by().values(
+        'professional_id', 'date'
+    ).annotate(count=Count('id'))
+
+    days = set()
+    deltas = {}
+    for row in rows.iterator(chunk_size=REBUILD_BATCH_SIZE):
+        delta = dict.fromkeys(FIELDS, 0)
+        delta['booked_minutes'] = row['count'] * minutes_change
+        delta['revenue'] = row['count'] * price_change
+        deltas[(row['professional_id'], row['date'])] = delta
+
+        if len(deltas) >= REBUILD_BATCH_SIZE:
+            _save(deltas)
+            days.update(deltas)
+            deltas = {}
+
+    if deltas:
+        _save(deltas)
+        days.update(deltas)
+    return days
+
+
+def _save(deltas):
+    if connection.vendor in UPSERT_VENDORS:
+        _upsert(deltas)
+    else:
+        for (professional_id, date), delta in deltas.items():
+            _apply(professional_id, date, delta)
+
+
+def _upsert(deltas):
+    # INSERT ... ON CONFLICT DO UPDATE SET x = x + delta, one statement for the whole batch.
+    # bulk_create(update_conflicts=True) can only overwrite the values, not add to them
+    table = connection.ops.quote_name(DailyStats._meta.db_table)
+    columns = ['professional_id', 'date', *FIELDS]
+    quoted = [connection.ops.quote_name(column) for column in columns]
+    row_placeholder = '(' + ', '.join(['%s'] * len(columns)) + ')'
+
+    date_field = DailyStats._meta.get_field('date')
+    revenue_field = DailyStats._meta.get_field('revenue')
+    params = []
+    for (professional_id, date), delta in deltas.items():
+        params += [professional_id, date_field.get_db_prep_value(date, connection)]
+        params += [
+            revenue_field.get_db_prep_save(delta[field], connection) if field == 'revenue' else delta[field]
+            for field in FIELDS
+        ]
+
+    increments = ', '.join(f'{column} = {table}.{column} + EXCLUDED.{column}' for column in quoted[2:])
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({", ".join(quoted)}) VALUES {", ".join([row_placeholder] * len(deltas))} '
+            f'ON CONFLICT ({quoted[0]}, {quoted[1]}) DO UPDATE SET {increments}',
+            params,
+        )
+
+
+def _apply(professional_id, date, delta):
+    rows = DailyStats.objects.filter(professional_id=professional_id, date=date)
+    increments = {field: F(field) + value for field, value in delta.items()}
+    if rows.update(**increments):
+        return
+
+    # The first change of the day creates the row, a concurrent one may have just done that
+    try:
+        with transaction.atomic():
+            DailyStats.objects.create(professional_id=professional_id, date=date, **delta)
+    except IntegrityError:
+        rows.update(**increments)
+
+
+def rebuild(date_from, date_to, professional_id=None) -> int:
+    """Recompute the rollups of the range from the appointments. Returns the number of rows."""
+    appointments = AppointmentRecord.objects.filter(date__range=(date_from, date_to))
+    stats = DailyStats.objects.filter(date__range=(date_from, date_to))
+    if professional_id:
+        appointments = appointments.filter(professional_id=professional_id)
+        stats = stats.filter(professional_id=professional_id)
+
+    active = ~Q(status='cancelled')
+    rows = appointments.order_by().values('professional_id', 'date').annotate(
+        booked_duration=Sum('service__duration', filter=active),
+        revenue=Sum('service__price', filter=active),
+        **{
+            status_field(status): Count('id', filter=Q(status=status))
+            for status, _ in Appointment.STATUS_CHOICES
+        },
+    )
+
+    created = 0
+    with transaction.atomic():
+        stats.delete()
+
+        batch = []
+        for row in rows.iterator(chunk_size=REBUILD_BATCH_SIZE):
+            booked_duration = row.pop('booked_duration')
+            row['booked_minutes'] = scheduling.duration_to_minutes(booked_duration) if booked_duration else 0
+            row['revenue'] = row['revenue'] or Decimal(0)
+            batch.append(DailyStats(**row))
+
+            if len(batch) >= REBUILD_BATCH_SIZE:
+                created += len(DailyStats.objects.bulk_create(batch))
+                batch = []
+
+        created += len(DailyStats.objects.bulk_create(batch))
+
+    return created
@@ -0,0 +1,148 @@
+"""
+Scheduling engine for availability and overlap checks.
+
+Everything here works on integer minutes since midnight. Times are converted
+once, busy intervals are sorted and merged, and free slots are slices of a
+memoized candidate grid between the bookings (or a bisect for one booking)
+instead of comparing every slot with every booking through datetime.combine().
+"""
+import bisect
+import datetime
+import functools
+
+MINUTES_IN_DAY = 24 * 60
+SLOT_STEP_MINUTES = 30
+GRID_CACHE_SIZE = 512
+
+
+def to_minutes(value: datetime.time) -> int:
+    return value.hour * 60 + value.minute
+
+
+def duration_to_minutes(value: datetime.timedelta) -> int:
+    return int(value.total_seconds() // 60)
+
+
+def minutes_to_time(value: int) -> datetime.time:
+    value %= MINUTES_IN_DAY
+    return datetime.time(value // 60, value % 60)
+
+
+def format_minutes(value: int) -> str:
+    value %= MINUTES_IN_DAY
+    return f"{value // 60:02d}:{value % 60:02d}"
+
+
+def date_range(start: datetime.date, end: datetime.date):
+    """Every date from `start` to `end`, both included."""
+    for offset in range((end - start).days + 1):
+        yield start + datetime.timedelta(days=offset)
+
+
+def merge_intervals(intervals) -> list:
+    """
+    Sort (start, end) pairs and merge the ones that overlap or touch.
+    The result is sorted and non-overlapping, which the sweep relies on.
+    """
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def appointment_interval(start: datetime.time, duration: datetime.timedelta) -> tuple:
+    start_min = to_minutes(start)
+    return start_min, start_min + duration_to_minutes(duration)
+
+
+def build_busy_intervals(rows) -> list:
+    """
+    Merged busy intervals from (time, duration) rows, e.g. from
+    values_list('time', 'service__duration') so no model instances are built.
+    """
+    return merge_intervals(appointment_interval(start, duration) for start, duration in rows)
+
+
+def not_before_minutes(target_date: datetime.date, now: datetime.datetime) -> int:
+    """
+    First minute of `target_date` which is not in the past.
+    A slot starting exactly now is still bookable, one second later it is not.
+    """
+    today = now.date()
+    if target_date > today:
+        return 0
+    if target_date < today:
+        return MINUTES_IN_DAY
+    minutes = now.hour * 60 + now.minute
+    if now.second or now.microsecond:
+        minutes += 1
+    return minutes
+
+
+@functools.lru_cache(maxsize=GRID_CACHE_SIZE)
+def candidate_grid(work_start: int, work_end: int, duration: int, step: int) -> tuple:
+    """
+    Start minutes of every slot in the working window before any booking:
+    from `work_start`, every `step` minutes, while the whole appointment fits.
+    The same few windows, durations and steps repeat, so the grids are memoized.
+    """
+    return tuple(range(work_start, work_end - duration + 1, step))
+
+
+def free_slots(work_start: int, work_end: int, duration: int, busy,
+               step: int = SLOT_STEP_MINUTES, not_before: int = 0) -> list:
+    """
+    Start minutes of every free slot in the working window.
+
+    `busy` must be sorted and merged (see merge_intervals). The free candidates
+    between two busy intervals are a contiguous part of the candidate grid,
+    found with two bisects, so the cost follows the number of bookings and
+    of the returned slots, not how fine the grid is.
+    """
+    grid = candidate_grid(work_start, work_end, duration, step)
+    result = []
+    gap_start = not_before
+
+    for busy_start, busy_end in busy:
+        # Slots which start in the gap and end before the busy interval starts
+        result += grid[bisect.bisect_left(grid, gap_start):bisect.bisect_right(grid, busy_start - duration)]
+        gap_start = max(gap_start, busy_end)
+
+    result += grid[bisect.bisect_left(grid, gap_start):]
+    return result
+
+
+def free_slots_in_shifts(shifts, duration: int, busy, step: int = SLOT_STEP_MINUTES) -> list:
+    """free_slots() over several working windows (shifts, or a shift split by a break)."""
+    return [
+        slot
+        for work_start, work_end in shifts
+        for slot in free_slots(work_start, work_end, duration, busy, step)
+    ]
+
+
+def find_overlap(busy, start: int, end: int):
+    """
+    Return the busy (start, end) interval which overlaps [start, end) or None.
+    `busy` must be sorted and merged, so only one neighbour has to be checked.
+    """
+    # Last interval which starts before the new appointment ends
+    index = bisect.bisect_left(busy, (end,)) - 1
+    if index >= 0 and busy[index][1] > start:
+        return busy[index]
+    return None
+
+
+def format_free_slots(free_minutes_by_day, now: datetime.datetime) -> dict:
+    """
+    {"YYYY-MM-DD": ["HH:MM", ...]} from {date: [minutes]}, without the slots before `now`.
+    """
+    result = {}
+    for day, minutes in sorted(free_minutes_by_day.items()):
+        not_before = not_before_minutes(day, now)
+        result[day.isoformat()] = [format_minutes(minute) for minute in minutes if minute >= not_before]
+    return result
@@ -1,9 +1,25 @@
-import datetime
+from collections import defaultdict
 
+from django.db import transaction
 from django.utils import timezone
 from rest_framework import serializers
+from rest_framework.settings import api_settings
 
-from appointment.models import Service, Professional, Appointment, BusinessCategory
+from accounts.validators import PhoneNumberValidator, normalize_phone_number
+from appointment import availability, booking, live, recurrence, rollups, scheduling
+from appointment.models import Service, Professional, Appointment, BusinessCategory, AppointmentSeries
+
+
+class PhoneNumberField(serializers.CharField):
+    """Normalized before the validation, so '0888 123 456' is accepted and saved as '+359888123456'."""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('max_length', 17)
+        kwargs.setdefault('validators', [PhoneNumberValidator()])
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        return normalize_phone_number(super().to_internal_value(data))
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -20,6 +36,13 @@ class AppointmentListSerializer(serializers.ModelSerializer):
         fields = ['id', 'date', 'time', 'client_name', 'client_phone', 'service_name', 'status', 'status_display']
 
 
+class ClientHistorySerializer(AppointmentListSerializer):
+    professional_name = serializers.CharField(source='professional.name', read_only=True)
+
+    class Meta(AppointmentListSerializer.Meta):
+        fields = ['id', 'date', 'time', 'service_name', 'professional_name', 'status', 'status_display']
+
+
 # Show the services to the Front-end
 class ServiceSerializer(serializers.ModelSerializer):
     class Meta:
@@ -34,9 +57,112 @@ class ProfessionalSerializer(serializers.ModelSerializer):
         fields = ['id', 'name']
 
 
+def overlap_error(overlap):
+    existing_start, existing_end = overlap
+    return {api_settings.NON_FIELD_ERRORS_KEY: [
+        f"Този час се застъпва с друга резервация"
+        f" ({scheduling.format_minutes(existing_start)} - {scheduling.format_minutes(existing_end)})."
+    ]}
+
+
+class BulkAppointmentSerializer(serializers.ListSerializer):
+    """
+    Many bookings at once. The overlap check runs for the whole batch with one
+    query per professional (over the dates of the batch), checks the bookings
+    against each other too, and all of them are saved with one bulk_create.
+    """
+
+    def to_internal_value(self, data):
+        validated = super().to_internal_value(data)
+
+        # Errors per booking, in the same order as the request
+        errors = self.find_overlaps(validated)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return validated
+
+    def create(self, validated_data):
+        days = {(item['professional'].pk, item['date']) for item in validated_data}
+
+        # All or nothing: check again and insert while holding the locks for every involved day
+        with booking.professional_days_lock(days):
+            errors = self.find_overlaps(validated_data)
+            if any(errors):
+                raise serializers.ValidationError(errors)
+
+            appointments = Appointment.objects.bulk_create(
+                [Appointment(**item) for item in validated_data]
+            )
+            rollups.update(
+                added=[rollups.describe(appointment) for appointment in appointments],
+                services=rollups.loaded_services(appointments),
+            )
+
+            # bulk_create doesn't send post_save, so invalidate the slots cache and notify the dashboards here
+            transaction.on_commit(lambda: [availability.bump_version(*day) for day in days])
+            transaction.on_commit(lambda: [
+                live.publish(appointment.professional_id, live.appointment_event('created', appointment))
+                for appointment in appointments
+            ])
+
+        return appointments
+
+    @staticmethod
+    def find_overlaps(items):
+        errors = [{} for _ in items]
+
+        indexes_by_professional = defaultdict(list)
+        for index, item in enumerate(items):
+            indexes_by_professional[item['professional'].pk].append(index)
+
+        for professional_id, indexes in indexes_by_professional.items():
+            dates = [items[index]['date'] for index in indexes]
+
+            # One query per professional for the whole date range of the batch (and one for its series)
+            existing_appointments = Appointment.objects.filter(
+                professional_id=professional_id,
+                date__range=(min(dates), max(dates))
+            ).exclude(status='cancelled').values_list('date', 'time', 'service__duration')
+
+            bookings_by_date = defaultdict(list)
+            for booking_date, booking_time, booking_duration in existing_appointments:
+                bookings_by_date[booking_date].append((booking_time, booking_duration))
+
+            # Occurrences of recurring series which are not created as appointments yet
+            for booking_date, bookings in recurrence.virtual_bookings(
+                    professional_id, min(dates), max(dates)).items():
+                bookings_by_date[booking_date].extend(bookings)
+
+            new_by_date = defaultdict(list)
+            for index in indexes:
+                start, end = scheduling.appointment_interval(items[index]['time'], items[index]['service'].duration)
+                new_by_date[items[index]['date']].append((start, end, index))
+
+            for day, new_bookings in new_by_date.items():
+                busy_intervals = scheduling.build_busy_intervals(bookings_by_date.get(day, ()))
+                accepted_end = None
+
+                # Sorted by start, so a new booking can only clash with the previous accepted one
+                for start, end, index in sorted(new_bookings):
+                    overlap = scheduling.find_overlap(busy_intervals, start, end)
+                    if overlap:
+                        errors[index] = overlap_error(overlap)
+                    elif accepted_end is not None and accepted_end > start:
+                        errors[index] = {api_settings.NON_FIELD_ERRORS_KEY: [
+                            "Този час се застъпва с друга резервация от заявката."
+                        ]}
+                    else:
+                        accepted_end = end
+
+        return errors
+
+
 class AppointmentSerializer(serializers.ModelSerializer):
+    client_phone = PhoneNumberField()
+
     class Meta:
         model = Appointment
+        list_serializer_class = BulkAppointmentSerializer
         # These fields are expected from the JavaScript (client)
         fields = [
             'id',
@@ -49,6 +175,10 @@ class AppointmentSerializer(serializers.ModelSerializer):
             'client_email',
         ]
 
+    def validate_client_email(self, value):
+        # Lower-case like Appointment.save(), bulk_create doesn't call it
+        return value.lower() if value else value
+
     def validate(self, data):
         """
         Professional validation logic to prevent logic errors and security issues.
@@ -56,36 +186,133 @@ class AppointmentSerializer(serializers.ModelSerializer):
 
         # ALLOWED_MINUTES = [0, 30]
 
+        # Quick check without a lock, so most conflicts are rejected early
+        # (in a batch BulkAppointmentSerializer checks all bookings together)
+        if not isinstance(self.parent, BulkAppointmentSerializer):
+            self.check_overlap(data)
+        return data
+
+    def create(self, validated_data):
+        # Check again while holding the lock for this professional and date,
+        # so two simultaneous requests for the same slot can't both be saved
+        with booking.professional_day_lock(validated_data['professional'].pk, validated_data['date']):
+            self.check_overlap(validated_data)
+            return super().create(validated_data)
+
+    @staticmethod
+    def check_overlap(data):
         # Take the required params from the request
         booking_date = data['date']
         booking_time = data['time']
         service = data['service']
         professional = data['professional']
 
-        # Calculate when the appointment starts and ends
-        # Using fake date just for checking
-        dummy_date = datetime.date(2000, 1, 1)
-        new_start = datetime.datetime.combine(dummy_date, booking_time)
-        new_end = new_start + service.duration
+        # Calculate when the appointment starts and ends (in minutes since midnight)
+        new_start, new_end = scheduling.appointment_interval(booking_time, service.duration)
 
         # Take all booking for this date and professional
         existing_appointments = Appointment.objects.filter(
             professional=professional,
             date=booking_date
-        ).exclude(status='cancelled').select_related('service')
+        ).exclude(status='cancelled').values_list('time', 'service__duration')
+
+        # Occurrences of recurring series which are not created as appointments yet
+        series_bookings = recurrence.virtual_bookings(professional.pk, booking_date, booking_date)
 
         # Overlap Logic
-        for appt in existing_appointments:
-            # Calculate start and end of existing appointment
-            existing_start = datetime.datetime.combine(dummy_date, appt.time)
-            existing_end = existing_start + appt.service.duration
-
-            # Formula for overlap of 2 intervals
-            # (StartA < EndB) and (EndA > StartB)
-            # This catches all possibilities for overlap
-            if new_start < existing_end and new_end > existing_start:
-                raise serializers.ValidationError(
-                    f"Този час се застъпва с друга резервация"
-                    f" ({existing_start.strftime('%H:%M')} - {existing_end.strftime('%H:%M')})."
-                )
-        return data
\ No newline at end of file
+        # Sorted and merged intervals, so a bisect finds the only candidate for overlap
+        busy_intervals = scheduling.build_busy_intervals(
+            list(existing_appointments) + series_bookings.get(booking_date, [])
+        )
+        overlap = scheduling.find_overlap(busy_intervals, new_start, new_end)
+
+        if overlap:
+            # Same format as from validate(), also when raised from create()
+            raise serializers.ValidationError(overlap_error(overlap))
+
+
+class AppointmentSeriesSerializer(serializers.ModelSerializer):
+    client_phone = PhoneNumberField()
+
+    class Meta:
+        model = AppointmentSeries
+        fields = [
+            'id',
+            'service',
+            'professional',
+            'start_date',
+            'end_date',
+            'time',
+            'interval_weeks',
+            'client_name',
+            'client_phone',
+            'client_email',
+        ]
+
+    def validate(self, data):
+        if data['end_date'] < data['start_date']:
+            raise serializers.ValidationError("Последната дата е преди първата.")
+
+        if (data['end_date'] - data['start_date']).days > recurrence.MAX_SERIES_DAYS:
+            raise serializers.ValidationError(f"Максимален период: {recurrence.MAX_SERIES_DAYS} дни.")
+
+        if data.get('interval_weeks', 1) < 1:
+            raise serializers.ValidationError("Интервалът трябва да е поне 1 седмица.")
+
+        # The whole series is checked in one pass
+        self.check_conflicts(AppointmentSeries(**data))
+        return data
+
+    def create(self, validated_data):
+        series = AppointmentSeries(**validated_data)
+        days = [(series.professional_id, day) for day in series.occurrences()]
+
+        # Check again while holding the locks for every occurrence
+        with booking.professional_days_lock(days):
+            self.check_conflicts(series)
+            series.save()
+
+            # The first weeks become appointments now, the rest when the horizon reaches them
+            recurrence.materialize(
+                AppointmentSeries.objects.filter(pk=series.pk), recurrence.default_horizon(timezone.localdate())
+            )
+
+        return series
+
+    @staticmethod
+    def check_conflicts(series):
+        conflicts = recurrence.find_conflicts(series)
+        if conflicts:
+            raise serializers.ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [
+                f"{day}: Този час се застъпва с друга резервация"
+                f" ({scheduling.format_minutes(start)} - {scheduling.format_minutes(end)})."
+                for day, (start, end) in conflicts
+            ]})
+
+
+class BulkStatusSerializer(serializers.Serializer):
+    """
+    The appointments are given either as ids or as a date
+    with an optional time window, e.g. "cancel my afternoon".
+    """
+    MAX_IDS = 500
+
+    status = serializers.ChoiceField(choices=['confirmed', 'cancelled', 'completed'])
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), required=False, allow_empty=False, max_length=MAX_IDS
+    )
+    date = serializers.DateField(required=False)
+    time_from = serializers.TimeField(required=False)
+    time_to = serializers.TimeField(required=False)
+
+    def validate(self, data):
+        if ('ids' in data) == ('date' in data):
+            raise serializers.ValidationError("Изберете резервации или дата.")
+
+        if ('time_from' in data or 'time_to' in data) and 'date' not in data:
+            raise serializers.ValidationError("Часовете се използват само с дата.")
+
+        if 'time_from' in data and 'time_to' in data and data['time_to'] <= data['time_from']:
+            raise serializers.ValidationError("Крайният час е преди началния.")
+
+        return data
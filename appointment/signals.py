@@ -0,0 +1,182 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver, Signal
+
+from appointment import availability, catalog, live, metrics, rollups, work_schedule
+from appointment.models import Appointment, AppointmentSeries, BusinessCategory, Service, Professional, \
+    WorkingHours, ScheduleException
+
+# Sent once per batch by transitions.bulk_change_status, which updates without per-row signals.
+# Arguments: ids, status, days ({(professional_id, date)} of the changed appointments)
+# and rows ([(professional_id, date, old status, service_id)] of the changed appointments)
+appointments_status_changed = Signal()
+
+
+def _affected_days(instance):
+    days = {(instance.professional_id, instance.date)}
+
+    # If the appointment was moved, the old day becomes free as well
+    loaded = getattr(instance, '_loaded_values', {})
+    if 'professional_id' in loaded and 'date' in loaded:
+        days.add((loaded['professional_id'], loaded['date']))
+
+    return days
+
+
+def _bump_on_commit(days):
+    # After commit, so a concurrent request can't cache the old rows under the new version
+    def bump():
+        for professional_id, date in days:
+            availability.bump_version(professional_id, date)
+
+    transaction.on_commit(bump)
+
+
+def _publish_on_commit(professional_ids, event):
+    # After commit, so the dashboard reloads a schedule which already has the change
+    def publish():
+        for professional_id in professional_ids:
+            live.publish(professional_id, event)
+
+    transaction.on_commit(publish)
+
+
+def _update_rollups(instance, created):
+    loaded = getattr(instance, '_loaded_values', {})
+    fields = ['professional_id', 'date', 'status', 'service_id']
+
+    services = rollups.loaded_services([instance])
+
+    if created:
+        rollups.update(added=[rollups.describe(instance)], services=services)
+    elif all(field in loaded for field in fields):
+        before = tuple(loaded[field] for field in fields)
+        after = rollups.describe(instance)
+        if before != after:
+            rollups.update(added=[after], removed=[before], services=services)
+    else:
+        # Loaded with only() / defer(), the old values are unknown
+        for professional_id, date in _affected_days(instance):
+            rollups.rebuild(date, date, professional_id)
+
+
+@receiver(post_save, sender=Appointment)
+def appointment_saved(sender, instance, created, raw=False, **kwargs):
+    _bump_on_commit(_affected_days(instance))
+
+    # In the same transaction as the save
+    if not raw:
+        _update_rollups(instance, created)
+
+    # New bookings and status changes are pushed to the professional's dashboard
+    loaded = getattr(instance, '_loaded_values', {})
+    if created or loaded.get('status', instance.status) != instance.status:
+        event = live.appointment_event('created' if created else 'status', instance)
+        _publish_on_commit({instance.professional_id}, event)
+
+    instance._loaded_values = {
+        'professional_id': instance.professional_id, 'date': instance.date, 'status': instance.status,
+        'service_id': instance.service_id,
+    }
+
+
+@receiver(pre_delete, sender=Professional)
+def professional_deleting(sender, instance, origin=None, **kwargs):
+    # Remembered on the object the delete started from (the professional, a queryset
+    # of them, their user...), its appointments are deleted before the professional
+    if origin is not None:
+        if not hasattr(origin, '_deleted_professional_ids'):
+            origin._deleted_professional_ids = set()
+        origin._deleted_professional_ids.add(instance.pk)
+
+
+def _deleted_with_professional(instance, origin):
+    # The DailyStats of a deleted professional go in the same cascade, updating them
+    # would insert a row for the professional being deleted
+    return instance.professional_id in getattr(origin, '_deleted_professional_ids', ())
+
+
+@receiver(post_delete, sender=Appointment)
+def appointment_deleted(sender, instance, origin=None, **kwargs):
+    _bump_on_commit(_affected_days(instance))
+    if not _deleted_with_professional(instance, origin):
+        rollups.update(removed=[rollups.describe(instance)], services=rollups.loaded_services([instance]))
+
+
+@receiver(post_save, sender=Service)
+def service_saved(sender, instance, created, raw=False, **kwargs):
+    loaded = getattr(instance, '_loaded_values', {})
+    if not (created or raw) and 'price' in loaded and 'duration' in loaded:
+        # In the same transaction as the save
+        days = rollups.service_changed(instance, loaded['price'], loaded['duration'])
+
+        # Its bookings now take a different time, the free slots of their days change
+        if instance.duration != loaded['duration']:
+            for series in AppointmentSeries.objects.filter(service=instance, is_active=True):
+                days |= _series_days(series)
+            _bump_on_commit(days)
+
+    instance._loaded_values = {'price': instance.price, 'duration': instance.duration}
+
+
+@receiver(appointments_status_changed)
+def appointments_status_updated(sender, ids, status, days, rows, **kwargs):
+    _bump_on_commit(days)
+    rollups.update(
+        added=[(professional_id, date, status, service_id) for professional_id, date, _, service_id in rows],
+        removed=rows,
+    )
+    _publish_on_commit({professional_id for professional_id, date in days}, {
+        'type': 'status', 'ids': ids, 'status': status,
+    })
+
+
+@receiver(post_save, sender=BusinessCategory)
+@receiver(post_delete, sender=BusinessCategory)
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+@receiver(post_save, sender=Professional)
+@receiver(post_delete, sender=Professional)
+@receiver(m2m_changed, sender=Professional.services.through)
+def invalidate_catalog(sender, **kwargs):
+    if kwargs.get('action', 'post_').startswith('post_'):
+        transaction.on_commit(catalog.bump_version)
+
+
+@receiver(post_save, sender=WorkingHours)
+@receiver(post_delete, sender=WorkingHours)
+@receiver(post_save, sender=ScheduleException)
+@receiver(post_delete, sender=ScheduleException)
+@receiver(post_save, sender=Professional)
+def invalidate_work_schedule(sender, instance, **kwargs):
+    # The slot keys include the schedule version, so the cached slots go with it
+    professional_id = instance.pk if sender is Professional else instance.professional_id
+    transaction.on_commit(lambda: work_schedule.bump_version(professional_id))
+
+
+def _series_days(instance):
+    days = {(instance.professional_id, day) for day in instance.occurrences()}
+
+    # If the rule was changed, the old dates become free as well
+    loaded = getattr(instance, '_loaded_values', {})
+    rule_fields = ['professional_id', 'start_date', 'end_date', 'interval_weeks']
+    if all(field in loaded for field in rule_fields):
+        old_rule = AppointmentSeries(**{field: loaded[field] for field in rule_fields})
+        days |= {(old_rule.professional_id, day) for day in old_rule.occurrences()}
+
+    return days
+
+
+@receiver(post_save, sender=AppointmentSeries)
+@receiver(post_delete, sender=AppointmentSeries)
+def invalidate_slots_on_series_change(sender, instance, **kwargs):
+    # The not yet created occurrences are part of the availability of every date of the series
+    _bump_on_commit(_series_days(instance))
+
+
+@receiver(connection_created)
+def install_query_metrics(sender, connection, **kwargs):
+    # Sent on every (re)connect of the same connection object, so install the wrapper once
+    if metrics.record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(metrics.record_query)
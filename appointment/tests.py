@@ -1,3 +1,1507 @@
-from django.test import TestCase
+import asyncio
+import contextlib
+import datetime
+import io
+import json
+import random
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core import mail
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import OperationalError, connection, connections
+from django.db.models.sql.compiler import SQLCompiler
+from django.db.models.sql.constants import MULTI
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.validators import normalize_phone_number
+from appointment import archive, availability, benchmark, catalog, export, importer, live, metrics, outbox, recurrence, \
+    replicas, rollups, scheduling, throttling, transitions, work_schedule
+from appointment.async_views import ScheduleEventsView
+from appointment.models import BusinessCategory, Service, Professional, Appointment, EmailOutbox, AppointmentSeries, \
+    DailyStats, WorkingHours, ScheduleException, ArchivedAppointment, AppointmentRecord
+from appointment.serializers import AppointmentSerializer
+from appointment.views import AvailableSlotsView, CreateAppointmentView
+
+
+def brute_force_slots(work_start, work_end, duration, bookings, not_before, step=30):
+    """
+    The original AvailableSlotsView logic: every slot (30 min apart) against every booking.
+    """
+    dummy_date = datetime.date(2000, 1, 1)
+    limit_dt = datetime.datetime.combine(dummy_date, work_end)
+    current_dt = datetime.datetime.combine(dummy_date, work_start)
+    result = []
+
+    while current_dt + duration <= limit_dt:
+        proposed_end = current_dt + duration
+        is_busy = False
+        for booking_start, booking_duration in bookings:
+            existing_start = datetime.datetime.combine(dummy_date, booking_start)
+            existing_end = existing_start + booking_duration
+            if current_dt < existing_end and proposed_end > existing_start:
+                is_busy = True
+                break
+
+        if not is_busy and current_dt.time() >= not_before:
+            result.append(current_dt.strftime("%H:%M"))
+
+        current_dt += datetime.timedelta(minutes=step)
+
+    return result
+
+
+class SchedulingEngineTests(SimpleTestCase):
+    def random_day(self, rnd):
+        work_start = datetime.time(rnd.randint(6, 11), rnd.choice([0, 15, 30]))
+        work_end = datetime.time(rnd.randint(14, 22), rnd.choice([0, 30]))
+        duration = datetime.timedelta(minutes=rnd.choice([15, 30, 45, 60, 90, 120]))
+        bookings = [
+            (
+                datetime.time(rnd.randint(6, 21), rnd.choice([0, 10, 15, 30, 45])),
+                datetime.timedelta(minutes=rnd.choice([15, 30, 45, 60, 90])),
+            )
+            for _ in range(rnd.randint(0, 12))
+        ]
+        return work_start, work_end, duration, bookings
+
+    def test_free_slots_match_brute_force(self):
+        rnd = random.Random(2026)
+
+        for _ in range(2000):
+            work_start, work_end, duration, bookings = self.random_day(rnd)
+            not_before = datetime.time(rnd.randint(0, 23), rnd.randint(0, 59))
+            step = rnd.choice([10, 15, 20, 30, 60])
+
+            expected = brute_force_slots(work_start, work_end, duration, bookings, not_before, step)
+            actual = [
+                scheduling.format_minutes(minute) for minute in scheduling.free_slots(
+                    scheduling.to_minutes(work_start),
+                    scheduling.to_minutes(work_end),
+                    scheduling.duration_to_minutes(duration),
+                    scheduling.build_busy_intervals(bookings),
+                    step=step,
+                    not_before=scheduling.to_minutes(not_before),
+                )
+            ]
+
+            self.assertEqual(actual, expected)
+
+    def test_candidate_grid_is_memoized(self):
+        scheduling.candidate_grid.cache_clear()
+        grid = scheduling.candidate_grid(600, 780, 60, 15)
+
+        self.assertEqual(grid, (600, 615, 630, 645, 660, 675, 690, 705, 720))
+        self.assertIs(scheduling.candidate_grid(600, 780, 60, 15), grid)
+        self.assertEqual(scheduling.candidate_grid.cache_info().hits, 1)
+
+    def test_find_overlap_matches_brute_force(self):
+        rnd = random.Random(42)
+
+        for _ in range(2000):
+            _, _, duration, bookings = self.random_day(rnd)
+            start = rnd.randint(6 * 60, 21 * 60)
+            end = start + scheduling.duration_to_minutes(duration)
+
+            expected = any(
+                start < booking_end and end > booking_start
+                for booking_start, booking_end in (
+                    scheduling.appointment_interval(time, length) for time, length in bookings
+                )
+            )
+            overlap = scheduling.find_overlap(scheduling.build_busy_intervals(bookings), start, end)
+
+            self.assertEqual(overlap is not None, expected)
+
+    def test_not_before_minutes(self):
+        now = datetime.datetime(2026, 5, 10, 12, 30)
+        today = now.date()
+
+        self.assertEqual(scheduling.not_before_minutes(today + datetime.timedelta(days=1), now), 0)
+        self.assertEqual(scheduling.not_before_minutes(today - datetime.timedelta(days=1), now),
+                         scheduling.MINUTES_IN_DAY)
+        self.assertEqual(scheduling.not_before_minutes(today, now), 12 * 60 + 30)
+        self.assertEqual(scheduling.not_before_minutes(today, now.replace(second=1)), 12 * 60 + 31)
+
+
+class BookingFixtureMixin:
+    """
+    One category, one 60-min service and a professional working 10:00 - 13:00.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = BusinessCategory.objects.create(slug='hair', name='Фризьор')
+        cls.service = Service.objects.create(
+            name='Подстригване', price=30, duration=datetime.timedelta(minutes=60), category=cls.category
+        )
+        cls.professional = Professional.objects.create(
+            name='Иван', start_work_time=datetime.time(10, 0), end_work_time=datetime.time(13, 0)
+        )
+        cls.professional.services.add(cls.service)
+        cls.day = timezone.localdate() + datetime.timedelta(days=1)
+
+    def setUp(self):
+        # Slots cache and throttling history live in the cache
+        cache.clear()
+
+    def book(self, time, status='pending'):
+        return Appointment.objects.create(
+            professional=self.professional, service=self.service, client_name='Клиент',
+            client_phone='0888123456', date=self.day, time=time, status=status,
+        )
+
+
+class AvailabilityApiTests(BookingFixtureMixin, TestCase):
+    def test_slots_skip_booked_intervals(self):
+        self.book(datetime.time(11, 0))
+        self.book(datetime.time(10, 0), status='cancelled')
+
+        response = self.client.get(reverse('available-slots'), {
+            'date': self.day.isoformat(), 'professional': self.professional.pk, 'service': self.service.pk,
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), ['10:00', '12:00'])
+
+    def test_booking_rejects_overlap(self):
+        self.book(datetime.time(11, 0))
+
+        response = self.client.post(reverse('book-appointment'), {
+            'service': self.service.pk, 'professional': self.professional.pk, 'date': self.day.isoformat(),
+            'time': '11:30', 'client_name': 'Друг', 'client_phone': '0888123457',
+        })
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('11:00 - 12:00', str(response.json()))
+
+    def test_slots_range_uses_one_appointment_query(self):
+        self.book(datetime.time(11, 0))
+        next_day = self.day + datetime.timedelta(days=1)
+
+        # service + professional + its shift, working hours and exceptions + one query for all
+        # appointments in the range + one for the series
+        with self.assertNumQueries(7):
+            response = self.client.get(reverse('available-slots'), {
+                'from': self.day.isoformat(), 'to': next_day.isoformat(),
+                'professional': self.professional.pk, 'service': self.service.pk,
+            })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            self.day.isoformat(): ['10:00', '12:00'],
+            next_day.isoformat(): ['10:00', '10:30', '11:00', '11:30', '12:00'],
+        })
+
+    def test_duration_change_of_a_booked_service_frees_or_takes_slots(self):
+        short = Service.objects.create(
+            name='Бретон', price=10, duration=datetime.timedelta(minutes=30), category=self.category
+        )
+        self.professional.services.add(short)
+        self.book(datetime.time(10, 0))
+        params = {'date': self.day.isoformat(), 'professional': self.professional.pk, 'service': short.pk}
+        self.assertEqual(self.client.get(reverse('available-slots'), params).json(), [
+            '11:00', '11:30', '12:00', '12:30',
+        ])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            service = Service.objects.get(pk=self.service.pk)
+            service.duration = datetime.timedelta(minutes=120)
+            service.save()
+
+        self.assertEqual(self.client.get(reverse('available-slots'), params).json(), ['12:00', '12:30'])
+
+    def test_slot_step_of_service_or_category(self):
+        params = {'date': self.day.isoformat(), 'professional': self.professional.pk, 'service': self.service.pk}
+        self.category.slot_step = 20
+        self.category.save()
+        self.assertEqual(self.client.get(reverse('available-slots'), params).json(), [
+            '10:00', '10:20', '10:40', '11:00', '11:20', '11:40', '12:00',
+        ])
+
+        # The service overrides its category, the slots of each step are cached apart
+        self.service.slot_step = 60
+        self.service.save()
+        self.assertEqual(self.client.get(reverse('available-slots'), params).json(), ['10:00', '11:00', '12:00'])
+
+    def test_slots_range_is_limited(self):
+        response = self.client.get(reverse('available-slots'), {
+            'from': self.day.isoformat(), 'to': (self.day + datetime.timedelta(days=60)).isoformat(),
+            'professional': self.professional.pk, 'service': self.service.pk,
+        })
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_slots_are_cached_until_a_booking_changes(self):
+        params = {'date': self.day.isoformat(), 'professional': self.professional.pk, 'service': self.service.pk}
+        self.client.get(reverse('available-slots'), params)
+
+        # Only the service and the professional, the slots come from the cache
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('available-slots'), params)
+        self.assertEqual(len(response.json()), 5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = self.book(datetime.time(11, 0))
+        self.assertEqual(self.client.get(reverse('available-slots'), params).json(), ['10:00', '12:00'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.date = self.day + datetime.timedelta(days=1)
+            appointment.save()
+        self.assertEqual(len(self.client.get(reverse('available-slots'), params).json()), 5)
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    THREADS = 16
+
+    def setUp(self):
+        cache.clear()
+        # Every retry below counts as a booking attempt
+        rates = mock.patch.dict(throttling.ScopedSlidingWindowThrottle.THROTTLE_RATES, {'book': '1000/hour'})
+        rates.start()
+        self.addCleanup(rates.stop)
+
+        category = BusinessCategory.objects.create(slug='hair', name='Фризьор')
+        self.service = Service.objects.create(
+            name='Подстригване', price=30, duration=datetime.timedelta(minutes=60), category=category
+        )
+        self.professional = Professional.objects.create(name='Иван')
+        self.day = timezone.localdate() + datetime.timedelta(days=1)
+
+    def post_booking(self, index, barrier, results):
+        try:
+            barrier.wait()
+            # The in-memory SQLite test database refuses concurrent readers instead of waiting,
+            # so retry like a client would. Postgres just waits for the lock.
+            for _ in range(50):
+                try:
+                    response = Client().post(reverse('book-appointment'), {
+                        'service': self.service.pk, 'professional': self.professional.pk,
+                        'date': self.day.isoformat(),
+                        # Different but overlapping start times, so every request conflicts with every other
+                        'time': '11:00' if index % 2 else '11:30',
+                        'client_name': f'Клиент {index}', 'client_phone': '0888123456',
+                    })
+                except OperationalError:
+                    time.sleep(0.01)
+                    continue
+                results.append(response.status_code)
+                break
+        finally:
+            connection.close()
+
+    def test_simultaneous_bookings_never_overlap(self):
+        barrier = threading.Barrier(self.THREADS)
+        results = []
+        threads = [
+            threading.Thread(target=self.post_booking, args=(index, barrier, results))
+            for index in range(self.THREADS)
+        ]
+
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertLessEqual(results.count(201), 1, results)
+        self.assertEqual(Appointment.objects.filter(professional=self.professional, date=self.day).count(), 1)
+
+
+class QueryPlanTests(TestCase):
+    """
+    The hot queries must be served by the composite indexes, not by a table scan.
+    EXPLAIN QUERY PLAN on SQLite, EXPLAIN on Postgres.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = BusinessCategory.objects.create(slug='hair', name='Фризьор')
+        service = Service.objects.create(
+            name='Подстригване', price=30, duration=datetime.timedelta(minutes=30), category=category
+        )
+        cls.professional = Professional.objects.create(name='Иван')
+        Appointment.objects.bulk_create(
+            Appointment(
+                professional=cls.professional, service=service, client_name='Клиент', client_phone='0888123456',
+                date=datetime.date(2026, 1, 1) + datetime.timedelta(days=index % 90),
+                time=datetime.time(10 + index % 8, 0),
+                status='cancelled' if index % 5 == 0 else 'confirmed',
+            )
+            for index in range(500)
+        )
+        # Let the planner see how selective the indexes are
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def assertUsesIndex(self, queryset, index_name):
+        if connection.vendor == 'postgresql':
+            # The test tables are tiny, make the planner show what it does on a big one
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+
+        self.assertIn(index_name, queryset.explain())
+
+    def test_slots_query_uses_composite_index(self):
+        queryset = Appointment.objects.filter(
+            professional_id=self.professional.pk, date=datetime.date(2026, 1, 10)
+        ).exclude(status='cancelled').values_list('time', 'service__duration')
+
+        self.assertUsesIndex(queryset, 'appt_pro_date_time_idx')
+
+    def test_schedule_query_uses_composite_index(self):
+        queryset = Appointment.objects.filter(
+            professional=self.professional, date__gte=datetime.date(2026, 2, 1)
+        ).order_by('date', 'time')
+
+        self.assertUsesIndex(queryset, 'appt_pro_date_time_idx')
+
+    def test_client_history_query_uses_phone_index(self):
+        queryset = Appointment.objects.filter(client_phone='+359888999999').order_by('date', 'time')
+
+        self.assertUsesIndex(queryset, 'appt_client_phone_idx')
+
+    def test_archive_view_uses_the_indexes_of_both_tables(self):
+        queryset = AppointmentRecord.objects.filter(client_phone='+359888999999').order_by('date', 'time')
+
+        self.assertUsesIndex(queryset, 'appt_client_phone_idx')
+        self.assertUsesIndex(queryset, 'archive_client_phone_idx')
+
+
+class EmailOutboxTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = BusinessCategory.objects.create(slug='hair', name='Фризьор')
+        cls.service = Service.objects.create(
+            name='Подстригване', price=30, duration=datetime.timedelta(minutes=30), category=category
+        )
+        cls.professional = Professional.objects.create(name='Иван')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_booking_queues_email_instead_of_sending(self):
+        response = self.client.post(reverse('book-appointment'), {
+            'service': self.service.pk, 'professional': self.professional.pk,
+            'date': (timezone.localdate() + datetime.timedelta(days=1)).isoformat(), 'time': '11:00',
+            'client_name': 'Клиент', 'client_phone': '0888123456', 'client_email': 'client@example.com',
+        })
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(EmailOutbox.objects.get().recipients, ['client@example.com'])
+
+        self.assertEqual(outbox.drain_outbox(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(EmailOutbox.objects.get().status, 'sent')
+
+    def test_failed_email_is_retried_with_backoff(self):
+        email = outbox.enqueue_email('Тема', 'Текст', ['client@example.com'])
+
+        with mock.patch('django.core.mail.EmailMessage.send', side_effect=OSError("SMTP down")):
+            self.assertEqual(outbox.drain_outbox(), (0, 1))
+
+        email.refresh_from_db()
+        self.assertEqual(email.status, 'pending')
+        self.assertEqual(email.attempts, 1)
+        self.assertGreater(email.next_attempt_at, timezone.now())
+        # Not due yet, so the next pass doesn't touch it
+        self.assertEqual(outbox.drain_outbox(), (0, 0))
+
+    def test_batch_is_claimed_before_sending(self):
+        email = outbox.enqueue_email('Тема', 'Текст', ['client@example.com'])
+        claims = []
+
+        def send(message, fail_silently):
+            # Another worker running now finds nothing to send
+            claims.append(outbox.claim_batch())
+            self.assertEqual(EmailOutbox.objects.get().status, 'sending')
+            return 1
+
+        with mock.patch('django.core.mail.EmailMessage.send', send):
+            self.assertEqual(outbox.drain_outbox(), (1, 0))
+
+        self.assertEqual(claims, [[]])
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('sent', 1))
+
+    def test_expired_lease_is_claimed_again(self):
+        # The worker which claimed it stopped before saving the result
+        email = outbox.enqueue_email('Тема', 'Текст', ['client@example.com'])
+        EmailOutbox.objects.filter(pk=email.pk).update(
+            status='sending', attempts=1, next_attempt_at=timezone.now() - datetime.timedelta(seconds=1)
+        )
+
+        self.assertEqual(outbox.drain_outbox(), (1, 0))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('sent', 2))
+
+        EmailOutbox.objects.filter(pk=email.pk).update(
+            status='sending', attempts=outbox.MAX_ATTEMPTS, next_attempt_at=timezone.now() - datetime.timedelta(seconds=1)
+        )
+        self.assertEqual(outbox.drain_outbox(), (0, 0))
+        self.assertEqual(EmailOutbox.objects.get().status, 'failed')
+
+
+class AsyncViewsTests(BookingFixtureMixin, TestCase):
+    """
+    The async endpoints return the same JSON as the sync ones.
+    """
+
+    def test_async_matches_sync(self):
+        self.book(datetime.time(11, 0))
+        slots_params = {
+            'from': self.day.isoformat(), 'to': (self.day + datetime.timedelta(days=2)).isoformat(),
+            'professional': self.professional.pk, 'service': self.service.pk,
+        }
+
+        for sync_name, async_name, params in [
+            ('category-list', 'async-category-list', {}),
+            ('service-list', 'async-service-list', {'category': 'hair'}),
+            ('professional-list', 'async-professional-list', {'service': self.service.pk}),
+            ('available-slots', 'async-available-slots', slots_params),
+        ]:
+            sync_response = self.client.get(reverse(sync_name), params)
+            async_response = self.client.get(reverse(async_name), params)
+
+            self.assertEqual(async_response.status_code, 200)
+            self.assertEqual(async_response.json(), sync_response.json())
+
+
+class ProfessionalScheduleTests(BookingFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        user = get_user_model().objects.create_user(email='pro@example.com', username='pro', password='pass')
+        self.professional.user = user
+        self.professional.save()
+        self.client.force_login(user)
+
+    def test_keyset_pages_cover_every_appointment_once(self):
+        # Several appointments with the same date and time, so the id tie-breaker matters
+        expected = []
+        for offset in range(3):
+            for time in [datetime.time(10, 0), datetime.time(10, 0), datetime.time(12, 0)]:
+                appointment = self.book(time)
+                appointment.date = self.day + datetime.timedelta(days=offset)
+                appointment.save()
+                expected.append(appointment.pk)
+
+        seen = []
+        url = reverse('my-schedule') + '?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += [row['id'] for row in response.json()['results']]
+            url = response.json()['next']
+
+        self.assertEqual(seen, expected)
+
+    def test_to_bounds_the_window(self):
+        self.book(datetime.time(10, 0))
+        later = self.book(datetime.time(10, 0))
+        later.date = self.day + datetime.timedelta(days=30)
+        later.save()
+
+        response = self.client.get(reverse('my-schedule'), {'to': self.day.isoformat()})
+
+        self.assertEqual(len(response.json()['results']), 1)
+        self.assertIsNone(response.json()['next'])
+
+    def test_schedule_without_due_series_does_not_write(self):
+        # A write would pin the client to the primary (ReplicaMiddleware)
+        response = self.client.get(reverse('my-schedule'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(replicas.PIN_COOKIE, response.cookies)
+
+        state = replicas._RequestState(pinned=False)
+        token = replicas._request_state.set(state)
+        try:
+            self.assertEqual(recurrence.materialize_for_professional(self.professional.pk, self.day), 0)
+            self.assertFalse(state.wrote)
+
+            AppointmentSeries.objects.create(
+                professional=self.professional, service=self.service, client_name='Клиент',
+                client_phone='0888123456', start_date=self.day, end_date=self.day, time=datetime.time(10, 0),
+            )
+            self.assertEqual(recurrence.materialize_for_professional(self.professional.pk, self.day), 1)
+            self.assertTrue(state.wrote)
+        finally:
+            replicas._request_state.reset(token)
+
+    def test_invalid_dates_are_rejected(self):
+        for params in [{'to': 'garbage'}, {'date': '2026-13-01'}]:
+            response = self.client.get(reverse('my-schedule'), params)
+
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {"грешка": "Невалиден формат на дата"})
+
+
+class CatalogCacheTests(BookingFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        catalog.local_cache.clear()
+
+    def test_catalog_is_served_from_cache_with_etag(self):
+        url = reverse('service-list')
+        first = self.client.get(url, {'category': 'hair'})
+        self.assertEqual(first.status_code, 200)
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(url, {'category': 'hair'})
+            not_modified = self.client.get(url, {'category': 'hair'}, HTTP_IF_NONE_MATCH=first['ETag'])
+
+        self.assertEqual(cached.json(), first.json())
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_admin_edit_invalidates_catalog(self):
+        url = reverse('professional-list')
+        first = self.client.get(url, {'service': self.service.pk})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other = Professional.objects.create(name='Мария')
+            other.services.add(self.service)
+
+        response = self.client.get(url, {'service': self.service.pk}, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['name'] for row in response.json()], ['Иван', 'Мария'])
+
+    def test_bootstrap_payload_in_fixed_number_of_queries(self):
+        other_service = Service.objects.create(
+            name='Боядисване', price=50, duration=datetime.timedelta(minutes=90), category=self.category
+        )
+        for name in ['Мария', 'Петя', 'Гошо']:
+            Professional.objects.create(name=name).services.add(self.service, other_service)
+
+        # categories + their services + professionals + their services
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('bootstrap'))
+
+        data = response.json()
+        self.assertEqual([row['slug'] for row in data['categories']], ['hair'])
+        self.assertEqual(len(data['services']['hair']), 2)
+        self.assertEqual(len(data['professionals']), 4)
+        self.assertEqual(len(data['compatibility'][str(self.service.pk)]), 4)
+        self.assertEqual(len(data['compatibility'][str(other_service.pk)]), 3)
+
+        with self.assertNumQueries(0):
+            self.client.get(reverse('bootstrap'))
+
+
+class BulkBookingTests(BookingFixtureMixin, TestCase):
+    def payload(self, time, **extra):
+        return {
+            'service': self.service.pk, 'professional': self.professional.pk, 'date': self.day.isoformat(),
+            'time': time, 'client_name': 'Клиент', 'client_phone': '0888123456', **extra,
+        }
+
+    def test_bulk_booking_creates_all_with_one_overlap_query(self):
+        other = Professional.objects.create(name='Мария')
+        bookings = [
+            self.payload('10:00', client_email='client@example.com'),
+            self.payload('11:00'),
+            {**self.payload('10:00'), 'professional': other.pk},
+        ]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('bulk-book-appointment'), bookings, content_type='application/json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()), 3)
+        self.assertEqual(Appointment.objects.count(), 3)
+        self.assertEqual(EmailOutbox.objects.count(), 1)
+
+    def test_bulk_booking_is_all_or_nothing(self):
+        self.book(datetime.time(12, 0))
+        bookings = [
+            self.payload('10:00'),
+            self.payload('10:30'),  # clashes with the first one in the request
+            self.payload('12:00'),  # clashes with the existing booking
+        ]
+
+        response = self.client.post(reverse('bulk-book-appointment'), bookings, content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()
+        self.assertEqual(errors[0], {})
+        self.assertIn('от заявката', errors[1]['non_field_errors'][0])
+        self.assertIn('12:00 - 13:00', errors[2]['non_field_errors'][0])
+        self.assertEqual(Appointment.objects.count(), 1)
+
+    def test_overlap_check_queries_once_per_professional(self):
+        bookings = [self.payload(time) for time in ['10:00', '11:00', '12:00']]
+        serializer = AppointmentSerializer(data=bookings, many=True)
+
+        # service + professional per booking for the fields, one query for all overlaps + one for the series
+        with self.assertNumQueries(8):
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+
+
+class AppointmentSeriesTests(BookingFixtureMixin, TestCase):
+    def payload(self, **extra):
+        return {
+            'service': self.service.pk, 'professional': self.professional.pk,
+            'start_date': self.day.isoformat(), 'end_date': (self.day + datetime.timedelta(weeks=20)).isoformat(),
+            'time': '10:00', 'interval_weeks': 2, 'client_name': 'Клиент', 'client_phone': '0888123456',
+            **extra,
+        }
+
+    def test_series_materializes_only_the_horizon(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('create-series'), self.payload(), content_type='application/json')
+
+        self.assertEqual(response.status_code, 201, response.json())
+        series = AppointmentSeries.objects.get()
+        horizon = recurrence.default_horizon(timezone.localdate())
+        self.assertEqual(
+            Appointment.objects.filter(series=series).count(),
+            len(list(series.occurrences(date_to=horizon))),
+        )
+        self.assertEqual(series.materialized_until, horizon)
+
+    def test_virtual_occurrence_blocks_slots_beyond_the_horizon(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('create-series'), self.payload(), content_type='application/json')
+
+        far_day = self.day + datetime.timedelta(weeks=18)
+        self.assertFalse(Appointment.objects.filter(date=far_day).exists())
+
+        response = self.client.get(reverse('available-slots'), {
+            'date': far_day.isoformat(), 'professional': self.professional.pk, 'service': self.service.pk,
+        })
+        self.assertEqual(response.json(), ['11:00', '11:30', '12:00'])
+
+        # The same occurrence can't be booked one by one either
+        response = self.client.post(reverse('book-appointment'), {
+            'service': self.service.pk, 'professional': self.professional.pk, 'date': far_day.isoformat(),
+            'time': '10:30', 'client_name': 'Друг', 'client_phone': '0888123457',
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_conflicting_dates_are_reported(self):
+        conflict_day = self.day + datetime.timedelta(weeks=4)
+        Appointment.objects.create(
+            professional=self.professional, service=self.service, client_name='Клиент',
+            client_phone='0888123456', date=conflict_day, time=datetime.time(10, 30),
+        )
+
+        response = self.client.post(reverse('create-series'), self.payload(), content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()['non_field_errors']
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(errors[0].startswith(conflict_day.isoformat()))
+        self.assertFalse(AppointmentSeries.objects.exists())
+
+    def test_schedule_materializes_up_to_the_requested_date(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('create-series'), self.payload(), content_type='application/json')
+
+        user = get_user_model().objects.create_user(email='ivan@example.com', username='ivan', password='pass')
+        self.professional.user = user
+        self.professional.save()
+        self.client.force_login(user)
+
+        far_day = self.day + datetime.timedelta(weeks=18)
+        response = self.client.get(reverse('my-schedule'), {'date': far_day.isoformat()})
+
+        self.assertEqual(len(response.json()['results']), 1)
+        self.assertEqual(AppointmentSeries.objects.get().materialized_until, far_day)
+
+
+class BulkStatusTests(BookingFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        user = get_user_model().objects.create_user(email='ivan@example.com', username='ivan', password='pass')
+        self.professional.user = user
+        self.professional.save()
+        self.client.force_login(user)
+
+    def patch(self, body):
+        return self.client.patch(reverse('bulk-update-status'), body, content_type='application/json')
+
+    def test_results_per_id(self):
+        pending = self.book(datetime.time(10, 0))
+        cancelled = self.book(datetime.time(11, 0), status='cancelled')
+        other = Appointment.objects.create(
+            professional=Professional.objects.create(name='Мария'), service=self.service, client_name='Клиент',
+            client_phone='0888123456', date=self.day, time=datetime.time(10, 0),
+        )
+
+        response = self.patch({'status': 'confirmed', 'ids': [pending.pk, cancelled.pk, other.pk, 999]})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'updated': 1, 'results': {
+            str(pending.pk): 'updated',
+            str(cancelled.pk): 'invalid_transition',
+            str(other.pk): 'not_found',
+            '999': 'not_found',
+        }})
+        other.refresh_from_db()
+        self.assertEqual(other.status, 'pending')
+
+    def test_cancel_afternoon_with_one_update_and_one_cache_bump(self):
+        morning = self.book(datetime.time(10, 0))
+        afternoon = [self.book(datetime.time(11, 0)), self.book(datetime.time(12, 0))]
+        queryset = Appointment.objects.filter(professional=self.professional, date=self.day, time__gte='11:00')
+
+        with mock.patch('appointment.availability.bump_version') as bump_version:
+            # SELECT ... FOR UPDATE, UPDATE, services + upsert of the rollups,
+            # inside the savepoint of the test transaction
+            with self.captureOnCommitCallbacks(execute=True), self.assertNumQueries(6):
+                results = transitions.bulk_change_status(queryset, 'cancelled')
+
+        self.assertEqual(results, {appointment.pk: 'updated' for appointment in afternoon})
+        bump_version.assert_called_once_with(self.professional.pk, self.day)
+        self.assertEqual(Appointment.objects.filter(status='cancelled').count(), 2)
+        morning.refresh_from_db()
+        self.assertEqual(morning.status, 'pending')
+
+    def test_ids_or_date_required(self):
+        self.assertEqual(self.patch({'status': 'completed'}).status_code, 400)
+        self.assertEqual(self.patch({'status': 'completed', 'ids': [1], 'time_from': '12:00'}).status_code, 400)
+
+    def test_single_update_follows_the_same_transitions(self):
+        cancelled = self.book(datetime.time(10, 0), status='cancelled')
+        pending = self.book(datetime.time(11, 0))
+
+        def patch_one(appointment, status):
+            return self.client.patch(
+                reverse('update-status', args=[appointment.pk]), {'status': status}, content_type='application/json'
+            )
+
+        self.assertEqual(patch_one(cancelled, 'confirmed').status_code, 400)
+        cancelled.refresh_from_db()
+        self.assertEqual(cancelled.status, 'cancelled')
+
+        self.assertEqual(patch_one(pending, 'completed').status_code, 200)
+        self.assertEqual(patch_one(pending, 'confirmed').status_code, 400)
+        pending.refresh_from_db()
+        self.assertEqual(pending.status, 'completed')
+
+    def test_dashboard_gets_the_transitions(self):
+        # The cards show only the buttons of the allowed changes
+        response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, '<script id="status-transitions" type="application/json">')
+        self.assertContains(response, '"completed": []')
+
+
+class LiveUpdatesTests(BookingFixtureMixin, TestCase):
+    def test_booking_is_published_to_its_professional_after_commit(self):
+        with mock.patch('appointment.live.publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                appointment = self.book(datetime.time(10, 0))
+                publish.assert_not_called()
+
+            publish.assert_called_once_with(self.professional.pk, {
+                'type': 'created', 'id': appointment.pk, 'date': self.day.isoformat(),
+                'time': '10:00', 'status': 'pending',
+            })
+
+            # Saving without a status change is not an event
+            publish.reset_mock()
+            with self.captureOnCommitCallbacks(execute=True):
+                appointment.client_name = 'Друг'
+                appointment.save()
+            publish.assert_not_called()
+
+    def test_idle_stream_makes_no_queries(self):
+        broker = live.InProcessBroker()
+        with mock.patch('appointment.live.get_broker', return_value=broker), self.assertNumQueries(0):
+            async_to_sync(self.receive_one_event)(broker)
+        self.assertEqual(broker.subscribers, {})
+
+    async def receive_one_event(self, broker):
+        stream = ScheduleEventsView.stream(self.professional.pk)
+        self.assertEqual(await anext(stream), 'retry: 5000\n\n')
+
+        # Published from another thread, like a sync view under ASGI
+        received = asyncio.create_task(anext(stream))
+        await asyncio.sleep(0)
+        await asyncio.to_thread(broker.publish, self.professional.pk, {'type': 'status', 'id': 1})
+        self.assertEqual(await received, 'event: status\ndata: {"type": "status", "id": 1}\n\n')
+
+        await stream.aclose()
+
+    def test_stream_is_refused_under_wsgi(self):
+        user = get_user_model().objects.create_user(email='ivan@example.com', username='ivan', password='pass')
+        self.professional.user = user
+        self.professional.save()
+        self.client.force_login(user)
+
+        # The test client is WSGI, where the stream would never send a byte
+        response = self.client.get(reverse('my-schedule-events'))
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(response.streaming)
+
+    def test_broker_errors_dont_fail_the_committed_booking(self):
+        broker = mock.Mock()
+        broker.publish.side_effect = ConnectionError("Redis is down")
+
+        with mock.patch('appointment.live.get_broker', return_value=broker), \
+                self.assertLogs('appointment.live', 'ERROR'), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('book-appointment'), {
+                'service': self.service.pk, 'professional': self.professional.pk, 'date': self.day.isoformat(),
+                'time': '10:00', 'client_name': 'Клиент', 'client_phone': '0888123456',
+            })
+
+        self.assertEqual(response.status_code, 201)
+        broker.publish.assert_called_once()
+
+    def test_in_process_broker_warns_with_several_workers(self):
+        with mock.patch.dict('os.environ', {'WEB_CONCURRENCY': '4'}), self.assertLogs('appointment.live', 'WARNING'):
+            live.InProcessBroker()
+
+
+class QueryBudgetTests(TransactionTestCase):
+    """
+    Every endpoint within its query budget (see benchmark.py). TransactionTestCase,
+    so the counts are the same as in the `benchmark` command, without the test savepoints.
+    """
+
+    def test_endpoints_within_query_budget(self):
+        dataset = benchmark.seed(professionals=3, services=6, days=5, per_day=6)
+
+        results = benchmark.Benchmark(dataset).run(iterations=3)
+
+        self.assertEqual(benchmark.over_budget(results), {})
+        self.assertEqual({name: result['errors'] for name, result in results.items() if result['errors']}, {})
+
+
+class MetricsTests(BookingFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.registry.clear()
+
+    def test_latency_and_queries_per_url_name(self):
+        params = {'date': self.day.isoformat(), 'professional': self.professional.pk, 'service': self.service.pk}
+        self.client.get(reverse('available-slots'), params)
+        self.client.get(reverse('available-slots'), params)
+
+        body = self.client.get(reverse('metrics')).content.decode()
+
+        labels = 'view="available-slots",method="GET"'
+        self.assertIn(f'http_request_duration_seconds_count{{{labels}}} 2', body)
+        self.assertIn(f'http_responses_total{{{labels},status="200"}} 2', body)
+        # 7 queries on the first call, 2 from the slots cache on the second
+        self.assertIn(f'http_request_db_queries_sum{{{labels}}} 9', body)
+        self.assertIn(f'http_request_db_seconds_total{{{labels}}}', body)
+
+    def test_token(self):
+        with self.settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+            response = self.client.get(reverse('metrics'), headers={'Authorization': 'Bearer secret'})
+            self.assertEqual(response.status_code, 200)
+
+
+class ClientHistoryTests(BookingFixtureMixin, TestCase):
+    def test_phone_is_normalized(self):
+        for raw in ['0888123456', '0888 123 456', '00359888123456', '+359 888-123-456', '+359888123456']:
+            self.assertEqual(normalize_phone_number(raw), '+359888123456')
+
+        response = self.client.post(reverse('book-appointment'), {
+            'service': self.service.pk, 'professional': self.professional.pk, 'date': self.day.isoformat(),
+            'time': '10:00', 'client_name': 'Клиент', 'client_phone': '0888 123 456',
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.json())
+        self.assertEqual(Appointment.objects.get().client_phone, '+359888123456')
+
+    def test_history_of_every_phone_variant_with_one_query(self):
+        past_day = timezone.localdate() - datetime.timedelta(days=7)
+        for date, time, status, phone in [
+            (past_day, datetime.time(10, 0), 'completed', '0888123456'),
+            (past_day, datetime.time(12, 0), 'cancelled', '+359888123456'),
+            (self.day, datetime.time(11, 0), 'confirmed', '00359 888 123 456'),
+            (self.day, datetime.time(12, 0), 'pending', '0899000000'),  # another client
+        ]:
+            Appointment.objects.create(
+                professional=self.professional, service=self.service, client_name='Клиент',
+                client_phone=phone, date=date, time=time, status=status,
+            )
+
+        staff = get_user_model().objects.create_user(
+            email='staff@example.com', username='staff', password='pass', is_staff=True
+        )
+        self.client.force_login(staff)
+
+        # session + user + the history
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('client-history'), {'phone': '+359 888 123 456'})
+
+        data = response.json()
+        self.assertEqual(data['counts'], {'total': 3, 'completed': 1, 'cancelled': 1, 'upcoming': 1})
+        self.assertEqual([visit['time'] for visit in data['past']], ['12:00:00', '10:00:00'])
+        self.assertEqual(data['upcoming'][0]['professional_name'], 'Иван')
+
+
+class DailyRollupTests(BookingFixtureMixin, TestCase):
+    def stats(self, day=None):
+        return DailyStats.objects.filter(professional=self.professional, date=day or self.day).values(
+            'booked_minutes', 'revenue', 'pending_count', 'confirmed_count', 'cancelled_count', 'completed_count'
+        ).first()
+
+    def rebuilt_stats(self, day=None):
+        rollups.rebuild(day or self.day, day or self.day)
+        return self.stats(day)
+
+    def test_incremental_updates_match_rebuild(self):
+        first = self.book(datetime.time(10, 0))
+        second = self.book(datetime.time(11, 0))
+        self.assertEqual(self.stats()['booked_minutes'], 120)
+
+        first.status = 'cancelled'
+        first.save(update_fields=['status'])
+        transitions.bulk_change_status(Appointment.objects.filter(pk=second.pk), 'completed')
+
+        # Moved to another day: out of this one, into the next
+        next_day = self.day + datetime.timedelta(days=1)
+        third = self.book(datetime.time(12, 0))
+        third.date = next_day
+        third.save()
+        self.book(datetime.time(12, 0)).delete()
+
+        incremental = [self.stats(), self.stats(next_day)]
+        self.assertEqual(incremental[0], {
+            'booked_minutes': 60, 'revenue': 30, 'pending_count': 0, 'confirmed_count': 0,
+            'cancelled_count': 1, 'completed_count': 1,
+        })
+        self.assertEqual(incremental, [self.rebuilt_stats(), self.rebuilt_stats(next_day)])
+
+    def test_bulk_booking_updates_rollups(self):
+        bookings = [{
+            'service': self.service.pk, 'professional': self.professional.pk, 'date': self.day.isoformat(),
+            'time': time, 'client_name': 'Клиент', 'client_phone': '0888123456',
+        } for time in ['10:00', '11:00']]
+        self.client.post(reverse('bulk-book-appointment'), bookings, content_type='application/json')
+
+        self.assertEqual(self.stats()['pending_count'], 2)
+        self.assertEqual(self.stats(), self.rebuilt_stats())
+
+    def test_service_price_and_duration_changes_keep_rollups_exact(self):
+        first = self.book(datetime.time(10, 0))
+        self.book(datetime.time(11, 0))
+        self.book(datetime.time(12, 0), status='cancelled')
+
+        # As in the admin, the service is loaded again
+        service = Service.objects.get(pk=self.service.pk)
+        service.price = 45
+        service.duration = datetime.timedelta(minutes=90)
+        service.save()
+
+        self.assertEqual(self.stats()['revenue'], 90)
+        self.assertEqual(self.stats(), self.rebuilt_stats())
+
+        # Cancelled later (loaded like UpdateAppointmentStatusView does), the new price and duration come off
+        first = Appointment.objects.select_related('service').get(pk=first.pk)
+        first.status = 'cancelled'
+        first.save(update_fields=['status'])
+        self.assertEqual((self.stats()['booked_minutes'], self.stats()['revenue']), (90, 45))
+        self.assertEqual(self.stats(), self.rebuilt_stats())
+
+    def test_deleting_a_professional_with_appointments(self):
+        self.book(datetime.time(10, 0))
+        self.book(datetime.time(11, 0), status='cancelled')
+        other = Professional.objects.create(name='Мария')
+        Appointment.objects.create(
+            professional=other, service=self.service, client_name='Клиент', client_phone='0888123456',
+            date=self.day, time=datetime.time(10, 0),
+        )
+
+        third = Professional.objects.create(
+            name='Петър', user=get_user_model().objects.create_user(email='petar@example.com', username='petar'),
+        )
+        Appointment.objects.create(
+            professional=third, service=self.service, client_name='Клиент', client_phone='0888123456',
+            date=self.day, time=datetime.time(10, 0),
+        )
+
+        # As the admin does it: one professional, the bulk action (a queryset), and a user with a profile
+        self.professional.delete()
+        Professional.objects.filter(pk=other.pk).delete()
+        third.user.delete()
+
+        # The foreign keys are checked at commit, which a TestCase never reaches
+        connection.check_constraints()
+        self.assertFalse(DailyStats.objects.exists())
+
+    def test_deleting_appointments_of_a_remaining_professional(self):
+        first = self.book(datetime.time(10, 0))
+        self.book(datetime.time(11, 0))
+
+        Appointment.objects.filter(pk=first.pk).delete()
+
+        self.assertEqual(DailyStats.objects.get().pending_count, 1)
+
+    def test_report_reads_only_rollups(self):
+        self.book(datetime.time(10, 0), status='completed')
+        self.book(datetime.time(11, 0), status='cancelled')
+        staff = get_user_model().objects.create_user(
+            email='owner@example.com', username='owner', password='pass', is_staff=True
+        )
+        self.client.force_login(staff)
+
+        # session + user + rollups
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('daily-report'), {
+                'from': self.day.isoformat(), 'to': (self.day + datetime.timedelta(days=30)).isoformat(),
+            })
+
+        data = response.json()
+        self.assertEqual(len(data['days']), 1)
+        self.assertEqual(data['totals']['booked_minutes'], 60)
+        self.assertEqual(data['totals']['completed_count'], 1)
+        self.assertEqual(data['totals']['cancelled_count'], 1)
+
+        response = self.client.get(reverse('daily-report'), {
+            'from': self.day.isoformat(), 'to': self.day.isoformat(), 'professional': 'abc',
+        })
+        self.assertEqual(response.status_code, 400)
+
+
+class WorkingHoursTests(BookingFixtureMixin, TestCase):
+    def slots(self, day=None):
+        return self.client.get(reverse('available-slots'), {
+            'date': (day or self.day).isoformat(), 'professional': self.professional.pk, 'service': self.service.pk,
+        }).json()
+
+    def add_hours(self, start, end, break_start=None, break_end=None, day=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return WorkingHours.objects.create(
+                professional=self.professional, weekday=(day or self.day).weekday(),
+                start_time=start, end_time=end, break_start=break_start, break_end=break_end,
+            )
+
+    def test_weekly_template_with_break(self):
+        self.add_hours(datetime.time(9, 0), datetime.time(15, 0), datetime.time(11, 30), datetime.time(12, 30))
+        self.assertEqual(self.slots(), ['09:00', '09:30', '10:00', '10:30', '12:30', '13:00', '13:30', '14:00'])
+
+        # A weekday without a template row is a day off
+        self.assertEqual(self.slots(self.day + datetime.timedelta(days=1)), [])
+
+    def test_exceptions_replace_the_template(self):
+        next_week = self.day + datetime.timedelta(days=7)
+        with self.captureOnCommitCallbacks(execute=True):
+            ScheduleException.objects.create(professional=self.professional, date=self.day, reason='Отпуск')
+            ScheduleException.objects.create(
+                professional=self.professional, date=next_week,
+                start_time=datetime.time(14, 0), end_time=datetime.time(16, 0),
+            )
+
+        self.assertEqual(self.slots(), [])
+        self.assertEqual(self.slots(next_week), ['14:00', '14:30', '15:00'])
+        # Without a template every other day keeps the shift of the professional
+        self.assertEqual(len(self.slots(self.day + datetime.timedelta(days=1))), 5)
+
+    def test_cached_slots_follow_the_schedule(self):
+        self.assertEqual(len(self.slots()), 5)
+        hours = self.add_hours(datetime.time(10, 0), datetime.time(12, 0))
+        self.assertEqual(self.slots(), ['10:00', '10:30', '11:00'])
+
+        # Only the service and the professional, the schedule and the slots come from the cache
+        with self.assertNumQueries(2):
+            self.slots()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            hours.delete()
+        self.assertEqual(len(self.slots()), 5)
+
+    def test_compile_merges_shifts_of_a_day(self):
+        rows = [
+            WorkingHours(weekday=0, start_time=datetime.time(9, 0), end_time=datetime.time(12, 0)),
+            WorkingHours(weekday=0, start_time=datetime.time(11, 0), end_time=datetime.time(14, 0)),
+            WorkingHours(weekday=0, start_time=datetime.time(16, 0), end_time=datetime.time(18, 0)),
+        ]
+        schedule = work_schedule.compile_schedule(self.professional, 1, rows, [])
+
+        monday = datetime.date(2026, 10, 19)
+        self.assertEqual(schedule.shifts(monday), [(540, 840), (960, 1080)])
+        self.assertEqual(schedule.shifts(monday + datetime.timedelta(days=1)), [])
+
+
+@override_settings(REPLICA_DATABASES=['replica_1'])
+class ReplicaRoutingTests(SimpleTestCase):
+    router = replicas.ReplicaRouter()
+
+    def call(self, view_class, method='get', cookies=None, write=False):
+        """The alias the router picks for a read in the view, and the response."""
+        seen = {}
+
+        def view(request):
+            if write:
+                self.router.db_for_write(Appointment)
+            seen['alias'] = self.router.db_for_read(Appointment)
+            return HttpResponse()
+        view.view_class = view_class
+
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            return view(request)
+        middleware = replicas.ReplicaMiddleware(get_response)
+
+        request = getattr(RequestFactory(), method)('/')
+        request.COOKIES.update(cookies or {})
+        response = middleware(request)
+        return seen['alias'], response
+
+    def test_read_only_views_read_from_replica(self):
+        alias, response = self.call(AvailableSlotsView)
+        self.assertEqual(alias, 'replica_1')
+        self.assertNotIn(replicas.PIN_COOKIE, response.cookies)
+
+        self.assertIsNone(self.call(CreateAppointmentView, method='post')[0])
+        self.assertIsNone(self.router.db_for_read(Appointment))  # outside of a request
+
+    def test_reads_after_a_write_use_primary(self):
+        alias, response = self.call(AvailableSlotsView, write=True)
+        self.assertIsNone(alias)
+        self.assertEqual(response.cookies[replicas.PIN_COOKIE]['max-age'], 5)
+
+        # The next requests of the same client too, until the pin expires
+        self.assertIsNone(self.call(AvailableSlotsView, cookies={replicas.PIN_COOKIE: '1'})[0])
+        self.assertEqual(self.router.db_for_write(Appointment), 'default')
+
+
+@contextlib.contextmanager
+def lagging_replica(*models):
+    """
+    'replica_1' is the test database without any rows of `models`,
+    like the replica of a primary which has just committed them.
+    """
+    execute_sql = SQLCompiler.execute_sql
+
+    def lagging_execute_sql(compiler, result_type=MULTI, *args, **kwargs):
+        if compiler.using == 'replica_1' and compiler.query.model in models:
+            compiler.as_sql()  # sets up the columns of the (empty) result, like a real execution
+            return iter([]) if result_type == MULTI else None
+        return execute_sql(compiler, result_type, *args, **kwargs)
+
+    # The transaction of the test case would keep every read on the primary
+    outside_transaction = {'default': mock.Mock(in_atomic_block=False)}
+
+    with mock.patch.object(connections._connections, 'replica_1', connections['default'], create=True), \
+            mock.patch.object(replicas, 'connections', outside_transaction), \
+            mock.patch.object(SQLCompiler, 'execute_sql', lagging_execute_sql):
+        yield
+
+
+@override_settings(REPLICA_DATABASES=['replica_1'])
+class LaggingReplicaTests(BookingFixtureMixin, TestCase):
+    def test_slots_are_cached_from_the_primary(self):
+        # Committed, so the versions of the day and of the working hours are already bumped
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book(datetime.time(10, 0))
+            WorkingHours.objects.create(
+                professional=self.professional, weekday=self.day.weekday(),
+                start_time=datetime.time(10, 0), end_time=datetime.time(12, 0),
+            )
+
+        params = {'date': self.day.isoformat(), 'professional': self.professional.pk, 'service': self.service.pk}
+        with lagging_replica(Appointment, WorkingHours):
+            self.assertEqual(self.client.get(reverse('available-slots'), params).json(), ['11:00'])
+
+        # And that is what got cached
+        self.assertEqual(self.client.get(reverse('available-slots'), params).json(), ['11:00'])
+
+    def test_catalog_is_cached_from_the_primary(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Service.objects.create(name='Боядисване', price=50, duration=datetime.timedelta(minutes=90),
+                                   category=self.category)
+
+        with lagging_replica(Service):
+            response = self.client.get(reverse('service-list'))
+        self.assertEqual(len(response.json()), 2)
+
+
+class SlidingWindowThrottleTests(BookingFixtureMixin, TestCase):
+    def throttle(self, now):
+        throttle_class = type('MinuteThrottle', (throttling.AnonSlidingWindowThrottle,), {'rate': '4/min'})
+        throttle = throttle_class()
+        throttle.timer = lambda: now
+        return throttle
+
+    def request(self):
+        request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.1')
+        request.user = None
+        return request
+
+    def allowed(self, now, count=1):
+        return [self.throttle(now).allow_request(self.request(), None) for _ in range(count)]
+
+    def test_previous_window_is_weighted(self):
+        start = 6000.0  # the start of a window
+        self.assertEqual(self.allowed(start + 10, 5), [True] * 4 + [False])
+
+        # Half of the next window: 5 * 0.5 from the previous one, so one more request fits
+        self.assertEqual(self.allowed(start + 90, 2), [True, False])
+
+        throttle = self.throttle(start + 90)
+        self.assertFalse(throttle.allow_request(self.request(), None))
+        self.assertEqual((throttle.previous, throttle.current), (5, 3))
+        # 5 * (1 - t / 60) + 3 + 1 <= 4 only once the previous window is out, at the end of this one
+        self.assertAlmostEqual(throttle.wait(), 30)
+
+    def test_booking_scope(self):
+        payload = {
+            'service': self.service.pk, 'professional': self.professional.pk, 'date': self.day.isoformat(),
+            'client_name': 'Клиент', 'client_phone': '0888123456',
+        }
+        with mock.patch.dict(throttling.ScopedSlidingWindowThrottle.THROTTLE_RATES, {'book': '2/hour'}):
+            statuses = [
+                self.client.post(reverse('book-appointment'), {**payload, 'time': time}).status_code
+                for time in ['10:00', '11:00', '12:00']
+            ]
+            self.assertEqual(statuses, [201, 201, 429])
+
+            # Only the booking is limited by the scope
+            slots = self.client.get(reverse('available-slots'), {
+                'date': self.day.isoformat(), 'professional': self.professional.pk, 'service': self.service.pk,
+            })
+            self.assertEqual(slots.status_code, 200)
+
+    def test_benchmark_against_drf(self):
+        results = benchmark.compare_throttles(requests=300, rate='200/day')
+
+        self.assertEqual(results['drf']['allowed'], 200)
+        self.assertEqual(results['sliding-window']['allowed'], 200)
+        # Two counters instead of 200 timestamps
+        self.assertLess(results['sliding-window']['cached_bytes'] * 50, results['drf']['cached_bytes'])
+
+
+class ArchiveTests(BookingFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.old_day = timezone.localdate() - datetime.timedelta(days=400)
+        for time, status in [(10, 'completed'), (11, 'cancelled'), (12, 'completed'), (13, 'pending')]:
+            Appointment.objects.create(
+                professional=self.professional, service=self.service, client_name='Клиент',
+                client_phone='0888123456', date=self.old_day, time=datetime.time(time, 0), status=status,
+            )
+        self.book(datetime.time(10, 0), status='completed')
+
+    def test_moves_old_closed_appointments_in_batches(self):
+        stats_before = list(DailyStats.objects.values())
+
+        moved = archive.archive_closed(archive.default_cutoff(), batch_size=2)
+
+        self.assertEqual(moved, 3)
+        # The stale pending one and the recent one stay
+        self.assertEqual(sorted(Appointment.objects.values_list('status', flat=True)), ['completed', 'pending'])
+        self.assertEqual(ArchivedAppointment.objects.filter(date=self.old_day).count(), 3)
+        # The rollups keep counting the archived appointments, and a rebuild reads them too
+        self.assertEqual(list(DailyStats.objects.values()), stats_before)
+        rollups.rebuild(self.old_day, self.old_day)
+        self.assertEqual(DailyStats.objects.get(date=self.old_day).completed_count, 2)
+
+    def test_history_includes_archived_visits(self):
+        archive.archive_closed(archive.default_cutoff())
+        staff = get_user_model().objects.create_user(
+            email='staff@example.com', username='staff', password='pass', is_staff=True
+        )
+        self.client.force_login(staff)
+
+        data = self.client.get(reverse('client-history'), {'phone': '0888123456'}).json()
+
+        self.assertEqual(data['counts']['total'], 5)
+        self.assertEqual(data['counts']['completed'], 2)
+        self.assertEqual(AppointmentRecord.objects.filter(is_archived=True).count(), 3)
+
+
+class ExportTests(BookingFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.book(datetime.time(10, 0), status='completed')
+        self.book(datetime.time(11, 0), status='cancelled')
+        self.staff = get_user_model().objects.create_user(
+            email='staff@example.com', username='staff', password='pass', is_staff=True
+        )
+        self.client.force_login(self.staff)
+
+    def export(self, **params):
+        return self.client.get(reverse('export-appointments'), {
+            'from': self.day.isoformat(), 'to': self.day.isoformat(), **params,
+        })
+
+    def test_csv_is_streamed_with_the_names_joined(self):
+        # session + user + one query for all rows, whatever their number
+        with self.assertNumQueries(3):
+            response = self.export()
+            content = b''.join(response.streaming_content).decode()
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        lines = content.splitlines()
+        self.assertEqual(lines[0].split(',')[:6], ['id', 'date', 'time', 'status', 'professional', 'service'])
+        self.assertEqual(len(lines), 3)
+        self.assertIn('Иван,Подстригване,30.00,60,Клиент,+359888123456', lines[1])
+
+    def test_ndjson_with_filters(self):
+        response = self.export(output='ndjson', status='cancelled', professional=self.professional.pk)
+
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['time'], '11:00:00')
+        self.assertEqual(rows[0]['duration_minutes'], 60)
+
+        self.assertEqual(self.export(status='unknown').status_code, 400)
+
+        # Before any byte of the file is sent
+        response = self.export(professional='abc')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.streaming)
+
+    def test_rows_are_read_from_the_replica_of_the_request(self):
+        # Only the export's reads go to the replica, and only while the request's routing state is set
+        def db_for_read(router, model, **hints):
+            return 'replica_1' if model is AppointmentRecord and replicas._request_state.get() else None
+
+        with mock.patch.object(replicas.ReplicaRouter, 'db_for_read', db_for_read), \
+                mock.patch('appointment.export.rows', return_value=iter([])) as rows:
+            b''.join(self.export().streaming_content)
+
+        self.assertEqual(rows.call_args.kwargs['using'], 'replica_1')
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command(
+            'export_appointments', '--from', self.day.isoformat(), '--to', self.day.isoformat(),
+            '--status', 'completed', '--format', 'ndjson', stdout=out,
+        )
+
+        self.assertEqual([json.loads(line)['status'] for line in out.getvalue().splitlines()], ['completed'])
+
+
+class ImportTests(BookingFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.staff = get_user_model().objects.create_user(
+            email='staff@example.com', username='staff', password='pass', is_staff=True
+        )
+        self.client.force_login(self.staff)
+
+    def upload(self, kind, content, **params):
+        url = reverse('import', args=[kind])
+        if params:
+            url += '?' + '&'.join(f'{key}={value}' for key, value in params.items())
+        return self.client.post(url, {'file': SimpleUploadedFile('data', content.encode())})
+
+    def test_services_and_professionals(self):
+        response = self.upload('services', (
+            '\ufeffname,category,price,duration_minutes,slot_step\n'
+            'Боядисване,hair,50,90,15\n'
+            'Маникюр,nails,20,30,\n'
+            f'{"Я" * 101},hair,20,30,\n'
+        ))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['errors'], [
+            {'row': 3, 'errors': {'category': "Няма такава категория."}},
+            # A DataError for the whole chunk on PostgreSQL otherwise
+            {'row': 4, 'errors': {'name': "Най-много 100 знака."}},
+        ])
+        self.assertEqual(Service.objects.get(name='Боядисване').slot_step, 15)
+
+        response = self.upload('professionals', '\n'.join([
+            json.dumps({'name': 'Мария', 'services': ['Подстригване', 'Боядисване']}),
+            json.dumps({'name': 'Петя', 'start_work_time': '18:00', 'end_work_time': '10:00'}),
+            json.dumps({'name': 'Гергана', 'services': ['Педикюр']}),
+            'not json',
+        ]), input='ndjson')
+
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual([error['row'] for error in response.data['errors']], [2, 3, 4])
+        professional = Professional.objects.get(name='Мария')
+        self.assertEqual(set(professional.services.values_list('name', flat=True)), {'Подстригване', 'Боядисване'})
+        self.assertEqual(professional.start_work_time, datetime.time(10, 0))
+
+    def test_unreadable_file_reports_what_was_saved(self):
+        # Well past the first block the text layer decodes, so the first chunks are saved
+        rows = ''.join(f'Услуга {number},hair,10,30\n' for number in range(1000))
+        content = ('name,category,price,duration_minutes\n' + rows).encode() + b'\xff\xfe,hair,10,30\n'
+
+        file = io.TextIOWrapper(io.BytesIO(content), encoding='utf-8-sig', newline='')
+        result = importer.import_rows('services', file, 'csv', chunk_size=100)
+
+        self.assertGreater(result.created, 0)
+        self.assertEqual(Service.objects.filter(name__startswith='Услуга').count(), result.created)
+        self.assertIn("UTF-8", result.as_dict()['error'])
+
+        # Nothing saved at all: the request failed
+        response = self.client.post(reverse('import', args=['services']), {
+            'file': SimpleUploadedFile('data.csv', b'\xff\xfe'),
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['created'], 0)
+
+    def test_staff_only(self):
+        self.client.force_login(get_user_model().objects.create_user(
+            email='client@example.com', username='client', password='pass'
+        ))
+        self.assertEqual(self.upload('services', 'name\n').status_code, 403)
+
+    def test_appointments_are_validated_and_checked_for_overlaps(self):
+        self.book(datetime.time(10, 0))
+        version = availability.get_versions(self.professional.pk, [self.day])[self.day]
+        day = self.day.isoformat()
+        content = (
+            'professional,service,date,time,client_name,client_phone,client_email,status\n'
+            f'Иван,Подстригване,{day},10:30,Клиент,0888111222,,pending\n'    # the existing one
+            f'Иван,Подстригване,{day},11:00,Клиент,0888 111 222,A@B.BG,\n'
+            f'Иван,Подстригване,{day},11:30,Клиент,0888111222,,pending\n'    # the row above
+            f'Иван,Подстригване,{day},11:30,Клиент,0888111222,,cancelled\n'
+            f'Иван,Подстригване,{day},12:00,Клиент,abc,,pending\n'
+            f'Мария,Подстригване,{day},12:00,,0888111222,,pending\n'
+        )
+
+        # professionals, services + a transaction with the lock, the overlaps (appointments and the series
+        # of the professional), the insert and the rollups
+        with self.assertNumQueries(10), self.captureOnCommitCallbacks(execute=True):
+            result = importer.import_rows('appointments', io.StringIO(content), 'csv')
+
+        self.assertEqual(result.created, 2)
+        self.assertEqual([error['row'] for error in result.errors], [2, 4, 6, 7])
+        self.assertIn('застъпва', result.errors[0]['errors']['non_field_errors'][0])
+        self.assertEqual(set(result.errors[3]['errors']), {'professional', 'client_name'})
+
+        imported = Appointment.objects.get(time=datetime.time(11, 0))
+        self.assertEqual((imported.client_phone, imported.client_email), ('+359888111222', 'a@b.bg'))
+        stats = DailyStats.objects.get(professional=self.professional, date=self.day)
+        self.assertEqual((stats.pending_count, stats.cancelled_count, stats.booked_minutes), (2, 1, 120))
+        self.assertNotEqual(availability.get_versions(self.professional.pk, [self.day])[self.day], version)
+
+    def test_appointments_do_not_overlap_series_occurrences(self):
+        # Not materialized yet, so only the rule knows about the occurrence
+        AppointmentSeries.objects.create(
+            professional=self.professional, service=self.service, client_name='Клиент',
+            client_phone='0888123456', start_date=self.day, end_date=self.day, time=datetime.time(11, 0),
+        )
+        content = (
+            'professional,service,date,time,client_name,client_phone\n'
+            f'Иван,Подстригване,{self.day.isoformat()},11:30,Клиент,0888111222\n'
+        )
+
+        result = importer.import_rows('appointments', io.StringIO(content), 'csv')
+
+        self.assertEqual(result.created, 0)
+        self.assertIn('застъпва', result.errors[0]['errors']['non_field_errors'][0])
+
+    def test_command_reads_an_export(self):
+        self.book(datetime.time(10, 0), status='completed')
+        lines = list(export.lines('ndjson', export.rows(self.day, self.day)))
+        Appointment.objects.all().delete()
+
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson', encoding='utf-8') as file:
+            file.writelines(lines)
+            file.flush()
+            out = io.StringIO()
+            call_command('bulk_import', 'appointments', file.name, stdout=out)
+
+        self.assertIn('Imported 1 appointments, 0 row(s) failed', out.getvalue())
+        self.assertEqual(Appointment.objects.get().status, 'completed')
@@ -0,0 +1,73 @@
+"""
+Rate limits with a sliding window counter instead of DRF's request history.
+
+DRF's SimpleRateThrottle keeps the timestamps of up to `num_requests` requests
+per client and reads, filters and writes that whole list back on every
+request (up to 1000 floats with the `user` rate). Here every client has one
+integer counter per window: the limit is checked against
+
+    previous window * (part of it still inside the sliding window) + current window
+
+The counter of the current window goes up with the cache's atomic incr(), so
+with a shared backend (Redis, Memcached) all workers count together, and a
+request costs two cache calls whatever the rate is. Denied requests are
+counted too, so a client which keeps hammering stays blocked.
+
+The classes are drop-in replacements of AnonRateThrottle, UserRateThrottle
+and ScopedRateThrottle with the same rates and scopes (DEFAULT_THROTTLE_RATES).
+"""
+from rest_framework.throttling import AnonRateThrottle, ScopedRateThrottle, SimpleRateThrottle, UserRateThrottle
+
+WINDOW_KEY = '{key}:{window}'
+
+
+class SlidingWindowRateThrottle(SimpleRateThrottle):
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        window, self.elapsed = divmod(self.timer(), self.duration)
+        self.current = self.incr(WINDOW_KEY.format(key=self.key, window=int(window)))
+        self.previous = self.cache.get(WINDOW_KEY.format(key=self.key, window=int(window) - 1), 0)
+
+        return self.estimate() <= self.num_requests
+
+    def estimate(self):
+        return self.previous * (1 - self.elapsed / self.duration) + self.current
+
+    def incr(self, key):
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            # First request of the window. The counter is kept for two windows,
+            # in the next one it is read as the previous window
+            if self.cache.add(key, 1, timeout=2 * self.duration):
+                return 1
+            return self.cache.incr(key)
+
+    def wait(self):
+        """Seconds until the next request fits under the limit (for the Retry-After header)."""
+        free = self.num_requests - self.current - 1
+        if free >= 0:
+            # Within this window, once the weight of the previous one has fallen enough
+            return max(self.duration * (1 - free / self.previous) - self.elapsed, 0)
+
+        # This window alone is over the limit: wait for the next one, where it becomes the previous
+        next_window = self.duration - self.elapsed
+        return next_window + max(self.duration * (1 - (self.num_requests - 1) / self.current), 0)
+
+
+class AnonSlidingWindowThrottle(AnonRateThrottle, SlidingWindowRateThrottle):
+    pass
+
+
+class UserSlidingWindowThrottle(UserRateThrottle, SlidingWindowRateThrottle):
+    pass
+
+
+class ScopedSlidingWindowThrottle(ScopedRateThrottle, SlidingWindowRateThrottle):
+    """For views with a `throttle_scope`, on top of the anon / user limit."""
@@ -0,0 +1,61 @@
+"""
+Status changes of many appointments at once (the dashboard's bulk actions).
+
+The rows are read once, locked, to give a result for every id, and then
+changed with a single UPDATE. There are no per-row signals, instead
+`appointments_status_changed` is sent once for the whole batch.
+"""
+from django.db import transaction
+
+from appointment.models import Appointment
+from appointment.signals import appointments_status_changed
+
+UPDATED = 'updated'
+UNCHANGED = 'unchanged'
+NOT_FOUND = 'not_found'
+INVALID_TRANSITION = 'invalid_transition'
+
+
+def can_change(old_status, new_status):
+    return new_status in Appointment.STATUS_TRANSITIONS[old_status]
+
+
+def bulk_change_status(queryset, new_status, ids=None) -> dict:
+    """
+    Change the status of the appointments in `queryset` (already scoped to the professional).
+    With `ids` only these are changed, and the ones not in the queryset are NOT_FOUND.
+    Returns {id: result}.
+    """
+    if ids is not None:
+        queryset = queryset.filter(pk__in=ids)
+
+    results = {pk: NOT_FOUND for pk in ids or ()}
+    changed_ids = []
+    changed_rows = []
+
+    with transaction.atomic():
+        rows = queryset.select_for_update().order_by('pk').values_list(
+            'pk', 'status', 'professional_id', 'date', 'service_id'
+        )
+
+        for pk, status, professional_id, date, service_id in rows:
+            if status == new_status:
+                results[pk] = UNCHANGED
+            elif can_change(status, new_status):
+                results[pk] = UPDATED
+                changed_ids.append(pk)
+                changed_rows.append((professional_id, date, status, service_id))
+            else:
+                results[pk] = INVALID_TRANSITION
+
+        if changed_ids:
+            Appointment.objects.filter(pk__in=changed_ids).update(status=new_status)
+            appointments_status_changed.send(
+                sender=Appointment,
+                ids=changed_ids,
+                status=new_status,
+                days={(professional_id, date) for professional_id, date, _, _ in changed_rows},
+                rows=changed_rows,
+            )
+
+    return results
@@ -2,19 +2,38 @@ from django.urls import path
 from django.views.generic import TemplateView
 from django.contrib.auth import views as auth_views
 
+from appointment.async_views import AsyncCategoryListView, AsyncServiceListView, AsyncProfessionalListView, \
+    AsyncAvailableSlotsView, ScheduleEventsView
 from appointment.views import ServiceListView, ProfessionalListView, CreateAppointmentView, AvailableSlotsView, \
-    ProfessionalScheduleView, UpdateAppointmentStatusView, DashboardView, CategoryListView
+    ProfessionalScheduleView, UpdateAppointmentStatusView, DashboardView, CategoryListView, BootstrapView, \
+    BulkCreateAppointmentView, CreateAppointmentSeriesView, BulkUpdateAppointmentStatusView, ClientHistoryView, \
+    DailyReportView, ExportAppointmentsView, ImportView
 
 urlpatterns = [
     path('client/', TemplateView.as_view(template_name='index.html'), name='client-home'),
     path('dashboard/', DashboardView.as_view(), name='dashboard'),
+    path('bootstrap/', BootstrapView.as_view(), name='bootstrap'),
     path('categories/', CategoryListView.as_view(), name='category-list'),
     path('services/', ServiceListView.as_view(), name='service-list'),
     path('professionals/', ProfessionalListView.as_view(), name='professional-list'),
     path('book/', CreateAppointmentView.as_view(), name='book-appointment'),
+    path('book/bulk/', BulkCreateAppointmentView.as_view(), name='bulk-book-appointment'),
+    path('series/', CreateAppointmentSeriesView.as_view(), name='create-series'),
     path('slots/', AvailableSlotsView.as_view(), name='available-slots'),
     path('my-schedule/', ProfessionalScheduleView.as_view(), name='my-schedule'),
+    path('clients/history/', ClientHistoryView.as_view(), name='client-history'),
+    path('reports/daily/', DailyReportView.as_view(), name='daily-report'),
+    path('reports/appointments/', ExportAppointmentsView.as_view(), name='export-appointments'),
+    path('import/<str:kind>/', ImportView.as_view(), name='import'),
+    path('my-schedule/events/', ScheduleEventsView.as_view(), name='my-schedule-events'),
 
+    # Async versions of the read-only endpoints (served without blocking a thread under ASGI)
+    path('async/categories/', AsyncCategoryListView.as_view(), name='async-category-list'),
+    path('async/services/', AsyncServiceListView.as_view(), name='async-service-list'),
+    path('async/professionals/', AsyncProfessionalListView.as_view(), name='async-professional-list'),
+    path('async/slots/', AsyncAvailableSlotsView.as_view(), name='async-available-slots'),
+
+    path('appointment/status/', BulkUpdateAppointmentStatusView.as_view(), name='bulk-update-status'),
     path('appointment/<int:pk>/status/', UpdateAppointmentStatusView.as_view(), name='update-status'),
     path('login/', auth_views.LoginView.as_view(template_name='admin/login.html'), name='login'),
     path('logout/', auth_views.LogoutView.as_view(next_page='client-home'), name='logout')
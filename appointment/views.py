@@ -1,10 +1,14 @@
 import datetime
+import io
+import logging
 import textwrap
+from collections import defaultdict
 from unicodedata import category
 
-from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.core.mail import send_mail
+from django.db import router, transaction
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
 # from django.shortcuts import render
 from django.utils import timezone
 from django.views.generic import TemplateView
@@ -13,18 +17,28 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 
-from appointment.models import Service, Professional, Appointment, BusinessCategory
+from accounts.validators import normalize_phone_number
+from appointment import availability, booking, export, importer, outbox, recurrence, rollups, scheduling, transitions
+from appointment.catalog import CachedCatalogMixin
+from appointment.models import Service, Professional, Appointment, BusinessCategory, EmailOutbox, \
+    AppointmentSeries, DailyStats, AppointmentRecord
+from appointment.pagination import ScheduleKeysetPagination
 from appointment.serializers import ServiceSerializer, ProfessionalSerializer, AppointmentSerializer, \
-    AppointmentListSerializer, CategorySerializer
+    AppointmentListSerializer, CategorySerializer, AppointmentSeriesSerializer, BulkStatusSerializer, \
+    ClientHistorySerializer
 
+logger = logging.getLogger(__name__)
 
-class CategoryListView(generics.ListAPIView):
+
+class CategoryListView(CachedCatalogMixin, generics.ListAPIView):
+    catalog_name = 'categories'
     queryset = BusinessCategory.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [permissions.AllowAny] # It's public
 
 # 1 API, which returns a list with the services (GET)
-class ServiceListView(generics.ListAPIView):
+class ServiceListView(CachedCatalogMixin, generics.ListAPIView):
+    catalog_name = 'services'
     serializer_class = ServiceSerializer
 
     def get_queryset(self):
@@ -43,7 +57,8 @@ class ServiceListView(generics.ListAPIView):
         return queryset
 
 # 2 API, which returns a list with the employees / professionals (GET)
-class ProfessionalListView(generics.ListAPIView):
+class ProfessionalListView(CachedCatalogMixin, generics.ListAPIView):
+    catalog_name = 'professionals'
     serializer_class = ProfessionalSerializer
 
     def get_queryset(self):
@@ -57,117 +72,121 @@ class ProfessionalListView(generics.ListAPIView):
 
         return queryset
 
+# Everything the booking page needs, with one request (GET)
+class BootstrapView(CachedCatalogMixin, APIView):
+    """
+    Categories, services grouped by category, active professionals and
+    a service -> professionals map, so the booking form renders after one request.
+    Built with a fixed number of queries (4) and cached like the other catalog views.
+    """
+    catalog_name = 'bootstrap'
+    permission_classes = [permissions.AllowAny]
+
+    def get_catalog_data(self, request, *args, **kwargs):
+        categories = BusinessCategory.objects.prefetch_related('services')
+        professionals = Professional.objects.filter(is_active=True).prefetch_related(
+            Prefetch('services', queryset=Service.objects.only('id'))
+        )
+
+        services_by_category = {}
+        for category_obj in categories:
+            services_by_category[category_obj.slug] = ServiceSerializer(category_obj.services.all(), many=True).data
+
+        # {service_id: [professional_id, ...]}
+        compatibility = defaultdict(list)
+        for professional in professionals:
+            for service in professional.services.all():
+                compatibility[service.pk].append(professional.pk)
+
+        return {
+            'categories': CategorySerializer(categories, many=True).data,
+            'services': services_by_category,
+            'professionals': ProfessionalSerializer(professionals, many=True).data,
+            'compatibility': dict(compatibility),
+        }
+
 # 3 API, which returns available 30-minutes slots (GET)
 class AvailableSlotsView(APIView):
     """
-    Returns a list of available 30-minute slots for a specific professional and date.
-    Query Params: ?date=YYYY-MM-DD&professional=1
+    Returns a list of available slots for a specific professional and date, every 10 - 60 minutes
+    depending on the service (or its category).
+    Query Params: ?date=YYYY-MM-DD&professional=1&service=1
+
+    Range mode returns {"YYYY-MM-DD": [slots]} for up to MAX_RANGE_DAYS days
+    with a single query for all bookings in the range.
+    The slots of every day are cached until a booking for that day changes (see availability.py).
+    Query Params: ?from=YYYY-MM-DD&to=YYYY-MM-DD&professional=1&service=1
     """
+    MAX_RANGE_DAYS = 60
+    read_from_replica = True
+
+    @classmethod
+    def parse_query(cls, query_params):
+        """
+        Validated (professional_id, service_id, date_from, date_to, is_range).
+        Raises ValueError with the message for the client.
+        Shared with the async version of this view.
+        """
+        date_str = query_params.get('date')
+        from_str = query_params.get('from')
+        to_str = query_params.get('to')
+        pro_id = query_params.get('professional')
+        service_id = query_params.get('service')
+
+        is_range = bool(from_str or to_str)
+
+        if not (date_str or is_range) or not pro_id or not service_id:
+            raise ValueError("Липсва дата, услуга или служител")
+
+        # Parse date (or the range)
+        try:
+            if is_range:
+                date_from = datetime.datetime.strptime(from_str or to_str, "%Y-%m-%d").date()
+                date_to = datetime.datetime.strptime(to_str or from_str, "%Y-%m-%d").date()
+            else:
+                date_from = date_to = datetime.datetime.strptime(date_str, "%Y-%m-%d").date()
+        except ValueError:
+            raise ValueError("Невалиден формат на дата")
+
+        if date_to < date_from:
+            raise ValueError("Крайната дата е преди началната")
+
+        if (date_to - date_from).days >= cls.MAX_RANGE_DAYS:
+            raise ValueError(f"Максимален период: {cls.MAX_RANGE_DAYS} дни")
+
+        return pro_id, service_id, date_from, date_to, is_range
 
     def get(self, request):
         try:
-            date_str = request.query_params.get('date')
-            pro_id = request.query_params.get('professional')
-            service_id = request.query_params.get('service')
-
-            if not date_str or not pro_id or not service_id:
-                return Response({"грешка": "Липсва дата, услуга или служител"}, status=400)
+            try:
+                pro_id, service_id, date_from, date_to, is_range = self.parse_query(request.query_params)
+            except ValueError as e:
+                return Response({"грешка": str(e)}, status=400)
 
             # Get the duration of the service for the new appointment and the professional work time
             try:
-                service_obj = Service.objects.get(pk=service_id)
+                service_obj = Service.objects.select_related('category').get(pk=service_id)
                 professional_obj = Professional.objects.get(pk=pro_id)
             except Service.DoesNotExist:
                 return Response({"грешка": "Невалидна услуга"}, status=400)
 
-            new_duration = service_obj.duration
-
-            # Parse date
-            try:
-                target_date = datetime.datetime.strptime(date_str, "%Y-%m-%d").date()
-            except ValueError:
-                return Response({"грешка": "Невалиден формат на дата"}, status=400)
-
-            # 1. Define Working Hours of professional
-            current_time = professional_obj.start_work_time
-            end_work_time = professional_obj.end_work_time
-
-            # 2. Generate all possible 30-min slots for that day
-            all_slots = []
-
-            dummy_date = datetime.date(2000, 1, 1)
-            while True:
-                # Validation if duration is after working hours
-                slot_start_dt = datetime.datetime.combine(dummy_date, current_time)
-                slot_end_dt = slot_start_dt + new_duration
-
-                limit_dt = datetime.datetime.combine(dummy_date, end_work_time)
-
-                if slot_end_dt > limit_dt:
-                    break # Stop generating of new  slots, because we go outside the working hours
-
-                all_slots.append(current_time)
-
-                # Adding 30 minutes for the next slot
-                next_slot_dt = slot_start_dt + datetime.timedelta(minutes=30)
-                current_time = next_slot_dt.time()
-
-            # 3. Fetch existing booking
-            # Взимаме резервациите, НО заедно с информация за услугата!
-            # select_related('service') прави заявката бърза (JOIN в SQL)
-            booked_slots = Appointment.objects.filter(
-                professional_id=pro_id,
-                date=target_date
-            ).exclude(status='cancelled').select_related('service')
-
-            # Creating list with busy intervals
-            # [(10:00, 11:00), (14:00, 14:30)]
-            busy_intervals = []
-
-            for booking in booked_slots:
-                # start time of the appointment
-                start_time = booking.time
-
-                # End = Start + Duration of the service
-                full_start = datetime.datetime.combine(dummy_date, start_time)  # check the logic later
-                full_end = full_start + booking.service.duration
-                busy_intervals.append((full_start.time(), full_end.time()))
-
-            # 4. Filter logic
-            available_slots = []
-            now = datetime.datetime.now()
-
-            for slot in all_slots:
-                # Calculate the intervals of the potential new appointment
-                proposed_start = datetime.datetime.combine(dummy_date, slot)
-                proposed_end = proposed_start + new_duration
-
-                is_busy = False
-
-                # Check for Double Booking
-                for start, end in busy_intervals:
-                    # Logic: (StartA < EndB) and (EndA > StartB)
-                    # convert in time because can't compare datetime with time
-                    if proposed_start.time() < end and proposed_end.time() > start:
-                        is_busy = True
-                        break  # No point of checking the other intervals
-
-                if is_busy:
-                    continue  # skip this slot
+            # 1. Free slots for every day (from the cache or with one query for the missing days)
+            free_minutes = availability.get_free_minutes(
+                professional_obj, service_obj.duration, scheduling.date_range(date_from, date_to),
+                service_obj.get_slot_step(),
+            )
 
-                # Check for pastime (if it's today)
-                slot_full_datetime = datetime.datetime.combine(target_date, slot)
-                if slot_full_datetime < now:
-                    continue
+            # 2. Skip the slots in the past (not cached, because it depends on the current time)
+            availability_by_day = scheduling.format_free_slots(free_minutes, timezone.localtime())
 
-                available_slots.append(slot.strftime("%H:%M"))
+            if is_range:
+                return Response(availability_by_day)
 
-            return Response(available_slots)
+            return Response(availability_by_day[date_from.isoformat()])
 
         except Exception as e:
-            import traceback
-            print(f"ГРЕШКА: {str(e)}")
-            print(traceback.format_exc())  # Maybe have to be removed on deployment
+            # The traceback goes to the log, the 500 is counted per endpoint on /metrics
+            logger.exception("Грешка при изчисляване на свободните часове")
 
             return Response({"error": str(e)}, status=500)
 
@@ -176,13 +195,25 @@ class AvailableSlotsView(APIView):
 class CreateAppointmentView(generics.CreateAPIView):
     queryset = Appointment.objects.all()
     serializer_class = AppointmentSerializer
+    throttle_scope = 'book'
 
     # If you want to save the logged-in user automatically:
     def perform_create(self, serializer):
         # If a user is logged in (not AnonymousUser), save it.
         user = self.request.user if self.request.user.is_authenticated else None
-        appointment = serializer.save(user=user)
 
+        # The appointment and its email are saved in one transaction, holding the booking lock
+        data = serializer.validated_data
+        with booking.professional_day_lock(data['professional'].pk, data['date']):
+            appointment = serializer.save(user=user)
+
+            email = self.confirmation_email(appointment)
+            if email:
+                email.save()
+
+    @staticmethod
+    def confirmation_email(appointment):
+        """The unsaved outbox email for the client, None if there is no email address."""
         # 2. Подготвяме имейл до КЛИЕНТА
         subject = f"Потвърждение за час: {appointment.date}"
 
@@ -205,23 +236,79 @@ class CreateAppointmentView(generics.CreateAPIView):
                     Екипът на Салона
                 """).strip()
 
-        # Изпращаме (на теория)
-        # В Console режим ще го видиш долу в терминала
+        # Не изпращаме тук, а записваме в опашката (outbox)
+        # Командата send_outbox го изпраща, така резервацията не чака пощенския сървър
         if appointment.client_email:
-            send_mail(
+            return outbox.build_email(
                 subject,
                 message,
-                settings.EMAIL_HOST_USER,  # От кого
                 [appointment.client_email],  # До кого
-                fail_silently=False,
             )
+        return None
 
         # 3. (По желание) Имейл до СОБСТВЕНИКА
         # send_mail("Нова резервация!", f"Клиент {appointment.client_name} се записа...", ...)
 
+# Many appointments at once, all or nothing (POST)
+class BulkCreateAppointmentView(APIView):
+    """
+    Accepts a list of bookings in the same format as /book/.
+    Errors are returned per booking, in the order of the request.
+    """
+    MAX_BOOKINGS = 50
+    throttle_scope = 'book'
+
+    def post(self, request):
+        serializer = AppointmentSerializer(data=request.data, many=True, max_length=self.MAX_BOOKINGS)
+        serializer.is_valid(raise_exception=True)
+
+        user = request.user if request.user.is_authenticated else None
+
+        # One transaction for the appointments and their emails, holding the booking locks
+        days = [(item['professional'].pk, item['date']) for item in serializer.validated_data]
+        with booking.professional_days_lock(days):
+            appointments = serializer.save(user=user)
+
+            emails = [CreateAppointmentView.confirmation_email(appointment) for appointment in appointments]
+            EmailOutbox.objects.bulk_create([email for email in emails if email])
+
+        return Response(serializer.data, status=201)
+
+
+# Recurring appointment, e.g. every 2 weeks at 10:00 (POST)
+class CreateAppointmentSeriesView(generics.CreateAPIView):
+    queryset = AppointmentSeries.objects.all()
+    serializer_class = AppointmentSeriesSerializer
+    throttle_scope = 'book'
+
+    def perform_create(self, serializer):
+        user = self.request.user if self.request.user.is_authenticated else None
+        serializer.save(user=user)
+
+
 class ProfessionalScheduleView(generics.ListAPIView):
+    """
+    Appointments of the logged-in professional, a page at a time.
+    Query Params: ?date=YYYY-MM-DD (one day) or ?to=YYYY-MM-DD (from today until),
+    plus ?cursor= from the "next" link of the previous page.
+    """
     serializer_class = AppointmentListSerializer
     permission_classes = [IsAuthenticated] # Only logged-in users
+    pagination_class = ScheduleKeysetPagination
+    # Materializing a series is a write, the rest of such a (rare) request reads from the primary
+    read_from_replica = True
+
+    def list(self, request, *args, **kwargs):
+        try:
+            self.date = self.parse_date('date')
+            self.to = self.parse_date('to')
+        except ValueError:
+            return Response({"грешка": "Невалиден формат на дата"}, status=400)
+        return super().list(request, *args, **kwargs)
+
+    def parse_date(self, name):
+        value = self.request.query_params.get(name)
+        return datetime.date.fromisoformat(value) if value else None
 
     def get_queryset(self):
         user = self.request.user
@@ -230,40 +317,284 @@ class ProfessionalScheduleView(generics.ListAPIView):
             return Appointment.objects.none() # If It's just admin with no profile or client
 
         professional = user.professional_profile
-        queryset = Appointment.objects.filter(professional=professional)
+        # The service name of every row comes with the same query
+        queryset = Appointment.objects.filter(professional=professional).select_related('service')
 
-        # Get the date from the URL (or today's date by default)
-        date_str = self.request.query_params.get('date')
-        if date_str:
-            queryset = queryset.filter(date=date_str)
+        # The date from the URL (or from today on by default), parsed in list()
+        if self.date:
+            queryset = queryset.filter(date=self.date)
         else:
             queryset = queryset.filter(date__gte=timezone.localdate())
 
+            # Optional upper bound for the window
+            if self.to:
+                queryset = queryset.filter(date__lte=self.to)
+
+        # Recurring series are created as appointments lazily, up to the last requested date
+        self.materialize_series(professional, self.date or self.to)
+
         # return the appointments for the current professional and date
+        # (the pagination adds the id as a tie-breaker for the cursor)
         return queryset.order_by('date', 'time')
 
+    @staticmethod
+    def materialize_series(professional, requested=None):
+        until = recurrence.default_horizon(timezone.localdate())
+        if requested:
+            until = max(until, requested)
+        recurrence.materialize_for_professional(professional.pk, until)
+
 class UpdateAppointmentStatusView(APIView):
     permission_classes = [IsAuthenticated]
 
     def patch(self, request, pk):
-        try:
-            appointment = Appointment.objects.get(
-                pk=pk,
-                professional__user=request.user
-            )
-        except Appointment.DoesNotExist:
-            return Response({"error": "Резервацията не е намерена или нямате права."}, status=404)
-
         new_status = request.data.get('status')
         if new_status not in ['confirmed', 'cancelled', 'completed']:
             return Response({"error": "Невалиден статус"}, status=400)
 
-        appointment.status = new_status
-        appointment.save()
+        with transaction.atomic():
+            try:
+                # With the service, for the daily rollups. Locked, so the transition
+                # is checked against the status which is then changed
+                appointment = Appointment.objects.select_related('service').select_for_update(of=('self',)).get(
+                    pk=pk,
+                    professional__user=request.user
+                )
+            except Appointment.DoesNotExist:
+                return Response({"error": "Резервацията не е намерена или нямате права."}, status=404)
+
+            if appointment.status == new_status:
+                return Response({"message": "Статусът е обновен успешно!"})
+
+            # The same rules as the bulk endpoint: closed appointments stay closed
+            if not transitions.can_change(appointment.status, new_status):
+                return Response({"error": "Тази промяна на статуса не е позволена."}, status=400)
+
+            appointment.status = new_status
+            # post_save bumps the slots cache version for this professional and date
+            appointment.save(update_fields=['status'])
 
         return Response({"message": "Статусът е обновен успешно!"})
 
 
+# "Complete the whole day" or "cancel my afternoon" with one request (PATCH)
+class BulkUpdateAppointmentStatusView(APIView):
+    """
+    Body: {"status": "...", "ids": [1, 2]} or {"status": "...", "date": "YYYY-MM-DD", "time_from": "13:00"}
+    (time_from included, time_to excluded, both optional).
+    Returns the number of changed appointments and a result for every id.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def patch(self, request):
+        if not hasattr(request.user, 'professional_profile'):
+            return Response({"error": "Нямате профил на служител."}, status=403)
+
+        serializer = BulkStatusSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        # Only the appointments of the logged-in professional
+        queryset = Appointment.objects.filter(professional=request.user.professional_profile)
+        if 'date' in data:
+            queryset = queryset.filter(date=data['date'])
+            if 'time_from' in data:
+                queryset = queryset.filter(time__gte=data['time_from'])
+            if 'time_to' in data:
+                queryset = queryset.filter(time__lt=data['time_to'])
+
+        results = transitions.bulk_change_status(queryset, data['status'], ids=data.get('ids'))
+
+        return Response({
+            "updated": sum(result == transitions.UPDATED for result in results.values()),
+            "results": results,
+        })
+
+
+# Past and upcoming visits of a returning client (GET)
+class ClientHistoryView(APIView):
+    """
+    Query Params: ?phone=0888123456 (any form of the number) or ?email=...
+    Staff see the visits at every professional, a professional only their own.
+    All rows, archived visits included (AppointmentRecord), come from one query
+    over the client_phone / client_email indexes of both tables.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        user = request.user
+        if not (user.is_staff or hasattr(user, 'professional_profile')):
+            return Response({"error": "Нямате права."}, status=403)
+
+        phone = request.query_params.get('phone')
+        email = request.query_params.get('email')
+        if phone:
+            queryset = AppointmentRecord.objects.filter(client_phone=normalize_phone_number(phone))
+        elif email:
+            queryset = AppointmentRecord.objects.filter(client_email=email.lower())
+        else:
+            return Response({"грешка": "Липсва телефон или имейл"}, status=400)
+
+        if not user.is_staff:
+            queryset = queryset.filter(professional=user.professional_profile)
+
+        appointments = list(queryset.select_related('service', 'professional').order_by('date', 'time'))
+
+        # Split and count in Python, from the same rows
+        now = timezone.localtime()
+        current = (now.date(), now.time())
+        past = [appointment for appointment in appointments if (appointment.date, appointment.time) < current]
+        upcoming = appointments[len(past):]
+
+        return Response({
+            "counts": {
+                "total": len(appointments),
+                "completed": sum(appointment.status == 'completed' for appointment in past),
+                "cancelled": sum(appointment.status == 'cancelled' for appointment in appointments),
+                "upcoming": sum(appointment.status != 'cancelled' for appointment in upcoming),
+            },
+            "past": ClientHistorySerializer(reversed(past), many=True).data,  # the latest visit first
+            "upcoming": ClientHistorySerializer(upcoming, many=True).data,
+        })
+
+
+# Summary for the owner, from the daily rollups only (GET)
+class DailyReportView(APIView):
+    """
+    Query Params: ?from=YYYY-MM-DD&to=YYYY-MM-DD (&professional=1 for staff)
+    Booked minutes, revenue and appointments by status per professional and day,
+    plus the totals. Reads one DailyStats row per professional and day, however
+    many appointments there are.
+    """
+    permission_classes = [IsAuthenticated]
+    MAX_RANGE_DAYS = 366
+
+    def get(self, request):
+        user = request.user
+        if not (user.is_staff or hasattr(user, 'professional_profile')):
+            return Response({"error": "Нямате права."}, status=403)
+
+        try:
+            date_from = datetime.datetime.strptime(request.query_params.get('from', ''), "%Y-%m-%d").date()
+            date_to = datetime.datetime.strptime(request.query_params.get('to', ''), "%Y-%m-%d").date()
+        except ValueError:
+            return Response({"грешка": "Невалиден формат на дата"}, status=400)
+
+        if date_to < date_from:
+            return Response({"грешка": "Крайната дата е преди началната"}, status=400)
+
+        if (date_to - date_from).days >= self.MAX_RANGE_DAYS:
+            return Response({"грешка": f"Максимален период: {self.MAX_RANGE_DAYS} дни"}, status=400)
+
+        queryset = DailyStats.objects.filter(date__range=(date_from, date_to))
+        if not user.is_staff:
+            queryset = queryset.filter(professional=user.professional_profile)
+        elif request.query_params.get('professional'):
+            try:
+                queryset = queryset.filter(professional_id=int(request.query_params['professional']))
+            except ValueError:
+                return Response({"грешка": "Невалиден служител"}, status=400)
+
+        counters = ['booked_minutes', 'revenue'] + [
+            rollups.status_field(status) for status, _ in Appointment.STATUS_CHOICES
+        ]
+        days = list(queryset.order_by('date', 'professional_id').values(
+            'date', 'professional_id', 'professional__name', *counters
+        ))
+
+        return Response({
+            "days": days,
+            "totals": {counter: sum(day[counter] for day in days) for counter in counters},
+        })
+
+
+# Appointments for the accountants, streamed as CSV or NDJSON (GET)
+class ExportAppointmentsView(APIView):
+    """
+    Query Params: ?from=YYYY-MM-DD&to=YYYY-MM-DD (&status=completed, &professional=1 for staff,
+    &output=csv or ndjson, csv by default). Not ?format=, DRF uses that one for its renderers.
+    The rows are streamed from the database (see export.py), so the range isn't limited.
+    Their query runs while the response is sent, so it isn't in this view's /metrics query counts.
+    """
+    permission_classes = [IsAuthenticated]
+    read_from_replica = True
+
+    def get(self, request):
+        user = request.user
+        if not (user.is_staff or hasattr(user, 'professional_profile')):
+            return Response({"error": "Нямате права."}, status=403)
+
+        try:
+            date_from = datetime.datetime.strptime(request.query_params.get('from', ''), "%Y-%m-%d").date()
+            date_to = datetime.datetime.strptime(request.query_params.get('to', ''), "%Y-%m-%d").date()
+        except ValueError:
+            return Response({"грешка": "Невалиден формат на дата"}, status=400)
+
+        if date_to < date_from:
+            return Response({"грешка": "Крайната дата е преди началната"}, status=400)
+
+        status = request.query_params.get('status')
+        if status and status not in dict(Appointment.STATUS_CHOICES):
+            return Response({"грешка": "Невалиден статус"}, status=400)
+
+        output_format = request.query_params.get('output', 'csv')
+        if output_format not in export.FORMATS:
+            return Response({"грешка": "Поддържани формати: " + ", ".join(export.FORMATS)}, status=400)
+
+        # Checked now: the rows are read after the headers are sent, an error there cuts the file short
+        professional_id = None if user.is_staff else user.professional_profile.pk
+        if user.is_staff and request.query_params.get('professional'):
+            try:
+                professional_id = int(request.query_params['professional'])
+            except ValueError:
+                return Response({"грешка": "Невалиден служител"}, status=400)
+
+        # The replica of this request, resolved now: the rows are read after the view has returned
+        rows = export.rows(date_from, date_to, professional_id, status, using=router.db_for_read(AppointmentRecord))
+        response = StreamingHttpResponse(
+            export.lines(output_format, rows), content_type=export.FORMATS[output_format]
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="appointments-{date_from}-{date_to}.{output_format}"'
+        )
+        return response
+
+
+# Onboarding: services, professionals or historical appointments from a file (POST, multipart)
+class ImportView(APIView):
+    """
+    URL: import/services/, import/professionals/ or import/appointments/
+    Body: file=<CSV with a header row or NDJSON>. Query Params: ?input=csv or ndjson, csv by default.
+    The valid rows are imported and the others are returned with their row number (see importer.py).
+    A file which can't be read to the end (not UTF-8, broken CSV) also has "error", with what was saved before.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request, kind):
+        if kind not in importer.IMPORTERS:
+            return Response({"грешка": "Поддържани видове: " + ", ".join(importer.IMPORTERS)}, status=400)
+
+        input_format = request.query_params.get('input', 'csv')
+        if input_format not in importer.FORMATS:
+            return Response({"грешка": "Поддържани формати: " + ", ".join(importer.FORMATS)}, status=400)
+
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"file": ["Задължително поле."]}, status=400)
+
+        # Read as text a line at a time, utf-8-sig drops the BOM Excel puts in front of CSV files
+        file = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+        result = importer.import_rows(kind, file, input_format)
+
+        # A file which couldn't be read to the end may still have saved its first chunks
+        status = 400 if result.error and not result.created else 200
+        return Response(result.as_dict(), status=status)
+
+
 class DashboardView(LoginRequiredMixin, TemplateView):
     template_name = 'dashboard.html'
-    login_url = '/admin/login/'
\ No newline at end of file
+    login_url = '/admin/login/'
+
+    def get_context_data(self, **kwargs):
+        # The cards offer only the status changes the API allows
+        return super().get_context_data(status_transitions=Appointment.STATUS_TRANSITIONS, **kwargs)
@@ -0,0 +1,138 @@
+"""
+Working hours of a professional, compiled for the slot computation.
+
+The weekly template (WorkingHours), the exceptions (ScheduleException) and
+the fallback shift on Professional are compiled into a WorkSchedule: minute
+intervals per weekday and per exception date. It is cached under a version
+per professional, which the signals bump when any of these rows change, so
+the slot computation resolves the shifts of a date without a query.
+It is built from the primary, the rows of a lagging replica would stay
+cached under the new version.
+"""
+import datetime
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from appointment import replicas, scheduling
+from appointment.models import Professional, WorkingHours, ScheduleException
+
+VERSION_KEY = 'schedule:v:{professional_id}'
+SCHEDULE_KEY = 'schedule:{professional_id}:{version}'
+
+# Older exceptions are not compiled, nobody books in the past
+EXCEPTIONS_PAST_DAYS = 7
+
+
+class WorkSchedule:
+    def __init__(self, version, weekly, exceptions):
+        self.version = version
+        self.weekly = weekly  # {weekday: [(start, end)]}
+        self.exceptions = exceptions  # {date: [(start, end)]}, [] for a day off
+
+    def shifts(self, date) -> list:
+        """Sorted, merged (start, end) minute intervals of the working time on `date`."""
+        if date in self.exceptions:
+            return self.exceptions[date]
+        return self.weekly.get(date.weekday(), [])
+
+
+def _shift_intervals(start_time, end_time, break_start=None, break_end=None):
+    start, end = scheduling.to_minutes(start_time), scheduling.to_minutes(end_time)
+    if break_start is None or break_end is None:
+        return [(start, end)]
+    return [(start, scheduling.to_minutes(break_start)), (scheduling.to_minutes(break_end), end)]
+
+
+def compile_schedule(professional, version, hours, exceptions) -> WorkSchedule:
+    if hours:
+        weekly = defaultdict(list)
+        for row in hours:
+            weekly[row.weekday] += _shift_intervals(row.start_time, row.end_time, row.break_start, row.break_end)
+    else:
+        # No template, the same shift every day
+        shift = _shift_intervals(professional.start_work_time, professional.end_work_time)
+        weekly = {weekday: shift for weekday in range(7)}
+
+    by_date = defaultdict(list)
+    days_off = set()
+    for row in exceptions:
+        if row.is_day_off:
+            days_off.add(row.date)
+        else:
+            by_date[row.date] += _shift_intervals(row.start_time, row.end_time)
+
+    compiled_exceptions = {day: scheduling.merge_intervals(intervals) for day, intervals in by_date.items()}
+    compiled_exceptions.update({day: [] for day in days_off})
+
+    return WorkSchedule(
+        version,
+        {weekday: scheduling.merge_intervals(intervals) for weekday, intervals in weekly.items()},
+        compiled_exceptions,
+    )
+
+
+def _rows(professional_id):
+    first_exception = timezone.localdate() - datetime.timedelta(days=EXCEPTIONS_PAST_DAYS)
+    # The fallback shift too: the caller's professional may come from a replica
+    professional = Professional.objects.only('start_work_time', 'end_work_time').filter(pk=professional_id)
+    hours = WorkingHours.objects.filter(professional_id=professional_id)
+    exceptions = ScheduleException.objects.filter(professional_id=professional_id, date__gte=first_exception)
+    return professional, hours, exceptions
+
+
+def _version_key(professional_id):
+    return VERSION_KEY.format(professional_id=professional_id)
+
+
+def get_version(professional_id):
+    key = _version_key(professional_id)
+    version = cache.get(key)
+    if version is None:
+        # Not starting from 1, so an evicted counter can't match a schedule cached before the eviction
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(professional_id):
+    try:
+        cache.incr(_version_key(professional_id))
+    except ValueError:
+        cache.set(_version_key(professional_id), time.time_ns(), timeout=None)
+
+
+def get_schedule(professional) -> WorkSchedule:
+    """The compiled schedule from the cache, three queries to build it on a miss."""
+    version = get_version(professional.pk)
+    key = SCHEDULE_KEY.format(professional_id=professional.pk, version=version)
+
+    schedule = cache.get(key)
+    if schedule is None:
+        with replicas.read_from_primary():
+            current, hours, exceptions = _rows(professional.pk)
+            schedule = compile_schedule(current.get(), version, list(hours), list(exceptions))
+        cache.set(key, schedule, timeout=settings.SLOTS_CACHE_TIMEOUT)
+    return schedule
+
+
+async def aget_schedule(professional) -> WorkSchedule:
+    key = _version_key(professional.pk)
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, time.time_ns(), timeout=None)
+        version = await cache.aget(key)
+
+    schedule_key = SCHEDULE_KEY.format(professional_id=professional.pk, version=version)
+    schedule = await cache.aget(schedule_key)
+    if schedule is None:
+        with replicas.read_from_primary():
+            current, hours, exceptions = _rows(professional.pk)
+            schedule = compile_schedule(
+                await current.aget(), version, [row async for row in hours], [row async for row in exceptions]
+            )
+        await cache.aset(schedule_key, schedule, timeout=settings.SLOTS_CACHE_TIMEOUT)
+    return schedule
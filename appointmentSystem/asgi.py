@@ -3,6 +3,15 @@ ASGI config for appointmentSystem project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Sync and async views are served by the same application, e.g.
+    uvicorn appointmentSystem.asgi:application
+The /api/async/... endpoints don't hold a thread while waiting on the database,
+and /api/my-schedule/events/ pushes live updates to the open dashboards.
+
+Run one worker unless LIVE_UPDATES_REDIS_URL is set: the default live updates
+broker only reaches the dashboards connected to the same process. With Redis:
+    LIVE_UPDATES_REDIS_URL=redis://... uvicorn appointmentSystem.asgi:application --workers 4
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -12,7 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 import os
 from pathlib import Path
 
-from decouple import config
+from decouple import Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -39,15 +39,18 @@ REST_FRAMEWORK = {
     ],
 
     # Adding Spam security (Throttling)
-    #
+    # Sliding window counters in the cache (appointment/throttling.py),
+    # with several workers the cache must be a shared one
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle', # for guests
-        'rest_framework.throttling.UserRateThrottle' # for logged-in users
+        'appointment.throttling.AnonSlidingWindowThrottle', # for guests
+        'appointment.throttling.UserSlidingWindowThrottle', # for logged-in users
+        'appointment.throttling.ScopedSlidingWindowThrottle', # views with a throttle_scope
     ],
 
     'DEFAULT_THROTTLE_RATES': {
         'anon': '100/day', # guest can make 100 requests per day
-        'user': '1000/day' # a logged-in user can do 1000
+        'user': '1000/day', # a logged-in user can do 1000
+        'book': '20/hour', # new bookings (single, bulk and series), on top of the above
     }
 
 }
@@ -76,6 +79,10 @@ INSTALLED_APPS = [
 ] + PROJECT_APPS
 
 MIDDLEWARE = [
+    # First, so the measured latency includes the other middleware
+    'appointment.metrics.MetricsMiddleware',
+    # Before the sessions, so saving a session counts as a write (appointment/replicas.py)
+    'appointment.replicas.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -118,16 +125,73 @@ DATABASES = {
         "PASSWORD": config("DB_PASS"),
         "HOST": "127.0.0.1",
         "PORT": "5432",
+        # Persistent connections, reused by the requests of a worker and checked before reuse
+        "CONN_MAX_AGE": config("DB_CONN_MAX_AGE", default=60, cast=int),
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
+# Read replicas (appointment/replicas.py): comma separated hosts with the same database, user and password
+for number, host in enumerate(config("DB_REPLICA_HOSTS", default="", cast=Csv()), start=1):
+    DATABASES[f"replica_{number}"] = {
+        **DATABASES["default"],
+        "HOST": host,
+        # The tests run on the primary's test database
+        "TEST": {"MIRROR": "default"},
+    }
+
 # DATABASES = {
 #     'default': {
 #         'ENGINE': 'django.db.backends.sqlite3',
 #         'NAME': BASE_DIR / 'db.sqlite3',
-#     }
+#     },
+#     # The same file as a replica, to try the routing locally
+#     'replica_1': {
+#         'ENGINE': 'django.db.backends.sqlite3',
+#         'NAME': BASE_DIR / 'db.sqlite3',
+#         'TEST': {'MIRROR': 'default'},
+#     },
 # }
 
+DATABASE_ROUTERS = ['appointment.replicas.ReplicaRouter']
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != 'default']
+# How long the reads of a client stay on the primary after it wrote something
+REPLICA_PIN_SECONDS = 5
+
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# LocMem is per process, in production use a shared backend (Redis / Memcached),
+# so every worker sees the same slot versions.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# How long the free slots of a day stay cached (they are invalidated on booking changes anyway)
+SLOTS_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Live updates of the dashboard (appointment/live.py). The in-process broker works with one worker,
+# with several (or several servers) set LIVE_UPDATES_REDIS_URL
+LIVE_UPDATES_REDIS_URL = config('LIVE_UPDATES_REDIS_URL', default='')
+LIVE_UPDATES = {
+    'BACKEND': 'appointment.live.InProcessBroker',
+}
+if LIVE_UPDATES_REDIS_URL:
+    LIVE_UPDATES = {
+        'BACKEND': 'appointment.live.RedisBroker',
+        'OPTIONS': {'url': LIVE_UPDATES_REDIS_URL},
+    }
+
+# Completed and cancelled appointments older than this are moved to the archive
+# by the `archive_appointments` command (appointment/archive.py)
+ARCHIVE_AFTER_DAYS = config('ARCHIVE_AFTER_DAYS', default=365, cast=int)
+
+# /metrics (Prometheus). If set, the scraper must send "Authorization: Bearer <token>"
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
 
 
 # Password validation
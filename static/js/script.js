@@ -1,5 +1,14 @@
 const API_URL = '/api';
 
+// How many days of slots to fetch with one request (the API allows up to 60)
+const SLOTS_RANGE_DAYS = 14;
+
+// Categories, services, professionals and the service -> professionals map, loaded once from /api/bootstrap/
+let catalog = null;
+
+// Availability already fetched per professional/service: {from, to, days: {"YYYY-MM-DD": [slots]}}
+const slotsCache = {};
+
 document.addEventListener('DOMContentLoaded', async() => {
     // 1. Set MIN date to Today (Restriction 1)
     const dateInput = document.getElementById('date');
@@ -32,8 +41,7 @@ document.addEventListener('DOMContentLoaded', async() => {
     document.getElementById('date').addEventListener('change', loadAvailableSlots);
     document.getElementById('professional').addEventListener('change', loadAvailableSlots);
 
-    // Load initial data
-    loadServices('hair');
+    // Load initial data (the services of the first category are loaded by loadCategories)
     // loadProfessionals();  // CHECK LATER: No initial info for all pro's is shown
 
 
@@ -51,12 +59,22 @@ function resetDropdown(id, defaultText) {
     select.value = "";
 }
 
+// One request for the whole catalog instead of categories -> services -> professionals one after another
+async function loadCatalog() {
+    if (catalog) return catalog;
+
+    const response = await fetch(`${API_URL}/bootstrap/`);
+    if (!response.ok) throw new Error("Failed to fetch the catalog");
+
+    catalog = await response.json();
+    return catalog;
+}
+
 async function loadCategories() {
     const container = document.getElementById('category-container');
 
     try {
-        const response = await fetch(`${API_URL}/categories/`);
-        const categories = await response.json();
+        const categories = (await loadCatalog()).categories;
 
         container.innerHTML = '';
 
@@ -120,13 +138,10 @@ function handleCategoryChange(categorySlug) {
     document.getElementById('slots-container').innerHTML = '';
 }
 
-// Function to fetch services from Django
+// Function to fill the services of a category (from the catalog)
 async function loadServices(category) {
     try {
-        const response = await fetch(`${API_URL}/services/?category=${category}`);
-        if (!response.ok) throw new Error("Failed to fetch services");
-
-        const services = await response.json();
+        const services = (await loadCatalog()).services[category] || [];
         const select = document.getElementById('service');
 
         // Clear options except the first one
@@ -143,18 +158,16 @@ async function loadServices(category) {
     }
 }
 
-// Function to fetch professionals from Django
+// Function to fill the professionals (from the catalog)
 async function loadProfessionals(serviceId = null) {
     try {
-        let url = `${API_URL}/professionals/`;
+        const data = await loadCatalog();
+        let pros = data.professionals;
         // If a service is chosen, filter the professionals, which can do It.
         if (serviceId) {
-            url += `?service=${serviceId}`;
+            const skilled = data.compatibility[serviceId] || [];
+            pros = pros.filter(pro => skilled.includes(pro.id));
         }
-        const response = await fetch(url);
-        if (!response.ok) throw new Error("Failed to fetch professionals");
-
-        const pros = await response.json();
         const select = document.getElementById('professional');
 
         select.innerHTML = '<option value="">-- Избери служител --</option>';
@@ -197,16 +210,17 @@ async function loadAvailableSlots() {
     }
 
     try {
-        const response = await fetch(`${API_URL}/slots/?date=${dateValue}&professional=${professionalId}&service=${serviceId}`);
-        const slots = await response.json();
+        const result = await fetchSlots(professionalId, serviceId, dateValue);
 
         slotsContainer.innerHTML = '' // Clear loading text
 
-        if (slots.error) {
-            slotsContainer.innerHTML = `<p style="color: red;">Грешка: ${slots.error}</p>`;
+        if (result.error) {
+            slotsContainer.innerHTML = `<p style="color: red;">Грешка: ${result.error}</p>`;
             return;
         }
 
+        const slots = result[dateValue] || [];
+
         if (slots.length === 0) {
             slotsContainer.innerHTML = ''
             const pEl = document.createElement('p');
@@ -243,6 +257,29 @@ async function loadAvailableSlots() {
 }
 
 
+// Function to fetch the slots for a range of days (one request for many date clicks)
+async function fetchSlots(professionalId, serviceId, dateValue) {
+    const key = `${professionalId}-${serviceId}`;
+    const cached = slotsCache[key];
+
+    // ISO dates can be compared as strings
+    if (cached && cached.from <= dateValue && dateValue <= cached.to) {
+        return cached.days;
+    }
+
+    const toDate = new Date(dateValue);
+    toDate.setDate(toDate.getDate() + SLOTS_RANGE_DAYS - 1);
+    const toValue = toDate.toISOString().split('T')[0];
+
+    const response = await fetch(`${API_URL}/slots/?from=${dateValue}&to=${toValue}&professional=${professionalId}&service=${serviceId}`);
+    const days = await response.json();
+
+    if (response.ok) {
+        slotsCache[key] = {from: dateValue, to: toValue, days: days};
+    }
+    return days;
+}
+
 // Function to handle form submission
 async function handleFormSubmit(event) {
     event.preventDefault(); // STOP the default form reload
@@ -286,6 +323,8 @@ async function handleFormSubmit(event) {
             msgBox.style.display = 'block';
             document.getElementById('bookingForm').reset();
             document.getElementById('slots-container').innerHTML = ''; // Clear slots
+            // The booked slot is not free anymore, fetch fresh availability next time
+            Object.keys(slotsCache).forEach(key => delete slotsCache[key]);
         } else {
             // Error Logic (Validation errors from Django)
             console.error("Server returned errors:", result);